@@ -0,0 +1,73 @@
+# Latency of interactive saves (one insert + commit every 10 ms) while an online backup runs in the background.
+# Run from the project root:  python -m benchmarks.bench_backup [customers]
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from db.backup import online_backup
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+
+
+def save_latencies(db_path, stop, first_ssn):
+    conn = create_connection("writer", path=db_path)
+    latencies, i = [], 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (?, 'Front', 'Desk')", (first_ssn + i,))
+        conn.commit()
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+        time.sleep(0.01)
+    close_connection(conn)
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:<28} {len(latencies):6} saves  p50 {statistics.median(latencies):6.2f} ms  "
+          f"p99 {p99:6.2f} ms  max {latencies[-1]:6.2f} ms")
+
+
+def measure(db_path, first_ssn, seconds=None, during=None):
+    stop = threading.Event()
+    result = {}
+    saver = threading.Thread(target=lambda: result.setdefault("latencies", save_latencies(db_path, stop, first_ssn)))
+    saver.start()
+    if during is not None:
+        during()
+    else:
+        time.sleep(seconds)
+    stop.set()
+    saver.join()
+    return result["latencies"]
+
+
+def main():
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    folder = tempfile.mkdtemp()
+    db_path = os.path.join(folder, "bench.db")
+    conn = create_connection("writer", path=db_path)
+    migrate(conn)
+    conn.executemany("INSERT INTO customers (ssn, fname, lname, notes) VALUES (?, 'First', 'Last', ?)",
+                     ((100000000 + i, "x" * 500) for i in range(customers)))
+    conn.commit()
+    close_connection(conn)
+    print(f"database: {os.path.getsize(db_path) / (1024 * 1024):.0f} MiB")
+
+    report("saves, no backup", measure(db_path, 800000000, seconds=3))
+
+    backup = {}
+    latencies = measure(db_path, 900000000, during=lambda: backup.setdefault(
+        "result", online_backup(db_path, os.path.join(folder, "backup.db"))))
+    report("saves during backup", latencies)
+    result = backup["result"]
+    print(f"backup: {result.pages} pages in {result.steps} steps, {result.elapsed:.2f} s (quick_check included)")
+
+
+if __name__ == "__main__":
+    main()
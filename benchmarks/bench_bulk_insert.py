@@ -0,0 +1,68 @@
+# Loading historical exams: one add_test() (and one commit) per record vs. add_tests_bulk() (executemany, chunked).
+# Run from the project root:  python -m benchmarks.bench_bulk_insert [rows]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.models import GlassesTest
+from db.repositories.glasses_repo import GlassesRepo
+
+
+OPTIONAL_FIELDS = ("r_cylinder", "r_axis", "l_cylinder", "l_axis", "r_pd", "l_pd", "frame_manufacturer", "notes")
+
+
+def make_tests(count, mixed_nulls=False):
+    """With mixed_nulls, each exam leaves a random set of the optional fields empty (a legacy import)."""
+    rng = random.Random(1)
+    for i in range(count):
+        test = GlassesTest(
+            id=None, customer_id=1, exam_date=datetime(2020, 1, 1 + i % 28), examiner="Sanaa",
+            r_sphere="-2.25", r_cylinder=-1.0, r_axis=170, l_sphere=-1.75, l_cylinder=-0.5, l_axis=10,
+            r_pd=31.5, l_pd=31.0, frame_manufacturer="Ray-Ban", lenses_manufacturer="Essilor", notes="note " * 5,
+        )
+        if mixed_nulls:
+            for field in OPTIONAL_FIELDS:
+                if rng.random() < 0.5:
+                    setattr(test, field, None)
+        yield test
+
+
+def fresh_repo():
+    conn = create_connection("writer", path=os.path.join(tempfile.mkdtemp(), "bench.db"))
+    migrate(conn)
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'John', 'Doe')")
+    conn.commit()
+    return conn, GlassesRepo(conn)
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {count / elapsed:10.0f} rows/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    single = min(count, 5_000)  # one commit per row is slow; a sample is enough
+
+    conn, repo = fresh_repo()
+    timed("add_test() per row", single, lambda: [repo.add_test(t) for t in make_tests(single)])
+    close_connection(conn)
+
+    conn, repo = fresh_repo()
+    timed("add_tests_bulk()", count, lambda: repo.add_tests_bulk(make_tests(count)))
+    close_connection(conn)
+
+    conn, repo = fresh_repo()
+    timed("add_tests_bulk(), mixed NULLs", count, lambda: repo.add_tests_bulk(make_tests(count, mixed_nulls=True)))
+    close_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
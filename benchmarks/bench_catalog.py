@@ -0,0 +1,102 @@
+# Catalog names stored as text (schema version 10) vs. interned into catalog_values (migration 11): cold table and
+# index pages, "exams with frame manufacturer X", a per-manufacturer report, and decoding full rows in Python.
+# Names come in the spelling variants the clinic's data has.
+# Run from the project root:  python -m benchmarks.bench_catalog [customers] [exams_per_customer]
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_cold_split import COLUMNS, make_rows, pages, timed
+from db.connection import create_connection, close_connection
+from db.mappers import GLASSES_TEST_SELECT, glasses_test_from_row
+from db.migrations import migrate
+from db.repositories.glasses_repo import GlassesRepo
+
+FRAMES = ("Ray-Ban", "RAY BAN", "Ray-ban", "Oakley", "OAKLEY ", "Silhouette", "Lindberg", "Prada", "Tom Ford", "Gucci")
+LENSES = ("Essilor", "essilor", "Zeiss", "ZEISS", "Hoya", "Shamir", "Rodenstock")
+COLORS = ("Matte black", "matte black", "Black", "Havana", "Gold", "Silver", "Gunmetal", "Tortoise")
+
+
+def varied_rows(customers, exams):
+    positions = [COLUMNS.index(c) for c in ("frame_manufacturer", "lenses_manufacturer", "frame_color")]
+    for i, row in enumerate(make_rows(customers, exams)):
+        row = list(row)
+        for position, names in zip(positions, (FRAMES, LENSES, COLORS)):
+            row[position] = names[(i * 7 + position) % len(names)]
+        yield row
+
+
+def decode_cost(conn, sql, decode):
+    """(µs per row to decode, bytes held per decoded exam - its strings included)"""
+    rows = conn.execute(sql).fetchall()
+    started = time.perf_counter()
+    for row in rows:
+        decode(row)
+    elapsed = time.perf_counter() - started
+    del rows
+    tracemalloc.start()
+    tests = [decode(row) for row in conn.execute(sql)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / len(tests) * 1e6, size / len(tests)
+
+
+def main():
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    exams = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    folder = tempfile.mkdtemp()
+    before, after = os.path.join(folder, "v10.db"), os.path.join(folder, "v11.db")
+
+    conn = create_connection("writer", path=before)
+    migrate(conn, target=9)
+    conn.executemany("INSERT INTO customers (id, ssn, fname, lname) VALUES (?, ?, 'First', 'Last')",
+                     ((i, 100000000 + i) for i in range(1, customers + 1)))
+    conn.executemany(f"INSERT INTO glasses_tests ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                     varied_rows(customers, exams))
+    conn.commit()
+    migrate(conn, target=10)
+    conn.execute("VACUUM")
+    close_connection(conn)
+    shutil.copyfile(before, after)
+
+    conn = create_connection("writer", path=after)
+    started = time.perf_counter()
+    migrate(conn)
+    print(f"migration 11: {time.perf_counter() - started:.1f} s for {customers * exams} exams")
+    conn.execute("VACUUM")
+    ray_ban = GlassesRepo(conn).catalog.find("manufacturer", "Ray-Ban")
+    close_connection(conn)
+
+    # v10 stores the text as typed: finding one manufacturer means matching its spellings; v11 matches one id
+    variants = tuple(name for name in FRAMES if name.strip().lower().replace(" ", "-") == "ray-ban")
+    by_maker = "SELECT count(*) FROM glasses_tests_cold WHERE frame_manufacturer IN ({})"
+    report = "SELECT frame_manufacturer, count(*) FROM glasses_tests_cold GROUP BY frame_manufacturer"
+    for label, path, params in (("text (v10)", before, variants), ("ids (v11)", after, (ray_ban,))):
+        conn = create_connection("reader", path=path)
+        cold = pages(conn, "glasses_tests_cold")
+        indexes = pages(conn, "idx_glasses_tests_cold_frame_manufacturer", "idx_glasses_tests_cold_lenses_manufacturer")
+        close_connection(conn)
+        query = by_maker.format(", ".join("?" for _ in params))
+        timed(path, report, [()])  # warm the OS file cache
+        print(f"{label:<11} cold {cold:6d} pages (+{indexes} index)   file {os.path.getsize(path) / 2 ** 20:6.1f} MiB   "
+              f"exams with Ray-Ban {timed(path, query, [params] * 5):6.1f} ms   "
+              f"report {timed(path, report, [()] * 5):6.1f} ms")
+
+    # decoding the same exams: text columns vs. ids through the repo's intern cache
+    sample = range(1, customers + 1, max(1, customers // 200))
+    where = f"WHERE customer_id IN ({', '.join(map(str, sample))})"
+    conn = create_connection("reader", path=after)
+    repo = GlassesRepo(conn)
+    repo.catalog.load()
+    for label, view, decode in (("text rows", "glasses_tests_full", glasses_test_from_row),
+                                ("catalog ids", "glasses_tests_stored", repo._from_row)):
+        micros, size = decode_cost(conn, f"SELECT {GLASSES_TEST_SELECT} FROM {view} {where}", decode)
+        print(f"{label:<11} decode {micros:5.2f} µs/row   {size:5.0f} bytes per exam")
+    close_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
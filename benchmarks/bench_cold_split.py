@@ -0,0 +1,91 @@
+# The hot/cold split of glasses_tests (migration 10): table pages and scan time of the same exams before the split
+# (schema version 9) and after it. Most exams carry dispensing details and a note, as in the clinic's data.
+# Run from the project root:  python -m benchmarks.bench_cold_split [customers] [exams_per_customer]
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from db.connection import create_connection, close_connection
+from db.mappers import GLASSES_TEST_SELECT
+from db.migrations import migrate
+
+COLUMNS = ("customer_id", "exam_date", "examiner", "r_sphere", "r_cylinder", "r_axis", "r_va", "r_add_read", "r_pd",
+           "l_sphere", "l_cylinder", "l_axis", "l_va", "l_add_read", "l_pd", "sum_pd", "glasses_role",
+           "lenses_material", "lenses_diameter_1", "segment_diameter", "lenses_manufacturer", "lenses_color",
+           "lenses_coated", "catalog_num", "frame_manufacturer", "frame_supplier", "frame_model", "frame_size",
+           "frame_bar_length", "frame_color", "notes")
+
+# every exam's pupillary distances, checked against their sum: a full pass over the refraction columns
+SCAN = "SELECT count(*) FROM glasses_tests WHERE sum_pd IS NOT NULL AND abs(sum_pd - r_pd - l_pd) > 0.01"
+
+
+def make_rows(customers, exams):
+    for visit in range(exams):
+        for customer_id in range(1, customers + 1):
+            i = visit * customers + customer_id
+            yield (customer_id, f"{2005 + visit % 20}-{1 + i % 12:02d}-{1 + i % 28:02d}T10:30:00", "Sanaa",
+                   f"{-0.25 * (i % 24):.2f}", -0.25 * (i % 8), (i * 7) % 180, "6/6", 1.25, 31.5,
+                   f"{-0.25 * (i % 20):.2f}", -0.5, 90, "6/9", 1.25, 31.0, 62.5, "Distance",
+                   "Polycarbonate", 70.0, 28.0, "Essilor", "Clear", "Crizal Sapphire HR", f"ESS-{i % 5000:05d}",
+                   "Ray-Ban", "Luxottica Israel", f"RB{3000 + i % 700}", "52-18", "145", "Matte black",
+                   "Progressive lenses, patient prefers a wide reading zone. " * (1 + i % 3) if i % 4 else None)
+
+
+def pages(conn, *tables):
+    return conn.execute(f"SELECT count(*) FROM dbstat WHERE name IN ({', '.join('?' for _ in tables)})",
+                        tables).fetchone()[0]
+
+
+def timed(db_path, sql, params_list):
+    """Milliseconds per query, each on a fresh connection (empty page cache)."""
+    elapsed = 0
+    for params in params_list:
+        conn = create_connection("reader", path=db_path)
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        elapsed += time.perf_counter() - started
+        close_connection(conn)
+    return elapsed / len(params_list) * 1000
+
+
+def main():
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    exams = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    folder = tempfile.mkdtemp()
+    before, after = os.path.join(folder, "v9.db"), os.path.join(folder, "v10.db")
+
+    conn = create_connection("writer", path=before)
+    migrate(conn, target=9)
+    conn.executemany("INSERT INTO customers (id, ssn, fname, lname) VALUES (?, ?, 'First', 'Last')",
+                     ((i, 100000000 + i) for i in range(1, customers + 1)))
+    conn.executemany(f"INSERT INTO glasses_tests ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                     make_rows(customers, exams))
+    conn.commit()
+    conn.execute("VACUUM")
+    close_connection(conn)
+    shutil.copyfile(before, after)
+
+    conn = create_connection("writer", path=after)
+    started = time.perf_counter()
+    migrate(conn, target=10)
+    print(f"migration 10: {time.perf_counter() - started:.1f} s for {customers * exams} exams")
+    conn.execute("VACUUM")
+    close_connection(conn)
+
+    histories = [(customer_id,) for customer_id in range(1, customers + 1, max(1, customers // 200))]
+    full_history = f"SELECT {GLASSES_TEST_SELECT} FROM {{table}} WHERE customer_id = ? ORDER BY exam_date DESC"
+    for label, path, table in (("before (v9)", before, "glasses_tests"), ("after (v10)", after, "glasses_tests_full")):
+        conn = create_connection("reader", path=path)
+        hot = pages(conn, "glasses_tests")
+        cold = pages(conn, "glasses_tests_cold") if table != "glasses_tests" else 0
+        close_connection(conn)
+        timed(path, SCAN, [()])  # warm the OS file cache
+        print(f"{label:<12} glasses_tests {hot:7d} pages (+{cold} cold)   file {os.path.getsize(path) / 2 ** 20:6.1f} MiB   "
+              f"scan {timed(path, SCAN, [()] * 5):7.1f} ms   "
+              f"full history {timed(path, full_history.format(table=table), histories):5.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
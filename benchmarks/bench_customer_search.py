@@ -0,0 +1,49 @@
+# Customer search latency: FTS5 search_customers() vs. the old LIKE scan.
+# Run from the project root:  python -m benchmarks.bench_customer_search [customers]
+import random
+import sys
+import time
+
+from db.connection import create_connection
+from db.migrations import migrate
+from db.repositories.customer_repo import CustomerRepo
+
+FIRST_NAMES = ["David", "Naseem", "Sanaa", "Moshe", "Yosef", "Maria", "סאמר", "נסים", "רות", "José"]
+LAST_NAMES = ["Srour", "Cohen", "Levi", "Ben Abo", "Stone", "Haddad", "סרור", "כהן", "לוי", "Müller"]
+TOWNS = ["Haifa", "Nazareth", "Tel Aviv", "חיפה", "ירושלים", "Akko"]
+
+
+def populate(conn, count):
+    rnd = random.Random(1)
+    rows = (
+        (100000000 + i, rnd.choice(FIRST_NAMES) + str(i % 997), rnd.choice(LAST_NAMES),
+         "05%08d" % rnd.randrange(10 ** 8), rnd.choice(TOWNS))
+        for i in range(count)
+    )
+    conn.executemany("INSERT INTO customers (ssn, fname, lname, tel_mobile, town) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+
+def timed(label, func, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    print(f"{label:<40} {elapsed:8.2f} ms  ({len(result)} rows)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    conn = create_connection("memory")
+    migrate(conn)
+    populate(conn, count)
+    repo = CustomerRepo(conn)
+    print(f"{count} customers")
+
+    for query in ("Dav", "david 12", "סרור", "Haifa Cohen", "0501"):
+        timed(f"search_customers({query!r})", lambda: repo.search_customers(query))
+        timed(f"LIKE scan({query!r})", lambda: repo._search_by_name_like(query), repeat=3)
+
+
+if __name__ == "__main__":
+    main()
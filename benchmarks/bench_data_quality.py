@@ -0,0 +1,52 @@
+# Full and incremental data-quality scans over a large glasses_tests table (one pass over the table for all rules).
+# Run from the project root:  python -m benchmarks.bench_data_quality [rows]
+import os
+import sys
+import tempfile
+import time
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from services.data_quality import DataQualityScanner
+
+
+def populate(conn, count):
+    # ~1 in 7 rows has an axis without cylinder, ~1 in 11 a sphere off the 0.25 grid
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'John', 'Doe')")
+    conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {count})
+        INSERT INTO glasses_tests (customer_id, exam_date, examiner, r_sphere, r_cylinder, r_axis,
+                                   l_sphere, l_cylinder, l_axis, r_pd, l_pd, sum_pd)
+        SELECT 1, '2020-01-01T00:00:00', 'Sanaa',
+               CASE WHEN i % 11 = 0 THEN -2.3 ELSE -2.25 END,
+               CASE WHEN i % 7 = 0 THEN NULL ELSE -1.0 END, 170,
+               -1.75, -0.5, 10, 31.5, 31.0, 62.5
+        FROM n
+    """)
+    conn.execute("INSERT INTO glasses_tests_cold (id, notes) SELECT id, 'note' FROM glasses_tests")
+    conn.commit()
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<36} {time.perf_counter() - start:8.2f} s   {result}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = create_connection("writer", path=path)
+    migrate(conn)
+    populate(conn, count)
+    scanner = DataQualityScanner(conn)
+
+    timed(f"full scan ({count} rows)", lambda: scanner.scan_table("glasses_tests", full=True))
+    conn.execute("UPDATE glasses_tests SET r_axis = NULL WHERE id % 1000 = 0")
+    conn.commit()
+    timed("incremental scan (0.1% changed)", lambda: scanner.scan_table("glasses_tests"))
+    close_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Opening patients' histories: list_tests_for_customer() (full 55-column rows) vs. list_test_summaries()
+# (the covering index only). Exams are inserted interleaved across customers, as years of visits would be,
+# so one patient's rows are spread over many table pages.
+# Run from the project root:  python -m benchmarks.bench_history_summaries [customers] [exams_per_customer]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.models import GlassesTest
+from db.repositories.glasses_repo import GlassesRepo
+
+
+def make_tests(customers, exams):
+    start = datetime(2005, 1, 1)
+    for visit in range(exams):
+        for customer_id in range(1, customers + 1):
+            yield GlassesTest(
+                id=None, customer_id=customer_id, exam_date=start + timedelta(days=visit * 120 + customer_id % 97),
+                examiner="Sanaa", r_sphere="-2.25", r_cylinder=-1.0, r_axis=170, r_add_read=1.25,
+                l_sphere="-1.75", l_cylinder=-0.5, l_axis=10, l_add_read=1.25, glasses_role="Distance",
+                r_pd=31.5, l_pd=31.0, frame_manufacturer="Ray-Ban", frame_model="RB3025", lenses_manufacturer="Essilor",
+                diagnosis="Myopia with astigmatism", notes="Patient reports mild eye strain after long screen use. " * 3,
+            )
+
+
+def measure(db_path, method, customer_ids):
+    """Seconds per history, each read on a fresh connection (empty page cache, like opening a patient's file)."""
+    elapsed = 0
+    for customer_id in customer_ids:
+        conn = create_connection("reader", path=db_path)
+        started = time.perf_counter()
+        getattr(GlassesRepo(conn), method)(customer_id)
+        elapsed += time.perf_counter() - started
+        close_connection(conn)
+    return elapsed / len(customer_ids)
+
+
+def main():
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    exams = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = create_connection("writer", path=db_path)
+    migrate(conn)
+    conn.executemany("INSERT INTO customers (id, ssn, fname, lname) VALUES (?, ?, 'First', 'Last')",
+                     ((i, 100000000 + i) for i in range(1, customers + 1)))
+    conn.commit()
+    GlassesRepo(conn).add_tests_bulk(make_tests(customers, exams))
+    close_connection(conn)
+    print(f"{customers * exams} exams, {exams} per customer, database {os.path.getsize(db_path) / 2 ** 20:.0f} MiB")
+
+    sample = random.Random(1).sample(range(1, customers + 1), 200)
+    for label, method in (("full rows", "list_tests_for_customer"), ("summaries", "list_test_summaries")):
+        measure(db_path, method, sample[:20])  # warm the OS file cache
+        print(f"{label:<12} {measure(db_path, method, sample) * 1000:7.2f} ms per history")
+
+
+if __name__ == "__main__":
+    main()
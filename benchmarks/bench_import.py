@@ -0,0 +1,43 @@
+# Legacy CSV import throughput by number of parser processes (one writer thread in every case).
+# Run from the project root:  python -m benchmarks.bench_import [rows]
+import csv
+import os
+import sys
+import tempfile
+
+from services.importer import run_import
+
+
+def write_sources(folder, count):
+    customers = os.path.join(folder, "customers.csv")
+    glasses = os.path.join(folder, "glasses.csv")
+    with open(customers, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ssn", "fname", "lname", "birth_date", "tel_mobile", "town"])
+        for i in range(count // 5):
+            writer.writerow([100000000 + i, f"First{i}", f"Last{i}", "01/02/1990", "0501234567", "Haifa"])
+    with open(glasses, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ssn", "exam_date", "examiner", "r_sphere", "r_cylinder", "r_axis", "l_sphere",
+                         "l_cylinder", "l_axis", "r_pd", "l_pd", "sum_pd", "r_va", "l_va", "notes"])
+        for i in range(count):
+            writer.writerow([100000000 + i % (count // 5), f"{1 + i % 28:02d}/01/2020", "Sanaa", "-2.25", "-1.00",
+                             "170", "-1.75", "-0.50", "10", "31.5", "31", "62.5", "6/6", "6/9", "note"])
+    return customers, glasses
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    folder = tempfile.mkdtemp()
+    customers, glasses = write_sources(folder, count)
+
+    for workers in sorted({0, 1, 2, os.cpu_count()}):
+        db_path = os.path.join(folder, f"import-{workers}.db")
+        run_import("customers", customers, db_path=db_path, workers=0)
+        result = run_import("glasses", glasses, db_path=db_path, workers=workers)
+        label = "in-process" if workers == 0 else f"{workers} worker process(es)"
+        print(f"{label:<24} {result.imported:>8} exams {result.rows_per_second:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Row decoding of 55-column glasses_tests rows: the old dict(row) path vs. the compiled positional mappers,
+# and per-object memory of the slots=True models vs. a regular (__dict__) dataclass.
+# Run from the project root:  python -m benchmarks.bench_row_mapping [rows]
+import dataclasses
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from db.connection import create_connection
+from db.mappers import GLASSES_TEST_SELECT, glasses_test_from_row
+from db.migrations import migrate
+from db.models import GlassesTest
+from db.repositories.glasses_repo import GlassesRepo
+from db.utils import ISO_FORMAT, dict_from_row
+
+# Same fields as GlassesTest, without __slots__ (what db/models.py used to produce)
+DictGlassesTest = dataclasses.make_dataclass(
+    "DictGlassesTest",
+    [(f.name, f.type, dataclasses.field(default=f.default)) for f in dataclasses.fields(GlassesTest)],
+)
+
+
+def old_decode(row, cls=GlassesTest):
+    data = dict_from_row(row)
+    if not (data["exam_date"] is None):
+        try:
+            data["exam_date"] = datetime.strptime(data["exam_date"], ISO_FORMAT)
+        except Exception:
+            pass
+    return cls(**data)
+
+
+def populate(conn, count):
+    repo = GlassesRepo(conn)
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'John', 'Doe')")
+    for i in range(count):
+        repo.add_test(GlassesTest(
+            id=None, customer_id=1, exam_date=datetime(2020, 1, 1 + i % 28), examiner="Sanaa",
+            r_sphere="-2.25", r_cylinder=-1.0, r_axis=170, l_sphere="-1.75", l_cylinder=-0.5, l_axis=10,
+            r_pd=31.5, l_pd=31.0, frame_manufacturer="Ray-Ban", lenses_manufacturer="Essilor", notes="note " * 5,
+        ))
+    conn.commit()
+
+
+def timed(label, rows, decode):
+    start = time.perf_counter()
+    for row in rows:
+        decode(row)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} {elapsed / len(rows) * 1e6:8.2f} µs/row")
+
+
+def object_size(label, rows, decode):
+    tracemalloc.start()
+    objects = [decode(row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<38} {size / len(objects):8.0f} bytes/object")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    conn = create_connection("memory")
+    migrate(conn)
+    populate(conn, count)
+    rows = conn.execute(f"SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_full").fetchall()
+    print(f"{count} rows x {len(rows[0])} columns")
+
+    timed("dict(row) + strptime (old)", rows, old_decode)
+    timed("compiled positional mapper", rows, glasses_test_from_row)
+    object_size("regular dataclass (old)", rows, lambda r: old_decode(r, DictGlassesTest))
+    object_size("slots=True dataclass", rows, glasses_test_from_row)
+
+
+if __name__ == "__main__":
+    main()
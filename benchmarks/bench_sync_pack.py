@@ -0,0 +1,78 @@
+# Sync pack size and export speed against the size of the SQLite file they are exported from.
+# Run from the project root:  python -m benchmarks.bench_sync_pack [customers]
+import os
+import sys
+import tempfile
+import time
+
+from db.catalog import Catalog
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from services.sync_pack import write_delta, write_snapshot
+
+TOWNS = ("Haifa", "Akko", "Nazareth", "Shefa-Amr", "Karmiel", "Tamra", "Sakhnin", "Nahariya")
+FRAMES = ("Ray-Ban", "Oakley", "Silhouette", "Lindberg", "Prada")
+LENSES = ("Essilor", "Zeiss", "Hoya", "Shamir")
+
+
+def populate(conn, customers):
+    conn.executemany(
+        "INSERT INTO customers (ssn, fname, lname, birth_date, birth_day, sex, tel_mobile, address, town, "
+        "glasses_num, lenses_num, mailing) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((100000000 + i, f"First{i % 700}", f"Last{i % 1300}", "01/02/1990", 7301 + i % 20000, "MF"[i % 2],
+          f"05{i:08d}", f"{i % 90} Main St", TOWNS[i % len(TOWNS)], i % 4, i % 2, 1) for i in range(customers)),
+    )
+    conn.executemany(
+        "INSERT INTO glasses_tests (customer_id, exam_date, examiner, r_sphere, r_cylinder, r_axis, l_sphere, "
+        "l_cylinder, l_axis, r_pd, l_pd, sum_pd, r_va, l_va) "
+        "VALUES (?, ?, 'Sanaa', ?, ?, ?, ?, ?, ?, 31.5, 31.0, 62.5, '6/6', '6/9')",
+        ((1 + i // 3, f"20{10 + i % 14}-{1 + i % 12:02d}-{1 + i % 28:02d}T10:30:00", -0.25 * (i % 24),
+          -0.25 * (i % 8) or None, (i * 7) % 180 if i % 8 else None, -0.25 * (i % 20), -0.5, 90)
+         for i in range(customers * 3)),
+    )
+    catalog = Catalog(conn)
+    frames = [catalog.encode("manufacturer", name) for name in FRAMES]
+    lenses = [catalog.encode("manufacturer", name) for name in LENSES]
+    conn.executemany(
+        "INSERT INTO glasses_tests_cold (id, frame_manufacturer, lenses_manufacturer, notes) VALUES (?, ?, ?, ?)",
+        ((1 + i, frames[i % len(frames)], lenses[i % len(lenses)],
+          "progressive, anti-reflective" if i % 4 == 0 else None) for i in range(customers * 3)),
+    )
+    conn.commit()
+
+
+def main():
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    folder = tempfile.mkdtemp()
+    db_path = os.path.join(folder, "bench.db")
+
+    conn = create_connection("writer", path=db_path)
+    migrate(conn)
+    populate(conn, customers)
+    conn.execute("DELETE FROM change_log")  # a fresh snapshot is the baseline; only later changes matter
+    conn.commit()
+    conn.execute("VACUUM")
+    db_size = os.path.getsize(db_path)
+    print(f"{'SQLite file':<24} {db_size / 1024:10.0f} KiB ({customers} customers, {customers * 3} glasses exams)")
+
+    snapshot_path = os.path.join(folder, "snapshot.pack")
+    start = time.perf_counter()
+    seq = write_snapshot(conn, snapshot_path)["to_seq"]
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(snapshot_path)
+    print(f"{'snapshot pack':<24} {size / 1024:10.0f} KiB ({size / db_size:.1%} of the file, {elapsed:.2f} s)")
+
+    conn.execute("UPDATE customers SET tel_mobile = '0509999999' WHERE id % 100 = 0")
+    conn.execute("UPDATE glasses_tests_cold SET notes = 'remade' WHERE id % 250 = 0")
+    conn.commit()
+    delta_path = os.path.join(folder, "delta.pack")
+    start = time.perf_counter()
+    result = write_delta(conn, delta_path, seq)
+    elapsed = time.perf_counter() - start
+    print(f"{'delta pack':<24} {os.path.getsize(delta_path) / 1024:10.1f} KiB ({result['rows']} changed rows, "
+          f"{elapsed:.3f} s)")
+    close_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Rapid data entry: an examiner saves a glasses test after every field (one save every 20 ms, spread over 5 exams).
+# Compares calling CustomerService directly with queueing the saves on a WriteBehindQueue.
+# Run from the project root:  python -m benchmarks.bench_write_behind [saves]
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from services.async_customer_service import open_customer_service
+from services.validation import GLASSES_TEST_VALIDATOR
+from services.write_behind import WriteBehindQueue
+
+EXAMS = 5
+TYPING_PAUSE = 0.02
+
+
+def glasses_data(test_id, axis):
+    data = {name: None for name in GLASSES_TEST_VALIDATOR.fields}
+    data.update(id=test_id, customer_id=1, exam_date="15/02/2025", examiner="Dr. Smith",
+                r_sphere=-2.25, r_cylinder=-0.5, r_axis=axis)
+    return data
+
+
+def make_database(folder, name):
+    db_path = os.path.join(folder, name)
+    conn = create_connection("writer", path=db_path)
+    migrate(conn)
+    conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (123456789, 'John', 'Doe')")
+    conn.commit()
+    close_connection(conn)
+    service = open_customer_service(db_path)
+    for _ in range(EXAMS):
+        service.add_glasses_test(1, glasses_data(None, 1))
+    close_connection(service.cus_repo.conn)
+    return db_path
+
+
+def log_entries(db_path):
+    conn = create_connection("reader", path=db_path)
+    try:
+        return conn.execute("SELECT count(*) FROM change_log").fetchone()[0] - EXAMS - 1  # minus the setup inserts
+    finally:
+        close_connection(conn)
+
+
+def type_exams(save, saves):
+    latencies = []
+    for i in range(saves):
+        data = glasses_data(i % EXAMS + 1, i % 180 + 1)
+        start = time.perf_counter()
+        save(1, data)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(TYPING_PAUSE)
+    return latencies
+
+
+def report(label, latencies, writes, commits):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:<14} save p50 {statistics.median(latencies):6.3f} ms  p99 {p99:6.3f} ms  "
+          f"rows written {writes:5}  commits {commits:5}")
+
+
+def main():
+    saves = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    folder = tempfile.mkdtemp()
+
+    db_path = make_database(folder, "direct.db")
+    service = open_customer_service(db_path)
+    latencies = type_exams(service.update_glasses_test, saves)
+    close_connection(service.cus_repo.conn)
+    report("direct", latencies, log_entries(db_path), saves)
+
+    db_path = make_database(folder, "write_behind.db")
+    queue = WriteBehindQueue(lambda: open_customer_service(db_path), flush_on_exit=False)
+    latencies = type_exams(queue.update_glasses_test, saves)
+    queue.close()
+    report("write-behind", latencies, log_entries(db_path), queue.batches)
+    print(f"{queue.coalesced} of {queue.queued} saves coalesced")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Online backups.
+
+A backup is copied with the sqlite3 backup API, BACKUP_PAGES pages per step with a short sleep between steps, from a
+dedicated connection in a background thread - the app keeps saving while it runs:
+
+- The source connection holds one read transaction for the whole copy. In WAL mode that blocks nobody, and the
+  backup copies that one snapshot - writes committed meanwhile don't restart it (they go to the WAL and are picked
+  up by the next backup).
+- The copy is written to "<name>.tmp", checked with PRAGMA quick_check, and only then renamed into place: a backup
+  file that exists is a verified one.
+
+Generations: one hourly backup per hour (the newest KEEP_HOURLY are kept) and one daily backup per day, promoted
+from that day's first hourly one (KEEP_DAILY kept). restore() first saves the current database as a "pre-restore"
+backup, which is never pruned.
+
+Run from the project root:
+    python -m db.backup now              take the hourly/daily backups that are due
+    python -m db.backup watch            ... and keep doing it every 5 minutes
+    python -m db.backup list
+    python -m db.backup restore BACKUP   replace the database with BACKUP (the current one is backed up first)
+"""
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from db.bootstrap import DB_PATH
+
+BACKUP_DIR = os.path.join(os.path.dirname(DB_PATH), "backups")
+BACKUP_PAGES = 1024  # pages copied per step (4 MiB with the default 4 KiB page size)
+BACKUP_SLEEP = 0.005  # seconds between steps: lets the examiner's saves get the disk
+KEEP_HOURLY = 24
+KEEP_DAILY = 14
+WATCH_INTERVAL = 300  # seconds between checks for a due backup
+
+GENERATIONS = {"hourly": "%Y%m%d-%H", "daily": "%Y%m%d"}
+
+
+@dataclass
+class BackupResult:
+    path: str
+    pages: int
+    elapsed: float
+    steps: int
+
+
+def quick_check(path: str) -> List[str]:
+    """Runs PRAGMA quick_check on a database file; returns the problems found (empty = ok)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+    except sqlite3.DatabaseError as e:  # e.g. "file is not a database"
+        problems = [str(e)]
+    finally:
+        conn.close()
+    return [] if problems == ["ok"] else problems
+
+
+def online_backup(db_path: str, dest_path: str, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP,
+                  progress: Callable[[int, int], None] = None) -> BackupResult:
+    """
+    Copies db_path to dest_path while the database stays in use, then verifies the copy.
+    `progress(copied_pages, total_pages)` is called after each step. Raises ValueError if the copy fails the check.
+    """
+    if pages <= 0:
+        raise ValueError("pages must be a positive integer")
+
+    tmp_path = dest_path + ".tmp"
+    for leftover in (tmp_path, tmp_path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    steps = 0
+
+    def on_step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if progress is not None:
+            progress(total - remaining, total)
+
+    started = time.perf_counter()
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    target = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # starts the read transaction: pins the snapshot
+        source.backup(target, pages=pages, progress=on_step, sleep=sleep)
+        source.execute("COMMIT")
+        total_pages = target.execute("PRAGMA page_count").fetchone()[0]
+        target.execute("PRAGMA journal_mode = DELETE")  # a backup is a single self-contained file
+    finally:
+        target.close()
+        source.close()
+
+    problems = quick_check(tmp_path)
+    if problems:
+        os.remove(tmp_path)
+        raise ValueError(f"Backup of {db_path} failed quick_check: {'; '.join(problems[:5])}")
+    os.replace(tmp_path, dest_path)
+    return BackupResult(dest_path, total_pages, time.perf_counter() - started, steps)
+
+
+def restore(backup_path: str, db_path: str = DB_PATH) -> BackupResult:
+    """
+    Replaces the contents of db_path with a verified backup - through SQLite (the backup API at full speed), so the
+    live database's WAL and lock files stay consistent. Close the app first: restore waits for its write lock.
+    """
+    problems = quick_check(backup_path)
+    if problems:
+        raise ValueError(f"{backup_path} failed quick_check, not restoring it: {'; '.join(problems[:5])}")
+
+    started = time.perf_counter()
+    source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+    target = sqlite3.connect(db_path, timeout=30)
+    try:
+        source.backup(target)
+        total_pages = target.execute("PRAGMA page_count").fetchone()[0]
+        target.execute("PRAGMA journal_mode = WAL")
+    finally:
+        target.close()
+        source.close()
+    return BackupResult(db_path, total_pages, time.perf_counter() - started, 1)
+
+
+# -----------------------------
+# GENERATIONS
+# -----------------------------
+class BackupManager:
+    """Takes and rotates the hourly/daily generations of one database."""
+
+    def __init__(self, db_path: str = DB_PATH, backup_dir: str = BACKUP_DIR,
+                 keep_hourly: int = KEEP_HOURLY, keep_daily: int = KEEP_DAILY):
+        if keep_hourly <= 0 or keep_daily <= 0:
+            raise ValueError("At least one backup of each generation must be kept")
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = {"hourly": keep_hourly, "daily": keep_daily}
+        self.name = os.path.splitext(os.path.basename(db_path))[0]
+        self._pattern = re.compile(rf"{re.escape(self.name)}-(hourly|daily|pre-restore)-([0-9-]+)\.db")
+
+    def backup_path(self, generation: str, when: datetime) -> str:
+        return os.path.join(self.backup_dir, f"{self.name}-{generation}-{when.strftime(GENERATIONS[generation])}.db")
+
+    def list_backups(self, generation: Optional[str] = None) -> List[str]:
+        """Backup files, oldest first (the timestamps in the names sort chronologically)."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        found = []
+        for file_name in os.listdir(self.backup_dir):
+            match = self._pattern.fullmatch(file_name)
+            if match and generation in (None, match.group(1)):
+                found.append((match.group(2), file_name))
+        return [os.path.join(self.backup_dir, file_name) for _, file_name in sorted(found)]
+
+    def run_due(self, now: datetime = None, **backup_options) -> List[str]:
+        """Takes this hour's backup and today's daily one if they don't exist yet; prunes old ones. Returns new files."""
+        now = now or datetime.now()
+        os.makedirs(self.backup_dir, exist_ok=True)
+        created = []
+
+        hourly = self.backup_path("hourly", now)
+        if not os.path.exists(hourly):
+            online_backup(self.db_path, hourly, **backup_options)
+            created.append(hourly)
+
+        daily = self.backup_path("daily", now)
+        if not os.path.exists(daily):
+            # promoted from the verified hourly copy: no second pass over the live database
+            shutil.copyfile(hourly, daily + ".tmp")
+            os.replace(daily + ".tmp", daily)
+            created.append(daily)
+
+        self.prune()
+        return created
+
+    def prune(self) -> List[str]:
+        removed = []
+        for generation, keep in self.keep.items():
+            for path in self.list_backups(generation)[:-keep]:
+                os.remove(path)
+                removed.append(path)
+        return removed
+
+    def restore(self, backup_path: str, keep_current: bool = True) -> BackupResult:
+        """Restores a backup over the database; by default the current database is backed up first."""
+        if keep_current and os.path.exists(self.db_path):
+            os.makedirs(self.backup_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            online_backup(self.db_path, os.path.join(self.backup_dir, f"{self.name}-pre-restore-{stamp}.db"), sleep=0)
+        return restore(backup_path, self.db_path)
+
+
+class BackupScheduler(threading.Thread):
+    """Background thread that calls run_due() every `interval` seconds until stop()."""
+
+    def __init__(self, manager: BackupManager, interval: float = WATCH_INTERVAL):
+        super().__init__(name="backup-scheduler", daemon=True)
+        self.manager = manager
+        self.interval = interval
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.manager.run_due()
+                self.last_error = None
+            except Exception as e:  # a failed backup must never take the app down; the next round retries
+                self.last_error = e
+                print(f"[BACKUP] Backup failed: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Online backups of the clinic database.")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="backup folder (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("now", help="take the backups that are due")
+    commands.add_parser("watch", help="take due backups every few minutes until interrupted")
+    commands.add_parser("list", help="list the backups")
+    restore_command = commands.add_parser("restore", help="restore a backup over the database")
+    restore_command.add_argument("backup")
+    restore_command.add_argument("--no-keep-current", action="store_true",
+                                 help="don't back up the current database first")
+    args = parser.parse_args(argv)
+
+    manager = BackupManager(args.db, args.dir)
+    if args.command == "now":
+        for path in manager.run_due():
+            print(f"[BACKUP] Created {path}")
+    elif args.command == "watch":
+        scheduler = BackupScheduler(manager)
+        scheduler.start()
+        try:
+            while scheduler.is_alive():
+                scheduler.join(1)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    elif args.command == "list":
+        for path in manager.list_backups():
+            print(f"{path}  {os.path.getsize(path) / (1024 * 1024):.1f} MiB")
+    else:
+        result = manager.restore(args.backup, keep_current=not args.no_keep_current)
+        print(f"[BACKUP] Restored {args.backup} over {args.db} ({result.pages} pages, {result.elapsed:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import os
-import sqlite3
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate, get_schema_version
+from db.statements import check_schema
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "database.db")
-SCHEMA_PATH = os.path.join(BASE_DIR, "schema.sql")
 
 def ensure_data_folder():
     data_dir = os.path.join(BASE_DIR)
@@ -11,27 +13,25 @@ def ensure_data_folder():
         os.makedirs(data_dir)
         print(f"[BOOTSTRAP] Created folder: {data_dir}")
 
-def load_schema():
-    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
-        return f.read()
-
-def initialize_database():
+def initialize_database(db_path=DB_PATH):
     ensure_data_folder()
 
-    should_create = not os.path.exists(DB_PATH)
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    should_create = not os.path.exists(db_path)
 
-    schema_sql = load_schema()
-    cursor.executescript(schema_sql)
-    conn.commit()
-    conn.close()
+    conn = create_connection("writer", path=db_path)
+    applied = migrate(conn)  # a single PRAGMA read when the schema is already current
+    version = get_schema_version(conn)
+    try:
+        check_schema(conn)  # the models in db/models.py must match the tables they are saved to
+    finally:
+        close_connection(conn)
 
     if should_create:
-        print(f"[BOOTSTRAP] Created new SQLite database at: {DB_PATH}")
+        print(f"[BOOTSTRAP] Created new SQLite database at: {db_path} (schema v{version})")
+    elif applied:
+        print(f"[BOOTSTRAP] Migrated database at: {db_path} to schema v{version} (applied: {applied})")
     else:
-        print(f"[BOOTSTRAP] Verified schema on existing database at: {DB_PATH}")
+        print(f"[BOOTSTRAP] Schema v{version} is current on existing database at: {db_path}")
 
 if __name__ == "__main__":
     initialize_database()
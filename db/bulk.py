@@ -0,0 +1,109 @@
+"""
+Bulk inserts.
+
+Rows are inserted with executemany() in chunks, one transaction per chunk (one durable write per chunk instead of
+one per record). Inside a transaction() block each chunk becomes a savepoint and the outer block commits.
+
+The sqlite3 module adapts None through its slow protocol-lookup path, which dominated the insert time of our wide,
+mostly-empty exam rows. A long run of consecutive rows with the same non-NULL columns (imports of one form) is inserted
+by one executemany() of an INSERT naming only those columns, the others defaulting to NULL. Shorter runs are not worth a
+statement of their own: their rows are batched into one INSERT of the columns any of them sets, binding the few NULLs
+left.
+"""
+import operator
+from functools import lru_cache
+from itertools import compress, repeat
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+from db.transaction import transaction
+from db.utils import chunked
+
+BULK_CHUNK_SIZE = 5000
+MIN_RUN = 64  # rows with the same NULL columns needed before they get their own INSERT
+
+
+@lru_cache(maxsize=1024)
+def insert_sql(table: str, columns: Tuple[str, ...]) -> str:
+    if not columns:
+        return f"INSERT INTO {table} DEFAULT VALUES"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+
+def runs_by_columns(rows: Iterable[Sequence]):
+    """Splits rows into consecutive runs that share the same non-NULL columns: yields (non-NULL mask, rows)."""
+    run_key, run = None, []
+    for row in rows:
+        key = tuple(map(operator.is_not, row, repeat(None)))
+        if key != run_key:
+            if run:
+                yield run_key, run
+            run_key, run = key, []
+        run.append(row)
+    if run:
+        yield run_key, run
+
+
+def insert_rows(conn, table: str, columns: Sequence[str], key: Sequence[bool], rows: List[Sequence]):
+    """One executemany() of an INSERT naming only the `columns` selected by `key`."""
+    if all(key):
+        conn.executemany(insert_sql(table, tuple(columns)), rows)
+        return
+    conn.executemany(insert_sql(table, tuple(compress(columns, key))), (tuple(compress(row, key)) for row in rows))
+
+
+def insert_runs(conn, table: str, columns: Sequence[str], rows: Iterable[Sequence]):
+    """
+    Inserts rows of `columns` values in order. Runs of at least MIN_RUN rows with the same non-NULL columns get an
+    INSERT of only those columns; the rows in between are batched into one INSERT of the columns any of them sets.
+    """
+    mixed, mixed_key = [], None
+    for key, run in runs_by_columns(rows):
+        if len(run) < MIN_RUN:
+            mixed.extend(run)
+            mixed_key = key if mixed_key is None else tuple(map(operator.or_, mixed_key, key))
+            continue
+        if mixed:
+            insert_rows(conn, table, columns, mixed_key, mixed)
+            mixed, mixed_key = [], None
+        insert_rows(conn, table, columns, key, run)
+    if mixed:
+        insert_rows(conn, table, columns, mixed_key, mixed)
+
+
+def bulk_insert(conn, table: str, columns: Sequence[str], items: Iterable, to_params: Callable,
+                chunk_size: int = BULK_CHUNK_SIZE, on_inserted: Callable = None, on_chunk: Callable = None) -> List[int]:
+    """
+    Inserts `items` (any iterable, generators included) into `table`; `to_params(item)` gives the values of
+    `columns` for one item. Returns the assigned ids, in input order. `on_inserted(item, id)` is called per item.
+    `on_chunk(items, ids)` runs inside each chunk's transaction, e.g. to insert the rows of a side table.
+
+    The ids are derived from last_insert_rowid(): the tables use AUTOINCREMENT, the rows are inserted in input order
+    and the chunk runs under the write lock, so the rows of one chunk get consecutive ids.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer")
+
+    columns = tuple(columns)
+    ids = []
+    for chunk in chunked(items, chunk_size):
+        with transaction(conn):
+            insert_runs(conn, table, columns, map(to_params, chunk))
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            chunk_ids = range(last_id - len(chunk) + 1, last_id + 1)
+            if on_chunk is not None:
+                on_chunk(chunk, chunk_ids)
+        if on_inserted is not None:
+            for item, item_id in zip(chunk, chunk_ids):
+                on_inserted(item, item_id)
+        ids.extend(chunk_ids)
+    return ids
+
+
+def set_id(item, item_id):
+    item.id = item_id
+
+
+def set_id_clean(item, item_id):
+    """on_inserted for tracked models: like add_test(), a bulk-inserted test starts clean."""
+    item.id = item_id
+    item.mark_clean()
@@ -0,0 +1,190 @@
+"""
+Interned catalog strings.
+
+Manufacturer, supplier, brand, material, color and coating names repeat the same few hundred strings over every exam,
+typed with small variations ("Ray-Ban", "RAY BAN ", "ray-ban"). glasses_tests_cold (migration 11) and
+contact_lenses_tests (migration 12) store them as ids into catalog_values: one row per (kind, key), where the key is the
+normalized spelling and the value the spelling shown (the first one written; at migration time the most common one).
+Spellings of a name share its id, so "all exams with frame manufacturer X" is an integer index lookup and a report
+groups by integers.
+
+A Catalog is the in-process intern cache of one repo: id -> value to decode rows (the values are sys.intern'ed, so
+all decoded exams share one string object per name) and (kind, key) -> id to encode writes. Catalog rows are never
+updated or deleted, with one exception: a row inserted in a transaction that is rolled back disappears, and SQLite
+may give its id to another name. So entries learned inside a transaction are kept as pending, and check() - called
+by the repo before each use - re-reads them until they are seen committed.
+
+catalog_key() is part of the stored data: changing it splits existing names in two.
+"""
+import re
+import sys
+import unicodedata
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from db.utils import chunked
+
+# column -> catalog kind, per table. Columns of one kind share names: a lens maker can make frames too.
+CATALOG_COLUMNS: Dict[str, Dict[str, str]] = {
+    "glasses_tests_cold": {
+        "lenses_material": "material",
+        "lenses_manufacturer": "manufacturer",
+        "lenses_color": "color",
+        "lenses_coated": "coating",
+        "frame_manufacturer": "manufacturer",
+        "frame_supplier": "supplier",
+        "frame_color": "color",
+    },
+    "contact_lenses_tests": {
+        "r_manufacturer": "manufacturer",
+        "r_brand": "brand",
+        "r_material": "material",
+        "l_manufacturer": "manufacturer",
+        "l_brand": "brand",
+        "l_material": "material",
+    },
+}
+
+_NOT_KEY = re.compile(r"[\W_]+")
+
+
+def clean_catalog_value(value) -> Optional[str]:
+    """The spelling to store: surrounding and repeated whitespace removed; None for a blank value."""
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return value or None
+
+
+def catalog_key(value: str) -> str:
+    """The lookup key of a cleaned value: case, spaces and punctuation don't count ("Ray-Ban" = "RAY BAN")."""
+    key = _NOT_KEY.sub("", unicodedata.normalize("NFKC", value).casefold())
+    return key or value  # a name of punctuation only is its own key
+
+
+class _Values(dict):
+    """id -> value; an id not cached yet is read from the database."""
+
+    def __init__(self, catalog):
+        super().__init__({None: None})
+        self.catalog = catalog
+
+    def __missing__(self, value_id):
+        return self.catalog.fetch(value_id)
+
+
+class Catalog:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.values = _Values(self)
+        self.ids: Dict[Tuple[str, str], int] = {}
+        self.spelled: Dict[Tuple[str, str], int] = {}  # (kind, value as written) -> id: skips normalizing repeats
+        self.pending: Dict[int, Tuple[str, str]] = {}  # learned inside a transaction: id -> (kind, key)
+        self.loaded = False
+
+    # -----------------------------
+    # Cache
+    # -----------------------------
+    def load(self):
+        """Caches the whole catalog (a few hundred rows)."""
+        for row in self.conn.execute("SELECT id, kind, key, value FROM catalog_values"):
+            self._remember(*row)
+        self.loaded = True
+
+    def check(self):
+        """Drops pending entries whose rows were rolled back; they count as committed once seen outside a transaction."""
+        if not self.pending:
+            return
+        in_transaction = self.conn.in_transaction
+        stale = set()
+        for ids in chunked(list(self.pending), 500):
+            found = {row[0]: (row[1], row[2]) for row in self.conn.execute(
+                f"SELECT id, kind, key FROM catalog_values WHERE id IN ({', '.join('?' for _ in ids)})", ids)}
+            for value_id in ids:
+                if found.get(value_id) != self.pending[value_id]:
+                    stale.add(value_id)
+                    self.values.pop(value_id, None)
+                    self.ids.pop(self.pending.pop(value_id), None)
+                elif not in_transaction:
+                    del self.pending[value_id]
+        if stale:
+            self.spelled = {spelling: value_id for spelling, value_id in self.spelled.items() if value_id not in stale}
+
+    def _remember(self, value_id, kind, key, value) -> str:
+        value = sys.intern(value)
+        self.values[value_id] = value
+        self.ids[(kind, key)] = value_id
+        if self.conn.in_transaction:
+            self.pending[value_id] = (kind, key)
+        return value
+
+    # -----------------------------
+    # Decoding
+    # -----------------------------
+    def fetch(self, value_id) -> Optional[str]:
+        if not self.loaded:
+            self.load()
+            if value_id in self.values:
+                return self.values[value_id]
+        row = self.conn.execute("SELECT id, kind, key, value FROM catalog_values WHERE id = ?", (value_id,)).fetchone()
+        return self._remember(*row) if row is not None else None
+
+    # -----------------------------
+    # Encoding (normalization on write)
+    # -----------------------------
+    def find(self, kind: str, value) -> Optional[int]:
+        """The id of a name in any spelling, or None if it was never written."""
+        value = clean_catalog_value(value)
+        if value is None:
+            return None
+        key = catalog_key(value)
+        if (kind, key) not in self.ids:
+            if not self.loaded:
+                self.load()
+            else:
+                row = self.conn.execute("SELECT id, kind, key, value FROM catalog_values WHERE kind = ? AND key = ?",
+                                        (kind, key)).fetchone()
+                if row is not None:
+                    self._remember(*row)
+        return self.ids.get((kind, key))
+
+    def encode(self, kind: str, value) -> Optional[int]:
+        """The id of a name, added to the catalog as spelled here if it is new."""
+        if value is None:
+            return None
+        value_id = self.spelled.get((kind, value))
+        if value_id is not None:
+            return value_id
+        value_id = self.find(kind, value)
+        cleaned = clean_catalog_value(value)
+        if value_id is None and cleaned is not None:
+            key = catalog_key(cleaned)
+            value_id = self.conn.execute("INSERT INTO catalog_values (kind, key, value) VALUES (?, ?, ?)",
+                                         (kind, key, cleaned)).lastrowid
+            self._remember(value_id, kind, key, cleaned)
+        if value_id is not None:
+            self.spelled[(kind, value)] = value_id
+        return value_id
+
+    def encoders(self, table: str) -> Dict[str, Callable]:
+        """{column: value -> id} for the catalog columns of `table`."""
+        return {column: _encoder(self, kind) for column, kind in CATALOG_COLUMNS.get(table, {}).items()}
+
+    def row_encoder(self, table: str, columns: Sequence[str]) -> Optional[Callable]:
+        """Values of `columns` -> the same values with the catalog columns encoded; None if there are none."""
+        encoders = self.encoders(table)
+        encoded = [(i, encoders[c]) for i, c in enumerate(columns) if c in encoders]
+        if not encoded:
+            return None
+
+        def encode_row(values):
+            values = list(values)
+            for i, encode in encoded:
+                values[i] = encode(values[i])
+            return tuple(values)
+
+        return encode_row
+
+
+def _encoder(catalog: Catalog, kind: str) -> Callable:
+    return lambda value: catalog.encode(kind, value)
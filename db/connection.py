@@ -1,15 +1,126 @@
 import sqlite3
+from dataclasses import dataclass
+from typing import Optional
+
 from db.db_config import DATABASE_PATH  # Import path is relative to where we're running the main.py file from (root),
 # even though here it's inside the connection.py file.
 # So instead of "from db_config" use "from db.db_config" because it's relative
 # to the main.py file and not this file (although it's inside this file connection.py).
 
+
+@dataclass(frozen=True)
+class ConnectionProfile:
+    """
+    The PRAGMA settings a connection is opened with.
+    Every connection in the app goes through one of the profiles below, so the tuning lives in one place.
+    """
+    name: str
+    read_only: bool = False
+    journal_mode: Optional[str] = "WAL"  # None = leave the database's journal mode untouched
+    synchronous: str = "NORMAL"  # NORMAL is durable enough in WAL mode and skips the fsync on every commit
+    cache_size_kib: int = 16 * 1024  # page cache, in KiB
+    mmap_size: int = 64 * 1024 * 1024  # bytes, 0 disables memory-mapped I/O
+    temp_store: str = "MEMORY"
+    foreign_keys: bool = True
+    busy_timeout_ms: int = 5000  # wait for a lock instead of failing with "database is locked"
+    optimize_on_close: bool = True
+
+
+# The front-desk / examiner connection: the only one that writes.
+WRITER_PROFILE = ConnectionProfile(name="writer")
+
+# Reports, exports and the companion-app API: never writes, never changes the journal mode.
+READER_PROFILE = ConnectionProfile(
+    name="reader",
+    read_only=True,
+    journal_mode=None,
+    cache_size_kib=8 * 1024,
+    optimize_on_close=False,
+)
+
+# Unit tests: a private in-memory database, durability is irrelevant.
+MEMORY_PROFILE = ConnectionProfile(
+    name="memory",
+    journal_mode="MEMORY",
+    synchronous="OFF",
+    cache_size_kib=2 * 1024,
+    mmap_size=0,
+    busy_timeout_ms=0,
+    optimize_on_close=False,
+)
+
+PROFILES = {profile.name: profile for profile in (WRITER_PROFILE, READER_PROFILE, MEMORY_PROFILE)}
+
 _conn = None
 
+# The profile of each connection opened by create_connection(), by id(conn): close_connection() looks it up.
+_profiles = {}
+
+
+def _resolve_profile(profile) -> ConnectionProfile:
+    if isinstance(profile, ConnectionProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown connection profile: {profile!r}") from None
+
+
+def apply_profile(conn: sqlite3.Connection, profile: ConnectionProfile) -> None:
+    """Runs the profile's PRAGMAs on an already-open connection."""
+    if profile.journal_mode and not profile.read_only:
+        conn.execute(f"PRAGMA journal_mode = {profile.journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {profile.synchronous}")
+    conn.execute(f"PRAGMA cache_size = {-profile.cache_size_kib}")  # negative value = size in KiB, not pages
+    conn.execute(f"PRAGMA mmap_size = {profile.mmap_size}")
+    conn.execute(f"PRAGMA temp_store = {profile.temp_store}")
+    conn.execute(f"PRAGMA foreign_keys = {'ON' if profile.foreign_keys else 'OFF'}")
+    conn.execute(f"PRAGMA busy_timeout = {profile.busy_timeout_ms}")
+    if profile.read_only:
+        conn.execute("PRAGMA query_only = ON")
+
+
+def create_connection(profile="writer", path: str = DATABASE_PATH) -> sqlite3.Connection:
+    """
+    Opens a new connection tuned for the given role ("writer", "reader", "memory" or a ConnectionProfile).
+    The "memory" profile ignores the path and opens a private in-memory database.
+    """
+    profile = _resolve_profile(profile)
+
+    if profile is MEMORY_PROFILE or path == ":memory:":
+        conn = sqlite3.connect(":memory:")
+    elif profile.read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=profile.busy_timeout_ms / 1000)
+    else:
+        conn = sqlite3.connect(path, timeout=profile.busy_timeout_ms / 1000)
+
+    conn.row_factory = sqlite3.Row  # dict-like rows for convenience
+    apply_profile(conn, profile)
+    _profiles[id(conn)] = profile
+    return conn
+
+
+def close_connection(conn: sqlite3.Connection) -> None:
+    """
+    Closes a connection opened by create_connection().
+    If its profile asks for it, SQLite refreshes its query-planner statistics first:
+    PRAGMA optimize is cheap, it only analyzes tables whose statistics are stale.
+    """
+    global _conn
+    profile = _profiles.pop(id(conn), None)
+    if profile is not None and profile.optimize_on_close:
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass  # read-only / busy database: the statistics will be refreshed next time
+    conn.close()
+    if conn is _conn:
+        _conn = None
+
 
 def get_connection():
+    """The app-wide writer connection (opened once, with the writer profile)."""
     global _conn
     if _conn is None:
-        _conn = sqlite3.connect(DATABASE_PATH)
-        _conn.row_factory = sqlite3.Row  # dict-like rows for convenience
+        _conn = create_connection(WRITER_PROFILE)
     return _conn
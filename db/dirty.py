@@ -0,0 +1,97 @@
+"""
+Dirty-field tracking for the exam models.
+
+A model loaded by a repo's single-record reads (get_test, get_latest_test - the records that get edited) remembers
+the values it was loaded with; lists and streams skip the snapshot. On save, the repo compares the current values with
+that snapshot and UPDATEs only the changed columns - correcting one axis sends one column, so the row's other
+columns, the triggers that watch them and the change log are left alone. A save with no changes skips the database.
+
+The UPDATE statement for each (table, column set) is built once and cached, so sqlite3's statement cache sees the
+same SQL text for the same kind of edit.
+
+Models built in code (e.g. from a form dict) and list items have no snapshot: all their fields count as changed.
+
+For a model split over a main and a cold table (glasses_tests / glasses_tests_cold), each table gets the UPDATE of
+its own changed columns. A missing cold row (an exam inserted by plain SQL) is created first, so the UPDATE - and its
+change-log trigger - still run.
+"""
+from dataclasses import fields
+from functools import lru_cache
+from operator import attrgetter
+from typing import Callable, Dict, Optional, Tuple
+
+from db.transaction import commit
+
+
+class TrackedModel:
+    """Base of the models that remember their loaded values (the dataclass fields are compared, in order)."""
+    __slots__ = ("_loaded",)
+
+    def mark_clean(self):
+        """Takes the current values as the saved state - called by the repo after a load or a save."""
+        self._loaded = tracked_fields(type(self))[1](self)
+
+    def changed_fields(self) -> Optional[Tuple[str, ...]]:
+        """The fields changed since load/save, in declaration order; None if the model was never loaded."""
+        loaded = getattr(self, "_loaded", None)
+        if loaded is None:
+            return None
+        names, snapshot = tracked_fields(type(self))
+        return tuple(name for name, old, new in zip(names, loaded, snapshot(self)) if old != new)
+
+
+@lru_cache(maxsize=None)
+def tracked_fields(cls) -> Tuple[Tuple[str, ...], Callable]:
+    """(field names, getter returning their values as a tuple) of a TrackedModel dataclass."""
+    names = tuple(f.name for f in fields(cls) if f.init)
+    return names, attrgetter(*names)
+
+
+@lru_cache(maxsize=512)
+def update_sql(table: str, columns: Tuple[str, ...]) -> str:
+    return f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?"
+
+
+@lru_cache(maxsize=64)
+def insert_cold_sql(table: str, cold_table: str) -> str:
+    """INSERT of an empty cold row, only if its main row exists (parameters: id, id)."""
+    return f"INSERT INTO {cold_table} (id) SELECT ? WHERE EXISTS (SELECT 1 FROM {table} WHERE id = ?)"
+
+
+def save_changes(conn, table: str, model: TrackedModel, encoders: Dict[str, Callable] = None,
+                 cold_table: str = None, cold_columns: Tuple[str, ...] = ()) -> Optional[int]:
+    """
+    UPDATEs the model's changed columns (all of them if it was never loaded) and marks it clean.
+    Columns in `cold_columns` are written to `cold_table` instead.
+    Returns the number of rows updated, or None when nothing changed and the database wasn't touched.
+    """
+    changed = model.changed_fields()
+    if changed is None:
+        changed = tracked_fields(type(model))[0]
+    columns = tuple(c for c in changed if c != "id" and c not in cold_columns)
+    cold = tuple(c for c in changed if c in cold_columns)
+    if not columns and not cold:
+        return None
+
+    encoders = encoders or {}
+    updated = None
+    if columns:
+        updated = conn.execute(update_sql(table, columns), (*_encoded(model, columns, encoders), model.id)).rowcount
+    if cold:
+        params = (*_encoded(model, cold, encoders), model.id)
+        cold_updated = conn.execute(update_sql(cold_table, cold), params).rowcount
+        if cold_updated == 0 and updated != 0:
+            if conn.execute(insert_cold_sql(table, cold_table), (model.id, model.id)).rowcount:
+                cold_updated = conn.execute(update_sql(cold_table, cold), params).rowcount
+        updated = cold_updated if updated is None else updated
+    commit(conn)
+    model.mark_clean()
+    return updated
+
+
+def _encoded(model, columns, encoders):
+    params = [getattr(model, c) for c in columns]
+    for i, column in enumerate(columns):
+        if column in encoders:
+            params[i] = encoders[column](params[i])
+    return params
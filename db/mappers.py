@@ -0,0 +1,88 @@
+"""
+Row -> model mapping.
+
+For each (model, column list) pair a constructor is compiled once: a generated function that passes the row's
+values to the model positionally (`Model(row[0], row[1], conv(row[2]), ...)`).
+Decoding a row is then a single call - no dict(row), no dataclasses.fields(), no per-row key lookups.
+Repos SELECT the exact column lists below, so the positions always line up.
+"""
+from dataclasses import fields
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from db.models import Customer, GlassesTest, ContactLensesTest, GlassesTestSummary, ContactLensesTestSummary
+from db.utils import decode_exam_date
+
+
+def model_columns(cls) -> Tuple[str, ...]:
+    """The model's constructor fields, in declaration order (= the column order the repos select)."""
+    return tuple(f.name for f in fields(cls) if f.init)
+
+
+def select_list(columns: Sequence[str], alias: Optional[str] = None) -> str:
+    """SQL projection for a column list, optionally qualified with a table alias."""
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + c for c in columns)
+
+
+def make_row_mapper(cls, columns: Sequence[str], converters: Optional[Dict[str, Callable]] = None):
+    """
+    Compiles a function that turns a row (sqlite3.Row or tuple) with the given columns into a `cls` instance.
+    Columns the model doesn't know are ignored; `converters` maps a column to a function applied to its value.
+    """
+    converters = converters or {}
+    model_fields = model_columns(cls)
+    known = set(model_fields)
+    positions = {name: i for i, name in enumerate(columns) if name in known}
+
+    namespace = {"_cls": cls}
+    args = []
+    for name in model_fields:
+        if name not in positions:
+            continue
+        value = f"row[{positions[name]}]"
+        if name in converters:
+            namespace[f"_conv_{name}"] = converters[name]
+            value = f"_conv_{name}({value})"
+        args.append((name, value))
+
+    if len(args) == len(model_fields):
+        call = ", ".join(value for _, value in args)  # every field present: positional call, the fastest form
+    else:
+        call = ", ".join(f"{name}={value}" for name, value in args)
+
+    source = f"def map_row(row):\n    return _cls({call})\n"
+    exec(source, namespace)
+    return namespace["map_row"]
+
+
+@lru_cache(maxsize=None)
+def row_mapper(cls, columns: Tuple[str, ...]):
+    """Cached make_row_mapper() for ad-hoc column lists (e.g. SELECT * on a fixture table)."""
+    return make_row_mapper(cls, columns)
+
+
+# -----------------------------
+# Compiled once, at import time
+# -----------------------------
+CUSTOMER_COLUMNS = model_columns(Customer)
+GLASSES_TEST_COLUMNS = model_columns(GlassesTest)
+CONTACT_LENSES_TEST_COLUMNS = model_columns(ContactLensesTest)
+
+CUSTOMER_SELECT = select_list(CUSTOMER_COLUMNS)
+GLASSES_TEST_SELECT = select_list(GLASSES_TEST_COLUMNS)
+CONTACT_LENSES_TEST_SELECT = select_list(CONTACT_LENSES_TEST_COLUMNS)
+
+customer_from_row = make_row_mapper(Customer, CUSTOMER_COLUMNS)
+glasses_test_from_row = make_row_mapper(GlassesTest, GLASSES_TEST_COLUMNS, {"exam_date": decode_exam_date})
+contact_lenses_test_from_row = make_row_mapper(ContactLensesTest, CONTACT_LENSES_TEST_COLUMNS, {"exam_date": decode_exam_date})
+
+# History list screens: the summary projections (served from the covering indexes of migration 9)
+GLASSES_TEST_SUMMARY_COLUMNS = model_columns(GlassesTestSummary)
+CONTACT_LENSES_TEST_SUMMARY_COLUMNS = model_columns(ContactLensesTestSummary)
+
+GLASSES_TEST_SUMMARY_SELECT = select_list(GLASSES_TEST_SUMMARY_COLUMNS)
+CONTACT_LENSES_TEST_SUMMARY_SELECT = select_list(CONTACT_LENSES_TEST_SUMMARY_COLUMNS)
+
+glasses_test_summary_from_row = make_row_mapper(GlassesTestSummary, GLASSES_TEST_SUMMARY_COLUMNS, {"exam_date": decode_exam_date})
+contact_lenses_test_summary_from_row = make_row_mapper(ContactLensesTestSummary, CONTACT_LENSES_TEST_SUMMARY_COLUMNS, {"exam_date": decode_exam_date})
@@ -0,0 +1,662 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in the database itself (PRAGMA user_version).
+Each migration is a numbered step that runs once, inside its own transaction, and bumps user_version.
+When the database is already current, migrate() costs a single PRAGMA read.
+"""
+import re
+import sqlite3
+import unicodedata
+from datetime import date, datetime
+from typing import Callable, List, NamedTuple
+
+from db.schema import SCHEMA_STATEMENTS
+from db.utils import iter_rows
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Registers the decorated function as the migration step for the given version."""
+    def register(func):
+        if MIGRATIONS and MIGRATIONS[-1].version >= version:
+            raise ValueError(f"Migration {version} must be registered after {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return register
+
+
+def run_statements(conn, statements):
+    for statement in statements:
+        conn.execute(statement)
+
+
+# -----------------------------
+# MIGRATION STEPS
+# -----------------------------
+@migration(1, "Base tables: customers, glasses_tests, contact_lenses_tests")
+def _base_schema(conn):
+    run_statements(conn, SCHEMA_STATEMENTS)
+
+
+@migration(2, "Indexes for SSN lookups and per-customer exam histories")
+def _lookup_indexes(conn):
+    run_statements(conn, (
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_ssn ON customers (ssn)",
+        "CREATE INDEX IF NOT EXISTS idx_glasses_tests_customer_date ON glasses_tests (customer_id, exam_date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_contact_lenses_tests_customer_date ON contact_lenses_tests (customer_id, exam_date DESC)",
+    ))
+
+
+@migration(3, "Full-text search over customers (FTS5), kept in sync by triggers")
+def _customers_fts(conn):
+    # unicode61 tokenizes Hebrew and Latin alike; remove_diacritics lets "jose" find "José".
+    # The prefix indexes make "dav"* style queries (every keystroke in the search box) index lookups.
+    run_statements(conn, (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+            fname, lname, ssn, tel_home, tel_mobile, town,
+            content='customers', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='1 2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+            INSERT INTO customers_fts (rowid, fname, lname, ssn, tel_home, tel_mobile, town)
+            VALUES (new.id, new.fname, new.lname, new.ssn, new.tel_home, new.tel_mobile, new.town);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, fname, lname, ssn, tel_home, tel_mobile, town)
+            VALUES ('delete', old.id, old.fname, old.lname, old.ssn, old.tel_home, old.tel_mobile, old.town);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF fname, lname, ssn, tel_home, tel_mobile, town ON customers BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, fname, lname, ssn, tel_home, tel_mobile, town)
+            VALUES ('delete', old.id, old.fname, old.lname, old.ssn, old.tel_home, old.tel_mobile, old.town);
+            INSERT INTO customers_fts (rowid, fname, lname, ssn, tel_home, tel_mobile, town)
+            VALUES (new.id, new.fname, new.lname, new.ssn, new.tel_home, new.tel_mobile, new.town);
+        END
+        """,
+        "INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')",  # index the customers that already exist
+    ))
+
+
+@migration(4, "Index for paging customers by last name")
+def _customers_lname_index(conn):
+    # The rowid is implicitly the last column of every index, so this also serves ORDER BY lname, id.
+    run_statements(conn, (
+        "CREATE INDEX IF NOT EXISTS idx_customers_lname ON customers (lname)",
+    ))
+
+
+# Free-text birth dates, tried in order (as in db/utils.py at the time of migration 5)
+_BIRTH_DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d.%m.%Y", "%d-%m-%Y")
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _birth_date_to_epoch_day(text):
+    """A free-text birth date -> days since 1970-01-01, or None if it isn't a date."""
+    if not text:
+        return None
+    text = str(text).strip()
+    for fmt in _BIRTH_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().toordinal() - _EPOCH_ORDINAL
+        except ValueError:
+            continue
+    return None
+
+
+@migration(5, "Typed dates: normalized exam_date text, indexed birth_day (epoch days)")
+def _typed_dates(conn):
+    # exam_date must be 'YYYY-MM-DDTHH:MM:SS' everywhere for text order = date order (sorting, ranges, keyset paging).
+    # Older writes could produce 'YYYY-MM-DD HH:MM:SS[.ffffff]' or a bare date.
+    for table in ("glasses_tests", "contact_lenses_tests"):
+        conn.execute(f"""
+            UPDATE {table}
+            SET exam_date = substr(exam_date, 1, 10) || 'T' || substr(exam_date, 12, 8)
+            WHERE exam_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][ T][0-9][0-9]:[0-9][0-9]:[0-9][0-9]*'
+              AND (substr(exam_date, 11, 1) = ' ' OR length(exam_date) > 19)
+        """)
+        conn.execute(f"""
+            UPDATE {table}
+            SET exam_date = exam_date || 'T00:00:00'
+            WHERE exam_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+        """)
+
+    # birth_date stays the free text the examiner typed; birth_day is its parsed, indexable twin.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(customers)")}
+    if "birth_day" not in columns:
+        conn.execute("ALTER TABLE customers ADD COLUMN birth_day INTEGER")
+
+    cursor = conn.execute("SELECT id, birth_date FROM customers WHERE birth_date IS NOT NULL")
+    updates = [(_birth_date_to_epoch_day(birth_date), customer_id) for customer_id, birth_date in iter_rows(cursor)]
+    conn.executemany("UPDATE customers SET birth_day = ? WHERE id = ?", updates)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_birth_day ON customers (birth_day)")
+
+
+DQ_TABLES = ("glasses_tests", "contact_lenses_tests")
+
+
+@migration(6, "Data-quality scanner: violations table, scan state and dirty-row tracking triggers")
+def _data_quality(conn):
+    run_statements(conn, (
+        """
+        CREATE TABLE IF NOT EXISTS dq_violations (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            customer_id INTEGER,
+            field TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            value
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_dq_violations_row ON dq_violations (table_name, row_id)",
+        "CREATE INDEX IF NOT EXISTS idx_dq_violations_customer ON dq_violations (customer_id)",
+        # rows inserted/updated/deleted since the last scan - an incremental scan re-checks only these
+        """
+        CREATE TABLE IF NOT EXISTS dq_dirty (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY (table_name, row_id)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS dq_scans (
+            table_name TEXT PRIMARY KEY,
+            scanned_at TEXT NOT NULL,
+            full_scan INTEGER NOT NULL,
+            rows_checked INTEGER NOT NULL
+        )
+        """,
+    ))
+    for table in DQ_TABLES:
+        for event, ref in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_dq_{event.lower()} AFTER {event} ON {table} BEGIN
+                    INSERT OR IGNORE INTO dq_dirty (table_name, row_id) VALUES ('{table}', {ref}.id);
+                END
+            """)
+
+
+@migration(7, "Import checkpoints (resumable legacy imports)")
+def _import_checkpoints(conn):
+    # Committed in the same transaction as each imported batch, so a resumed import never duplicates rows.
+    run_statements(conn, (
+        """
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            last_row INTEGER NOT NULL,
+            imported INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (source, kind)
+        )
+        """,
+    ))
+
+
+CHANGE_LOG_TABLES = ("customers", "glasses_tests", "contact_lenses_tests")
+
+
+@migration(8, "Change log (change-data capture for the companion app sync)")
+def _change_log(conn):
+    # AUTOINCREMENT: seq is never reused, even after the newest entries are compacted away,
+    # so a client's "synced up to seq N" cursor stays valid forever.
+    run_statements(conn, (
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D'))
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log (table_name, row_id)",
+    ))
+    # Cascaded deletes (customer -> exams) fire the exam triggers too, so they are logged as well.
+    for table in CHANGE_LOG_TABLES:
+        for event, ref in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_log_{event.lower()} AFTER {event} ON {table} BEGIN
+                    INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {ref}.id, '{event[0]}');
+                END
+            """)
+
+
+@migration(9, "Covering indexes for the exam history summaries")
+def _history_summary_indexes(conn):
+    # The per-customer date indexes now also carry the columns of the history summaries (GlassesTestSummary,
+    # ContactLensesTestSummary), so a history list is read from the index alone - a few index pages per customer
+    # instead of one wide row per exam. `id` follows exam_date so ORDER BY exam_date DESC, id (paging) stays an index
+    # walk. Spelled out here, not derived from the models: a migration must not change when a model does.
+    run_statements(conn, (
+        "DROP INDEX IF EXISTS idx_glasses_tests_customer_date",
+        """
+        CREATE INDEX idx_glasses_tests_customer_date ON glasses_tests (
+            customer_id, exam_date DESC, id, examiner,
+            r_sphere, r_cylinder, r_axis, r_add_read, l_sphere, l_cylinder, l_axis, l_add_read, glasses_role
+        )
+        """,
+        "DROP INDEX IF EXISTS idx_contact_lenses_tests_customer_date",
+        """
+        CREATE INDEX idx_contact_lenses_tests_customer_date ON contact_lenses_tests (
+            customer_id, exam_date DESC, id, examiner,
+            r_lens_type, r_lens_sph, r_lens_cyl, r_lens_axis, l_lens_type, l_lens_sph, l_lens_cyl, l_lens_axis
+        )
+        """,
+    ))
+
+
+GLASSES_TESTS_COLD_COLUMNS = (
+    "lenses_material", "lenses_diameter_1", "lenses_diameter_2", "lenses_diameter_decentration_horizontal",
+    "lenses_diameter_decentration_vertical", "segment_diameter", "lenses_manufacturer", "lenses_color",
+    "lenses_coated", "catalog_num", "frame_manufacturer", "frame_supplier", "frame_model", "frame_size",
+    "frame_bar_length", "frame_color", "notes",
+)
+
+
+@migration(10, "Hot/cold split of glasses_tests: lens/frame ordering details and notes move to glasses_tests_cold")
+def _glasses_tests_cold(conn):
+    # The refraction (read by every history, scan and sync) stays in glasses_tests; the dispensing details and the
+    # notes - most of a row's bytes, read only when one exam is opened - move to a 1:1 side table (the repo writes a
+    # cold row with every exam). glasses_tests_full joins the two back into the old shape; a missing cold row reads
+    # as NULLs there.
+    #
+    # SQLite's table rebuild: copy into a new table, drop the old one, rename, re-create its indexes and triggers
+    # verbatim. The cold table first references glasses_tests_new: dropping the old glasses_tests while a table
+    # references it would cascade-delete the copied rows (foreign keys are on), and the rename re-points the reference.
+    cold = ", ".join(GLASSES_TESTS_COLD_COLUMNS)
+    old_columns = [row[1] for row in conn.execute("PRAGMA table_info(glasses_tests)")]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'glasses_tests' AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL"
+    )]
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'glasses_tests'").fetchone()
+    run_statements(conn, (
+        """
+        CREATE TABLE glasses_tests_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            exam_date TEXT NOT NULL,
+            examiner TEXT,
+            r_fv TEXT,
+            r_sphere TEXT,
+            r_cylinder REAL,
+            r_axis INTEGER,
+            r_prism REAL,
+            r_base TEXT,
+            r_va TEXT,
+            both_va TEXT,
+            r_add_read REAL,
+            r_add_int REAL,
+            r_add_bif REAL,
+            r_add_mul REAL,
+            r_high REAL,
+            r_pd REAL,
+            sum_pd REAL,
+            near_pd REAL,
+            l_fv TEXT,
+            l_sphere REAL,
+            l_cylinder REAL,
+            l_axis INTEGER,
+            l_prism REAL,
+            l_base TEXT,
+            l_va TEXT,
+            l_add_read REAL,
+            l_add_int REAL,
+            l_add_bif REAL,
+            l_add_mul REAL,
+            l_high REAL,
+            l_pd REAL,
+            dominant_eye TEXT,
+            r_iop REAL,
+            l_iop REAL,
+            glasses_role TEXT,
+            diagnosis TEXT,
+
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE glasses_tests_cold (
+            id INTEGER PRIMARY KEY REFERENCES glasses_tests_new(id) ON DELETE CASCADE,
+            lenses_material TEXT,
+            lenses_diameter_1 REAL,
+            lenses_diameter_2 REAL,
+            lenses_diameter_decentration_horizontal REAL,
+            lenses_diameter_decentration_vertical REAL,
+            segment_diameter REAL,
+            lenses_manufacturer TEXT,
+            lenses_color TEXT,
+            lenses_coated TEXT,
+            catalog_num TEXT,
+            frame_manufacturer TEXT,
+            frame_supplier TEXT,
+            frame_model TEXT,
+            frame_size TEXT,
+            frame_bar_length TEXT,
+            frame_color TEXT,
+            notes TEXT
+        )
+        """,
+    ))
+    hot = ", ".join(row[1] for row in conn.execute("PRAGMA table_info(glasses_tests_new)"))
+    run_statements(conn, (
+        f"INSERT INTO glasses_tests_new ({hot}) SELECT {hot} FROM glasses_tests ORDER BY id",
+        f"""
+        INSERT INTO glasses_tests_cold (id, {cold}) SELECT id, {cold} FROM glasses_tests ORDER BY id
+        """,
+        "DROP TABLE glasses_tests",
+        "ALTER TABLE glasses_tests_new RENAME TO glasses_tests",
+        *dependents,
+    ))
+    if sequence is not None:  # AUTOINCREMENT: ids of deleted exams are never handed out again
+        conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'glasses_tests'", (sequence[0],))
+
+    # The full row, in the old column order: full reads, the data-quality rules, change-log rows and sync packs.
+    # A query using only glasses_tests columns skips the join (the cold side is joined on its primary key).
+    full = ", ".join(f"c.{c}" if c in GLASSES_TESTS_COLD_COLUMNS else f"t.{c}" for c in old_columns)
+    conn.execute(f"""
+        CREATE VIEW glasses_tests_full AS
+        SELECT {full} FROM glasses_tests AS t LEFT JOIN glasses_tests_cold AS c ON c.id = t.id
+    """)
+
+    # An edit of cold columns only is still an edit of the exam: logged and re-checked like one. The change-log entry
+    # is skipped when the newest one is already this exam (the hot UPDATE of the same save). Inserting a cold row
+    # isn't logged: it comes with the exam's own INSERT.
+    conn.execute("""
+        CREATE TRIGGER glasses_tests_cold_update AFTER UPDATE ON glasses_tests_cold BEGIN
+            INSERT INTO change_log (table_name, row_id, op)
+            SELECT 'glasses_tests', new.id, 'U'
+            WHERE NOT EXISTS (
+                SELECT 1 FROM change_log
+                WHERE seq = (SELECT max(seq) FROM change_log) AND table_name = 'glasses_tests' AND row_id = new.id
+            );
+            INSERT OR IGNORE INTO dq_dirty (table_name, row_id) VALUES ('glasses_tests', new.id);
+        END
+    """)
+
+
+# column -> catalog kind (as in db/catalog.py at the time of migration 11)
+GLASSES_TESTS_CATALOG_COLUMNS = {
+    "lenses_material": "material", "lenses_manufacturer": "manufacturer", "lenses_color": "color",
+    "lenses_coated": "coating", "frame_manufacturer": "manufacturer", "frame_supplier": "supplier",
+    "frame_color": "color",
+}
+
+
+# catalog_values normalization (as in db/catalog.py at the time of migration 11): the keys are stored data
+_NOT_KEY = re.compile(r"[\W_]+")
+
+
+def _clean_catalog_value(value):
+    """The spelling to store: surrounding and repeated whitespace removed; None for a blank value."""
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return value or None
+
+
+def _catalog_key(value):
+    """The lookup key of a cleaned value: case, spaces and punctuation don't count ("Ray-Ban" = "RAY BAN")."""
+    key = _NOT_KEY.sub("", unicodedata.normalize("NFKC", value).casefold())
+    return key or value  # a name of punctuation only is its own key
+
+
+def _intern_catalog_names(conn, table, catalog_columns):
+    """
+    Adds the names of `table`'s catalog columns to catalog_values - a new name with its most common spelling, a name
+    already there keeps its row. Returns {(kind, value as stored): id}.
+    """
+    spellings = {}  # (kind, key) -> {spelling: rows}
+    keys = {}  # (kind, value as stored) -> (kind, key)
+    for column, kind in catalog_columns.items():
+        for stored, count in conn.execute(f"""
+            SELECT {column}, count(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}
+        """):
+            value = _clean_catalog_value(stored)
+            if value is not None:
+                keys[(kind, stored)] = (kind, _catalog_key(value))
+                counts = spellings.setdefault(keys[(kind, stored)], {})
+                counts[value] = counts.get(value, 0) + count
+    conn.executemany("INSERT OR IGNORE INTO catalog_values (kind, key, value) VALUES (?, ?, ?)", (
+        (kind, key, min(counts, key=lambda v: (-counts[v], v))) for (kind, key), counts in sorted(spellings.items())
+    ))
+    ids = {(row[1], row[2]): row[0] for row in conn.execute("SELECT id, kind, key FROM catalog_values")}
+    return {stored: ids[key] for stored, key in keys.items()}
+
+
+@migration(11, "Catalog names (manufacturers, suppliers, materials, colors, coatings) interned into catalog_values")
+def _catalog_values(conn):
+    # The repeated names of glasses_tests_cold become ids into catalog_values, one row per normalized spelling
+    # (db/catalog.py). Each name keeps its most common spelling. glasses_tests_stored is the old glasses_tests_full
+    # (ids, decoded by the repo's Catalog); glasses_tests_full keeps the text shape for sync, change log and
+    # data-quality rules. It decodes with scalar subqueries, not joins: a read without cold columns still skips the
+    # cold table.
+    conn.execute("""
+        CREATE TABLE catalog_values (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            UNIQUE (kind, key)
+        )
+    """)
+    stored_ids = _intern_catalog_names(conn, "glasses_tests_cold", GLASSES_TESTS_CATALOG_COLUMNS)
+
+    def catalog_id(kind, value):
+        return stored_ids.get((kind, value))
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(glasses_tests_cold)")]
+    full = [row[1] for row in conn.execute("PRAGMA table_info(glasses_tests_full)")]
+    triggers = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'glasses_tests_cold' AND type = 'trigger'"
+    )]
+    definitions = ",\n".join(
+        f"{c} INTEGER REFERENCES catalog_values(id)" if c in GLASSES_TESTS_CATALOG_COLUMNS else f"{c} {t}"
+        for c, t in ((row[1], row[2]) for row in conn.execute("PRAGMA table_info(glasses_tests_cold)") if row[1] != "id")
+    )
+    encoded = ", ".join(f"catalog_id('{GLASSES_TESTS_CATALOG_COLUMNS[c]}', {c})" if c in GLASSES_TESTS_CATALOG_COLUMNS
+                        else c for c in columns)
+    conn.create_function("catalog_id", 2, catalog_id, deterministic=True)
+    try:
+        run_statements(conn, (
+            "DROP VIEW glasses_tests_full",
+            f"""
+            CREATE TABLE glasses_tests_cold_new (
+                id INTEGER PRIMARY KEY REFERENCES glasses_tests(id) ON DELETE CASCADE,
+                {definitions}
+            )
+            """,
+            f"INSERT INTO glasses_tests_cold_new ({', '.join(columns)}) SELECT {encoded} FROM glasses_tests_cold ORDER BY id",
+            "DROP TABLE glasses_tests_cold",
+            "ALTER TABLE glasses_tests_cold_new RENAME TO glasses_tests_cold",
+            *triggers,
+            "CREATE INDEX idx_glasses_tests_cold_frame_manufacturer ON glasses_tests_cold (frame_manufacturer)",
+            "CREATE INDEX idx_glasses_tests_cold_lenses_manufacturer ON glasses_tests_cold (lenses_manufacturer)",
+        ))
+    finally:
+        conn.create_function("catalog_id", 2, None)
+
+    cold = columns[1:]  # without the id
+    stored = ", ".join(f"c.{c}" if c in cold else f"t.{c}" for c in full)
+    decoded = ", ".join(
+        f"(SELECT value FROM catalog_values WHERE id = c.{c}) AS {c}" if c in GLASSES_TESTS_CATALOG_COLUMNS
+        else f"c.{c}" if c in cold else f"t.{c}" for c in full
+    )
+    run_statements(conn, (
+        f"""
+        CREATE VIEW glasses_tests_stored AS
+        SELECT {stored} FROM glasses_tests AS t LEFT JOIN glasses_tests_cold AS c ON c.id = t.id
+        """,
+        f"""
+        CREATE VIEW glasses_tests_full AS
+        SELECT {decoded} FROM glasses_tests AS t LEFT JOIN glasses_tests_cold AS c ON c.id = t.id
+        """,
+    ))
+
+
+# column -> catalog kind (as in db/catalog.py at the time of migration 12)
+CONTACT_LENSES_TESTS_CATALOG_COLUMNS = {
+    "r_manufacturer": "manufacturer", "r_brand": "brand", "r_material": "material",
+    "l_manufacturer": "manufacturer", "l_brand": "brand", "l_material": "material",
+}
+
+
+@migration(12, "Contact-lens manufacturers, brands and materials interned into catalog_values")
+def _contact_lenses_catalog_values(conn):
+    # Migration 11 for contact_lenses_tests. It has no cold table, so the table itself is rebuilt - spelled out, as
+    # PRAGMA table_info would lose its CHECKs - and its indexes and triggers are re-created verbatim.
+    # contact_lenses_tests_full shows the names decoded for sync, change log and data-quality rules.
+    stored_ids = _intern_catalog_names(conn, "contact_lenses_tests", CONTACT_LENSES_TESTS_CATALOG_COLUMNS)
+
+    def catalog_id(kind, value):
+        return stored_ids.get((kind, value))
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(contact_lenses_tests)")]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = 'contact_lenses_tests' AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL"
+    )]
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'contact_lenses_tests'").fetchone()
+    encoded = ", ".join(f"catalog_id('{CONTACT_LENSES_TESTS_CATALOG_COLUMNS[c]}', {c})"
+                        if c in CONTACT_LENSES_TESTS_CATALOG_COLUMNS else c for c in columns)
+    conn.create_function("catalog_id", 2, catalog_id, deterministic=True)
+    try:
+        run_statements(conn, (
+            """
+            CREATE TABLE contact_lenses_tests_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_id INTEGER NOT NULL,
+                exam_date TEXT NOT NULL,
+                examiner TEXT,
+                r_rH REAL,
+                r_rV REAL,
+                r_aver REAL,
+                r_k_cyl REAL,
+                r_axH INTEGER,
+                r_rT REAL,
+                r_rN REAL,
+                r_rI REAL,
+                r_rS REAL,
+                l_rH REAL,
+                l_rV REAL,
+                l_aver REAL,
+                l_k_cyl REAL,
+                l_axH INTEGER,
+                l_rT REAL,
+                l_rN REAL,
+                l_rI REAL,
+                l_rS REAL,
+                r_lens_type TEXT,
+                r_manufacturer INTEGER REFERENCES catalog_values(id),
+                r_brand INTEGER REFERENCES catalog_values(id),
+                r_diameter REAL,
+                r_base_curve_numerator REAL,
+                r_base_curve_denominator REAL,
+                r_lens_sph REAL,
+                r_lens_cyl REAL,
+                r_lens_axis INTEGER,
+                r_material INTEGER REFERENCES catalog_values(id),
+                r_tint TEXT,
+                r_lens_va_numerator INTEGER,
+                r_lens_va_denominator INTEGER,
+                l_lens_type TEXT,
+                l_manufacturer INTEGER REFERENCES catalog_values(id),
+                l_brand INTEGER REFERENCES catalog_values(id),
+                l_diameter REAL,
+                l_base_curve_numerator REAL,
+                l_base_curve_denominator REAL,
+                l_lens_sph REAL,
+                l_lens_cyl REAL,
+                l_lens_axis INTEGER,
+                l_material INTEGER REFERENCES catalog_values(id),
+                l_tint TEXT,
+                l_lens_va_numerator INTEGER,
+                l_lens_va_denominator INTEGER,
+                notes TEXT,
+
+                CHECK (
+                    (r_lens_cyl IS NULL AND r_lens_axis IS NULL) OR
+                    (r_lens_cyl = 0 AND r_lens_axis IS NULL) OR
+                    (r_lens_cyl <> 0 AND r_lens_axis BETWEEN 0 AND 180)
+                ),
+                CHECK (
+                    (l_lens_cyl IS NULL AND l_lens_axis IS NULL) OR
+                    (l_lens_cyl = 0 AND l_lens_axis IS NULL) OR
+                    (l_lens_cyl <> 0 AND l_lens_axis BETWEEN 0 AND 180)
+                ),
+
+                FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+            )
+            """,
+            f"INSERT INTO contact_lenses_tests_new ({', '.join(columns)}) "
+            f"SELECT {encoded} FROM contact_lenses_tests ORDER BY id",
+            "DROP TABLE contact_lenses_tests",
+            "ALTER TABLE contact_lenses_tests_new RENAME TO contact_lenses_tests",
+            *dependents,
+            "CREATE INDEX idx_contact_lenses_tests_r_brand ON contact_lenses_tests (r_brand)",
+            "CREATE INDEX idx_contact_lenses_tests_l_brand ON contact_lenses_tests (l_brand)",
+        ))
+    finally:
+        conn.create_function("catalog_id", 2, None)
+    if sequence is not None:  # AUTOINCREMENT: ids of deleted exams are never handed out again
+        conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'contact_lenses_tests'", (sequence[0],))
+
+    decoded = ", ".join(f"(SELECT value FROM catalog_values WHERE id = t.{c}) AS {c}"
+                        if c in CONTACT_LENSES_TESTS_CATALOG_COLUMNS else f"t.{c}" for c in columns)
+    conn.execute(f"CREATE VIEW contact_lenses_tests_full AS SELECT {decoded} FROM contact_lenses_tests AS t")
+
+
+# -----------------------------
+# RUNNER
+# -----------------------------
+def latest_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target: int = None) -> List[int]:
+    """
+    Brings the database up to `target` (default: the latest version).
+    Returns the versions that were applied - an empty list when the schema was already current.
+    """
+    target = latest_version() if target is None else target
+    current = get_schema_version(conn)
+    if current >= target:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+
+    applied = []
+    for step in MIGRATIONS:
+        if step.version <= current or step.version > target:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            step.apply(conn)
+            conn.execute(f"PRAGMA user_version = {step.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(step.version)
+    return applied
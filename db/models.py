@@ -2,8 +2,10 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
+from db.dirty import TrackedModel
 
-@dataclass
+
+@dataclass(slots=True)
 class Customer:
     id: int
     ssn: int
@@ -33,8 +35,8 @@ class Customer:
         return Customer(**dict(row))
 
 
-@dataclass
-class GlassesTest:
+@dataclass(slots=True)
+class GlassesTest(TrackedModel):
     """
     Represents a single glasses exam for a given customer (patient).
     """
@@ -114,11 +116,11 @@ class GlassesTest:
         return GlassesTest(**dict(row))
 
 
-@dataclass
-class ContactLensesTest:
+@dataclass(slots=True)
+class ContactLensesTest(TrackedModel):
     id: Optional[int]  # AUTOINCREMENT PK
     customer_id: int
-    exam_date: datetime  # ISO date string # When FETCHED from DB, it is a String here in the ContactLensesTest object!
+    exam_date: datetime  # Stored as ISO8601 text, decoded back to datetime by the repo
     examiner: Optional[str]
 
     # ===== Keratometry =====
@@ -179,3 +181,61 @@ class ContactLensesTest:
         if row is None:
             return None
         return ContactLensesTest(**dict(row))
+
+
+# -----------------------------
+# History summaries (list screens)
+# -----------------------------
+class LazyDetails:
+    """
+    Base of the summary records: they carry the few columns a history list shows, and load the full exam - one
+    primary-key read - only when something asks for another field (i.e. when a detail view opens the exam).
+    """
+    __slots__ = ("_loader", "_details")
+
+    def details(self):
+        """The full exam record, loaded on first use."""
+        try:
+            return self._details
+        except AttributeError:
+            self._details = self._loader(self.id)
+            return self._details
+
+    def __getattr__(self, name):
+        # Only called for attributes the summary doesn't have, i.e. the detail columns
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.details(), name)
+
+
+@dataclass(slots=True)
+class GlassesTestSummary(LazyDetails):
+    id: int
+    customer_id: int
+    exam_date: datetime
+    examiner: Optional[str] = None
+    r_sphere: Optional[str] = None
+    r_cylinder: Optional[float] = None
+    r_axis: Optional[int] = None
+    r_add_read: Optional[float] = None
+    l_sphere: Optional[str] = None
+    l_cylinder: Optional[float] = None
+    l_axis: Optional[int] = None
+    l_add_read: Optional[float] = None
+    glasses_role: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ContactLensesTestSummary(LazyDetails):
+    id: int
+    customer_id: int
+    exam_date: datetime
+    examiner: Optional[str] = None
+    r_lens_type: Optional[str] = None
+    r_lens_sph: Optional[float] = None
+    r_lens_cyl: Optional[float] = None
+    r_lens_axis: Optional[int] = None
+    l_lens_type: Optional[str] = None
+    l_lens_sph: Optional[float] = None
+    l_lens_cyl: Optional[float] = None
+    l_lens_axis: Optional[int] = None
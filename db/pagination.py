@@ -0,0 +1,55 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page query never uses OFFSET: it continues strictly after the sort key of the last row it returned,
+so page N is an index seek, exactly like page 1.
+The sort key travels to the caller as an opaque continuation token.
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence
+
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class Page:
+    items: List[Any] = field(default_factory=list)
+    next_token: Optional[str] = None  # None = this is the last page
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_token is not None
+
+
+def encode_cursor(kind: str, key: Sequence) -> str:
+    payload = json.dumps([kind, *key], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str, kind: str, key_length: int) -> list:
+    """Returns the sort key stored in the token. Raises ValueError for tokens from another listing or garbage."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid page token") from None
+    if not isinstance(payload, list) or len(payload) != key_length + 1 or payload[0] != kind:
+        raise ValueError("Page token does not belong to this listing")
+    return payload[1:]
+
+
+def validate_page_size(limit: int):
+    if not isinstance(limit, int) or not (0 < limit <= MAX_PAGE_SIZE):
+        raise ValueError(f"Page size must be between 1 and {MAX_PAGE_SIZE}")
+
+
+def build_page(rows, limit: int, kind: str, key_columns: Sequence[str], to_item) -> Page:
+    """
+    `rows` is the result of a query with LIMIT limit + 1: the extra row only tells whether another page exists.
+    The token is built from the raw (stored) sort-key values of the last row on this page.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_token = encode_cursor(kind, [rows[-1][c] for c in key_columns]) if has_more else None
+    return Page([to_item(r) for r in rows], next_token)
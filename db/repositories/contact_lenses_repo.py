@@ -1,81 +1,241 @@
-from dataclasses import asdict
-from typing import Optional, List
-from db.models import ContactLensesTest
-from db.utils import datetime_to_text
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, List
+
+from db.bulk import BULK_CHUNK_SIZE, bulk_insert, set_id_clean
+from db.catalog import CATALOG_COLUMNS, Catalog
+from db.dirty import save_changes
+from db.mappers import (
+    CONTACT_LENSES_TEST_COLUMNS, CONTACT_LENSES_TEST_SELECT, CONTACT_LENSES_TEST_SUMMARY_SELECT,
+    contact_lenses_test_summary_from_row, make_row_mapper,
+)
+from db.models import ContactLensesTest, ContactLensesTestSummary
+from db.pagination import Page, build_page, decode_cursor, validate_page_size
+from db.sql_queries import LATEST_TESTS_FOR_CUSTOMERS_QUERY
+from db.statements import CONTACT_LENSES_TEST_STATEMENTS
+from db.transaction import commit
+from db.utils import (
+    DEFAULT_BATCH_SIZE, chunked, decode_exam_date, encode_exam_date, exam_date_filters, iter_rows, validate_customer_id,
+)
+
+# The columns of the INSERT, in order (id is assigned by SQLite)
+CONTACT_LENSES_TEST_INSERT_COLUMNS = CONTACT_LENSES_TEST_STATEMENTS.insert_columns
+
+# Manufacturers, brands and materials are stored as catalog_values ids (migration 12); the repo's Catalog decodes them
+# on read and encodes them on write (db/catalog.py).
+CONTACT_LENSES_TEST_CATALOG_COLUMNS = CATALOG_COLUMNS[CONTACT_LENSES_TEST_STATEMENTS.table]
 
 
 class ContactLensesTestRepo:
     def __init__(self, conn):
         self.conn = conn
+        self.catalog = Catalog(conn)
+        decode = self.catalog.values.__getitem__
+        self._from_row = make_row_mapper(ContactLensesTest, CONTACT_LENSES_TEST_COLUMNS, {
+            "exam_date": decode_exam_date, **dict.fromkeys(CONTACT_LENSES_TEST_CATALOG_COLUMNS, decode),
+        })
+        self._encoders = {"exam_date": encode_exam_date, **self.catalog.encoders(CONTACT_LENSES_TEST_STATEMENTS.table)}
+        encode_row = self.catalog.row_encoder(CONTACT_LENSES_TEST_STATEMENTS.table, CONTACT_LENSES_TEST_INSERT_COLUMNS)
+        insert_params = CONTACT_LENSES_TEST_STATEMENTS.insert_params
+        self._insert_params = lambda test: encode_row(insert_params(test))
 
     # -----------------------------
     # CREATE
     # -----------------------------
     def add_test(self, test: ContactLensesTest) -> int:
         """Insert a new test and return the row ID."""
-        data = asdict(test)
-        data.pop("id")  # Auto-increment
-        data["exam_date"] = datetime_to_text(data["exam_date"])
-        columns = ", ".join(data.keys())
-        placeholders = ", ".join("?" for _ in data)
-        sql = f"INSERT INTO contact_lenses_tests ({columns}) VALUES ({placeholders})"
-
-        cur = self.conn.cursor()
-        cur.execute(sql, tuple(data.values()))
-        self.conn.commit()
+        self.catalog.check()
+        cur = self.conn.execute(CONTACT_LENSES_TEST_STATEMENTS.insert_sql, self._insert_params(test))
+        commit(self.conn)
 
         return cur.lastrowid
 
+    def add_tests_bulk(self, tests: Iterable[ContactLensesTest], chunk_size: int = BULK_CHUNK_SIZE) -> List[int]:
+        """
+        Inserts many tests (any iterable, e.g. a generator over an import file) with executemany,
+        one transaction per chunk. Sets each test's id and returns the ids in input order.
+        """
+        self.catalog.check()
+        return bulk_insert(self.conn, "contact_lenses_tests", CONTACT_LENSES_TEST_INSERT_COLUMNS, tests,
+                           self._insert_params, chunk_size, set_id_clean)
+
     # -----------------------------
     # READ (single)
     # -----------------------------
     def get_test(self, contact_lenses_test_id: int) -> Optional[ContactLensesTest]:
-        sql = "SELECT * FROM contact_lenses_tests WHERE id = ?"
+        self.catalog.check()
+        sql = f"SELECT {CONTACT_LENSES_TEST_SELECT} FROM contact_lenses_tests WHERE id = ?"
         cur = self.conn.cursor()
         row = cur.execute(sql, (contact_lenses_test_id,)).fetchone()
-        return ContactLensesTest.from_row(row)
+        return self._tracked(row)
+
+    def get_latest_test(self, customer_id: int) -> Optional[ContactLensesTest]:
+        """
+        The customer's most recent exam: a single row read through the (customer_id, exam_date) index.
+        Of two exams on the same date, the one saved last wins.
+        """
+        validate_customer_id(customer_id)
+        self.catalog.check()
+
+        sql = f"""
+            SELECT {CONTACT_LENSES_TEST_SELECT} FROM contact_lenses_tests
+            WHERE customer_id = ?
+            ORDER BY exam_date DESC, id DESC
+            LIMIT 1
+        """
+        row = self.conn.execute(sql, (customer_id,)).fetchone()
+        return self._tracked(row)
 
     # -----------------------------
     # READ (multiple)
     # -----------------------------
     def list_tests_for_customer(self, customer_id: int) -> List[ContactLensesTest]:
-        if customer_id is None:
-            raise ValueError("customer_id must not be None")
+        validate_customer_id(customer_id)
+        self.catalog.check()
 
-        if not isinstance(customer_id, int):
-            raise TypeError("customer_id must be an integer")
-
-        if customer_id <= 0:
-            raise ValueError("customer_id must be a positive integer")
-
-        sql = """
-            SELECT * FROM contact_lenses_tests
+        sql = f"""
+            SELECT {CONTACT_LENSES_TEST_SELECT} FROM contact_lenses_tests
             WHERE customer_id = ?
             ORDER BY exam_date DESC
         """
         cur = self.conn.cursor()
         rows = cur.execute(sql, (customer_id,)).fetchall()
-        return [ContactLensesTest.from_row(r) for r in rows]
+        return [self._from_row(r) for r in rows]
+
+    def list_test_summaries(self, customer_id: int) -> List[ContactLensesTestSummary]:
+        """
+        The customer's history for list screens, newest first: the summary columns only, read from the covering
+        (customer_id, exam_date) index. Any other field of a summary loads its full test on first access.
+        """
+        validate_customer_id(customer_id)
+
+        sql = f"""
+            SELECT {CONTACT_LENSES_TEST_SUMMARY_SELECT} FROM contact_lenses_tests
+            WHERE customer_id = ?
+            ORDER BY exam_date DESC
+        """
+        summaries = [contact_lenses_test_summary_from_row(r) for r in self.conn.execute(sql, (customer_id,)).fetchall()]
+        for summary in summaries:
+            summary._loader = self.get_test
+        return summaries
+
+    def list_tests_page(self, customer_id: int, after: Optional[str] = None, limit: int = 20) -> Page:
+        """
+        One page of the customer's history, newest first. Pass the previous page's next_token as `after`.
+        Keyset pagination over (exam_date DESC, id): the order of the (customer_id, exam_date DESC) index.
+        """
+        validate_customer_id(customer_id)
+        validate_page_size(limit)
+        self.catalog.check()
+        kind = f"contact_lenses_tests:{customer_id}"
+
+        where = ""
+        params = [customer_id]
+        if after:
+            exam_date, test_id = decode_cursor(after, kind, 2)
+            where = "AND exam_date <= ? AND (exam_date < ? OR id > ?)"
+            params += [exam_date, exam_date, test_id]
+
+        rows = self.conn.execute(f"""
+            SELECT {CONTACT_LENSES_TEST_SELECT} FROM contact_lenses_tests
+            WHERE customer_id = ? {where}
+            ORDER BY exam_date DESC, id
+            LIMIT ?
+        """, (*params, limit + 1)).fetchall()
+
+        return build_page(rows, limit, kind, ("exam_date", "id"), self._from_row)
+
+    def iter_contact_lenses_tests(self, batch_size: int = DEFAULT_BATCH_SIZE, customer_id: Optional[int] = None,
+                                  since: Optional[datetime] = None,
+                                  until: Optional[datetime] = None) -> Iterator[ContactLensesTest]:
+        """
+        Streams exams in id order, optionally for one customer and/or an exam_date range (inclusive).
+        Rows are fetched `batch_size` at a time, so memory stays flat however big the table is.
+        """
+        where, params = exam_date_filters(customer_id, since, until)
+        self.catalog.check()
+        cursor = self.conn.execute(f"SELECT {CONTACT_LENSES_TEST_SELECT} FROM contact_lenses_tests {where} ORDER BY id", params)
+        for row in iter_rows(cursor, batch_size):
+            yield self._from_row(row)
+
+    def latest_tests_for_customers(self, customer_ids) -> Dict[int, ContactLensesTest]:
+        """
+        The newest exam of each given customer, in one query per 500 ids.
+        Returns {customer_id: ContactLensesTest}; customers without exams are left out.
+        """
+        self.catalog.check()
+        results = {}
+        for chunk in chunked(dict.fromkeys(customer_ids), 500):
+            for customer_id in chunk:
+                validate_customer_id(customer_id)
+            sql = LATEST_TESTS_FOR_CUSTOMERS_QUERY.format(table="contact_lenses_tests", columns=CONTACT_LENSES_TEST_SELECT, values=", ".join("(?)" for _ in chunk))
+            for row in self.conn.execute(sql, chunk):
+                test = self._from_row(row)
+                results[test.customer_id] = test
+        return results
+
+    # -----------------------------
+    # READ (by catalog value)
+    # -----------------------------
+    def list_tests_with(self, column: str, value: str) -> List[ContactLensesTest]:
+        """
+        The exams whose catalog column (e.g. r_brand) holds `value`, in any spelling, newest first.
+        An integer lookup: through an index for the two brand columns.
+        """
+        self.catalog.check()
+        value_id = self.catalog.find(self._catalog_kind(column), value)
+        if value_id is None:
+            return []
+
+        rows = self.conn.execute(f"""
+            SELECT {CONTACT_LENSES_TEST_SELECT} FROM contact_lenses_tests
+            WHERE {column} = ?
+            ORDER BY exam_date DESC
+        """, (value_id,)).fetchall()
+
+        return [self._from_row(r) for r in rows]
+
+    def count_tests_by(self, column: str) -> Dict[str, int]:
+        """{value: number of exams} of a catalog column, most frequent first (exams without a value are left out)."""
+        self._catalog_kind(column)
+        self.catalog.check()
+
+        rows = self.conn.execute(f"""
+            SELECT {column}, count(*) AS exams FROM contact_lenses_tests
+            WHERE {column} IS NOT NULL
+            GROUP BY {column}
+            ORDER BY exams DESC
+        """).fetchall()
+
+        return {self.catalog.values[value_id]: exams for value_id, exams in rows}
+
+    @staticmethod
+    def _catalog_kind(column: str) -> str:
+        if column not in CONTACT_LENSES_TEST_CATALOG_COLUMNS:
+            raise ValueError(f"{column} is not a catalog column ({', '.join(CONTACT_LENSES_TEST_CATALOG_COLUMNS)})")
+        return CONTACT_LENSES_TEST_CATALOG_COLUMNS[column]
+
+    def _tracked(self, row):
+        # Single-record loads are the ones edited and saved: they remember their values (lists don't pay for it)
+        if row is None:
+            return None
+        test = self._from_row(row)
+        test.mark_clean()
+        return test
 
     # -----------------------------
     # UPDATE
     # -----------------------------
     def update_test(self, test: ContactLensesTest) -> bool:
-        """Update a test. Returns True if a row was updated."""
+        """
+        Saves the columns changed since the test was loaded (all of them for a test built in code).
+        Returns True if the row was updated - or had nothing to update.
+        """
         if test.id is None:
             raise ValueError("Cannot update a test without an ID")
 
-        data = asdict(test)
-        test_id = data.pop("id")
-
-        assignments = ", ".join(f"{k}=?" for k in data.keys())
-        sql = f"UPDATE contact_lenses_tests SET {assignments} WHERE id = ?"
-
-        cur = self.conn.cursor()
-        result = cur.execute(sql, tuple(data.values()) + (test_id,))
-        self.conn.commit()
-
-        return result.rowcount > 0
+        self.catalog.check()
+        updated = save_changes(self.conn, "contact_lenses_tests", test, self._encoders)
+        return updated is None or updated > 0
 
     # -----------------------------
     # DELETE
@@ -84,5 +244,5 @@ class ContactLensesTestRepo:
         sql = "DELETE FROM contact_lenses_tests WHERE id = ?"
         cur = self.conn.cursor()
         result = cur.execute(sql, (test_id,))
-        self.conn.commit()
+        commit(self.conn)
         return result.rowcount > 0
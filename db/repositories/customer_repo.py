@@ -1,14 +1,46 @@
-from typing import List
+from datetime import date
+from typing import Iterable, Iterator, List, Optional
 
+from db.bulk import BULK_CHUNK_SIZE, bulk_insert, set_id
+from db.mappers import CUSTOMER_COLUMNS, CUSTOMER_SELECT, customer_from_row, select_list
 from db.models import Customer
-from db.sql_queries import ADD_NEW_CUSTOMER_QUERY
-from db.utils import dict_from_row, row_to_dataclass
+from db.pagination import Page, build_page, decode_cursor, validate_page_size
+from db.statements import CUSTOMER_STATEMENTS
+from db.transaction import commit
+from db.utils import DEFAULT_BATCH_SIZE, date_to_epoch_day, iter_rows
+
+
+# The columns of the INSERT, in order (id is assigned by SQLite; birth_day is derived from birth_date)
+CUSTOMER_INSERT_COLUMNS = CUSTOMER_STATEMENTS.insert_columns
+
+# Column weights for bm25() ranking, in customers_fts column order:
+# fname, lname, ssn, tel_home, tel_mobile, town
+SEARCH_RANK_WEIGHTS = (10.0, 10.0, 5.0, 2.0, 2.0, 1.0)
+
+# Sort orders for list_customers_page(): order name -> key columns, always ending with the unique id.
+# Each one is backed by an index (the primary key, idx_customers_lname).
+CUSTOMER_PAGE_ORDERS = {
+    "id": ("id",),
+    "lname": ("lname", "id"),
+}
+
+
+def fts_prefix_query(query: str, columns=None) -> str:
+    """
+    Turns free text into an FTS5 MATCH expression: every word must appear, as a word prefix.
+    Words are quoted, so user input can never be parsed as FTS5 syntax.
+    """
+    terms = " AND ".join('"' + w.replace('"', '""') + '"*' for w in query.split())
+    if columns:
+        return "{" + " ".join(columns) + "} : (" + terms + ")"
+    return terms
 
 
 class CustomerRepo:
 
     def __init__(self, conn):
         self.conn = conn
+        self._has_fts = None  # resolved lazily: databases created before migration 3 have no customers_fts
 
     # -----------------------------
     # CREATE
@@ -17,45 +49,150 @@ class CustomerRepo:
         """Receives an object, not a dict, to ensure complete objects & correct field naming."""
         # convenience wrapper that internally creates a cursor, runs the query, and returns that cursor.
 
-        cursor = self.conn.execute(ADD_NEW_CUSTOMER_QUERY, (new_customer.ssn, new_customer.fname, new_customer.lname, new_customer.birth_date, new_customer.sex, new_customer.tel_home, new_customer.tel_mobile, new_customer.address, new_customer.town, new_customer.postal_code, new_customer.status, new_customer.org, new_customer.occupation, new_customer.hobbies, new_customer.referer, new_customer.glasses_num, new_customer.lenses_num, new_customer.mailing, new_customer.notes))
-        self.conn.commit()
+        cursor = self.conn.execute(CUSTOMER_STATEMENTS.insert_sql, CUSTOMER_STATEMENTS.insert_params(new_customer))
+        commit(self.conn)
 
         new_customer.id = cursor.lastrowid
         return new_customer
 
+    def add_customers_bulk(self, customers: Iterable[Customer], chunk_size: int = BULK_CHUNK_SIZE) -> List[int]:
+        """
+        Inserts many customers (any iterable, e.g. a generator over an import file) with executemany,
+        one transaction per chunk. Sets each customer's id and returns the ids in input order.
+        """
+        return bulk_insert(self.conn, "customers", CUSTOMER_INSERT_COLUMNS, customers, CUSTOMER_STATEMENTS.insert_params,
+                           chunk_size, set_id)
+
     # -----------------------------
     # READ (single)
     # -----------------------------
     def get_customer(self, customer_id) -> Customer:
-        row = self.conn.execute("""
-            SELECT * FROM customers WHERE id = ?
+        row = self.conn.execute(f"""
+            SELECT {CUSTOMER_SELECT} FROM customers WHERE id = ?
         """, (customer_id,)).fetchone()
 
         if row:
-            return Customer(**dict_from_row(row))
+            return customer_from_row(row)
         return None
 
-    def get_customer_by_ssn(self, customer_ssn) -> Customer:
+    def customer_exists(self, customer_id) -> bool:
+        """Existence check through the primary key only - no row is read or decoded."""
         row = self.conn.execute("""
-            SELECT * FROM customers WHERE ssn = ?
+            SELECT EXISTS (SELECT 1 FROM customers WHERE id = ?)
+        """, (customer_id,)).fetchone()
+        return bool(row[0])
+
+    def get_customer_by_ssn(self, customer_ssn) -> Customer:
+        row = self.conn.execute(f"""
+            SELECT {CUSTOMER_SELECT} FROM customers WHERE ssn = ?
         """, (customer_ssn,)).fetchone()
 
         if row:
-            return Customer(**dict_from_row(row))
+            return customer_from_row(row)
         return None
 
     # -----------------------------
     # READ (all)
     # -----------------------------
     def list_customers(self) -> list[Customer]:
-        rows = self.conn.execute("""
-            SELECT * FROM customers ORDER BY id
+        rows = self.conn.execute(f"""
+            SELECT {CUSTOMER_SELECT} FROM customers ORDER BY id
         """).fetchall()
 
-        return [Customer(**dict_from_row(r)) for r in rows]
+        return [customer_from_row(r) for r in rows]
+
+    def list_customers_born_between(self, start: date, end: date) -> List[Customer]:
+        """Customers whose birth date is in [start, end], oldest first - a range scan on the birth_day index."""
+        rows = self.conn.execute(f"""
+            SELECT {CUSTOMER_SELECT} FROM customers
+            WHERE birth_day BETWEEN ? AND ?
+            ORDER BY birth_day
+        """, (date_to_epoch_day(start), date_to_epoch_day(end))).fetchall()
+
+        return [customer_from_row(r) for r in rows]
+
+    def iter_customers(self, batch_size: int = DEFAULT_BATCH_SIZE, town: Optional[str] = None,
+                       after_id: Optional[int] = None) -> Iterator[Customer]:
+        """
+        Streams every customer (optionally only one town / only ids after `after_id`) in id order.
+        Rows are fetched `batch_size` at a time, so memory stays flat however big the table is.
+        """
+        conditions = []
+        params = []
+        if town is not None:
+            conditions.append("town = ?")
+            params.append(town)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        cursor = self.conn.execute(f"SELECT {CUSTOMER_SELECT} FROM customers {where} ORDER BY id", params)
+        for row in iter_rows(cursor, batch_size):
+            yield customer_from_row(row)
+
+    def list_customers_page(self, after: Optional[str] = None, limit: int = 50, order_by: str = "id") -> Page:
+        """
+        One page of customers. Pass the previous page's next_token as `after` to continue.
+        Keyset pagination: every page is an index seek, no matter how deep into the table.
+        """
+        validate_page_size(limit)
+        if order_by not in CUSTOMER_PAGE_ORDERS:
+            raise ValueError(f"Cannot order customers by {order_by!r}")
+
+        key_columns = CUSTOMER_PAGE_ORDERS[order_by]
+        columns = ", ".join(key_columns)
+        kind = f"customers:{order_by}"
+
+        where = ""
+        params = []
+        if after:
+            params = decode_cursor(after, kind, len(key_columns))
+            where = f"WHERE ({columns}) > ({', '.join('?' for _ in key_columns)})"
+
+        rows = self.conn.execute(f"""
+            SELECT {CUSTOMER_SELECT} FROM customers {where} ORDER BY {columns} LIMIT ?
+        """, (*params, limit + 1)).fetchall()
+
+        return build_page(rows, limit, kind, key_columns, customer_from_row)
+
+    def search_customers(self, query: str, limit: int = 50) -> List[Customer]:
+        """
+        Full-text search over first/last name, SSN, phones and town, best matches first (bm25).
+        Every word in the query must match the beginning of a word in one of those fields.
+        """
+        return self._fts_search(fts_prefix_query(query), limit)
 
     def search_by_name(self, query: str) -> List[Customer]:
         """Search by full name, partial name, or anything in-between"""
+        if self.fts_available():
+            return self._fts_search(fts_prefix_query(query, columns=("fname", "lname")), None)
+        return self._search_by_name_like(query)
+
+    def fts_available(self) -> bool:
+        if self._has_fts is None:
+            row = self.conn.execute("""
+                SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers_fts'
+            """).fetchone()
+            self._has_fts = row is not None
+        return self._has_fts
+
+    def _fts_search(self, match_expr: str, limit) -> List[Customer]:
+        if not match_expr:
+            return []
+
+        weights = ", ".join(str(w) for w in SEARCH_RANK_WEIGHTS)
+        rows = self.conn.execute(f"""
+            SELECT {select_list(CUSTOMER_COLUMNS, "c")} FROM customers_fts
+            JOIN customers c ON c.id = customers_fts.rowid
+            WHERE customers_fts MATCH ?
+            ORDER BY bm25(customers_fts, {weights})
+            LIMIT ?
+        """, (match_expr, -1 if limit is None else limit)).fetchall()
+        return [customer_from_row(row) for row in rows]
+
+    def _search_by_name_like(self, query: str) -> List[Customer]:
+        # Fallback for databases without the FTS table: full table scan.
         cur = self.conn.cursor()
 
         words = query.strip().split()
@@ -72,24 +209,20 @@ class CustomerRepo:
             params.extend([like, like])
 
         sql = f"""
-            SELECT * FROM customers
+            SELECT {CUSTOMER_SELECT} FROM customers
             WHERE {" AND ".join(conditions)}
         """
 
         rows = cur.execute(sql, params).fetchall()
-        return [row_to_dataclass(row, Customer) for row in rows]
+        return [customer_from_row(row) for row in rows]
 
     # -----------------------------
     # UPDATE
     # -----------------------------
     def update_customer(self, customer: Customer) -> bool:
-        self.conn.execute("""
-            UPDATE customers
-            SET ssn = ?, fname = ?, lname = ?, birth_date = ?, sex = ?, tel_home = ?, tel_mobile = ?, address = ?, town = ?, postal_code = ?, status = ?, org = ?, occupation = ?, hobbies = ?, referer = ?, glasses_num = ?, lenses_num = ?, mailing = ?, notes = ?
-            WHERE id = ?
-        """, (customer.ssn, customer.fname, customer.lname, customer.birth_date, customer.sex, customer.tel_home, customer.tel_mobile, customer.address, customer.town, customer.postal_code, customer.status, customer.org, customer.occupation, customer.hobbies, customer.referer, customer.glasses_num, customer.lenses_num, customer.mailing, customer.notes, customer.id))
+        self.conn.execute(CUSTOMER_STATEMENTS.update_sql, CUSTOMER_STATEMENTS.update_params(customer))
 
-        self.conn.commit()
+        commit(self.conn)
         return True
 
     # -----------------------------
@@ -99,5 +232,5 @@ class CustomerRepo:
         self.conn.execute("""
             DELETE FROM customers WHERE id = ?
         """, (customer_id,))
-        self.conn.commit()
+        commit(self.conn)
         return True
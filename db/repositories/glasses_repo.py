@@ -1,14 +1,41 @@
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
-from db.models import GlassesTest
-from db.sql_queries import *
+from db.bulk import BULK_CHUNK_SIZE, bulk_insert, insert_runs, set_id_clean
+from db.catalog import CATALOG_COLUMNS, Catalog
+from db.dirty import save_changes
+from db.mappers import (
+    GLASSES_TEST_COLUMNS, GLASSES_TEST_SELECT, GLASSES_TEST_SUMMARY_SELECT, glasses_test_summary_from_row,
+    make_row_mapper,
+)
+from db.models import GlassesTest, GlassesTestSummary
+from db.pagination import Page, build_page, decode_cursor, validate_page_size
+from db.sql_queries import LATEST_TESTS_FOR_CUSTOMERS_QUERY
+from db.statements import GLASSES_TEST_STATEMENTS
+from db.transaction import commit
 from db.utils import *
 
+# The columns of the INSERT, in order (id is assigned by SQLite)
+GLASSES_TEST_INSERT_COLUMNS = GLASSES_TEST_STATEMENTS.insert_columns
+
+# Full rows are read from glasses_tests_stored (glasses_tests + glasses_tests_cold); the summaries and every filter and
+# sort column are in glasses_tests, so a read that needs no cold column never touches the cold table.
+# The catalog columns (manufacturers, suppliers, materials, colors, coatings) are stored as catalog_values ids; the
+# repo's Catalog decodes them on read and encodes them on write (db/catalog.py).
+GLASSES_TEST_CATALOG_COLUMNS = CATALOG_COLUMNS[GLASSES_TEST_STATEMENTS.cold_table]
+
 
 class GlassesRepo:
 
     def __init__(self, conn):
         self.conn = conn
+        self.catalog = Catalog(conn)
+        decode = self.catalog.values.__getitem__
+        self._from_row = make_row_mapper(GlassesTest, GLASSES_TEST_COLUMNS, {
+            "exam_date": decode_exam_date, **dict.fromkeys(GLASSES_TEST_CATALOG_COLUMNS, decode),
+        })
+        self._encoders = {"exam_date": encode_exam_date, **self.catalog.encoders(GLASSES_TEST_STATEMENTS.cold_table)}
+        self._encode_cold = self.catalog.row_encoder(GLASSES_TEST_STATEMENTS.cold_table,
+                                                     GLASSES_TEST_STATEMENTS.cold_columns)
 
     # -----------------------------
     # CREATE
@@ -16,31 +43,56 @@ class GlassesRepo:
     def add_test(self, test: GlassesTest):
         """Receives an object, not a dict, to ensure complete objects & correct field naming."""
         # convenience wrapper that internally creates a cursor, runs the query, and returns that cursor.
-        cursor = self.conn.execute(ADD_GLASSES_TEST_QUERY, (
-            test.customer_id,
-            datetime_to_text(test.exam_date),
-            test.examiner,
-            test.r_fv, test.r_sphere, test.r_cylinder, test.r_axis, test.r_prism, test.r_base, test.r_va, test.both_va, test.r_add_read, test.r_add_int, test.r_add_bif, test.r_add_mul, test.r_high, test.r_pd, test.sum_pd, test.near_pd,
-            test.l_fv, test.l_sphere, test.l_cylinder, test.l_axis, test.l_prism, test.l_base, test.l_va, test.l_add_read, test.l_add_int, test.l_add_bif, test.l_add_mul, test.l_high, test.l_pd,
-            test.dominant_eye, test.r_iop, test.l_iop, test.glasses_role, test.lenses_material, test.lenses_diameter_1, test.lenses_diameter_2, test.lenses_diameter_decentration_horizontal, test.lenses_diameter_decentration_vertical, test.segment_diameter, test.lenses_manufacturer, test.lenses_color, test.lenses_coated, test.catalog_num, test.frame_manufacturer, test.frame_supplier, test.frame_model, test.frame_size, test.frame_bar_length, test.frame_color,
-            test.diagnosis, test.notes
-        ))
-
-        self.conn.commit()
+        self.catalog.check()
+        cursor = self.conn.execute(GLASSES_TEST_STATEMENTS.insert_sql, GLASSES_TEST_STATEMENTS.insert_params(test))
         test.id = cursor.lastrowid
+        self._insert_cold([test], [test.id])
+        commit(self.conn)
+        test.mark_clean()
         return test
 
+    def add_tests_bulk(self, tests: Iterable[GlassesTest], chunk_size: int = BULK_CHUNK_SIZE) -> List[int]:
+        """
+        Inserts many tests (any iterable, e.g. a generator over an import file) with executemany,
+        one transaction per chunk. Sets each test's id and returns the ids in input order.
+        """
+        self.catalog.check()
+        return bulk_insert(self.conn, "glasses_tests", GLASSES_TEST_INSERT_COLUMNS, tests,
+                           GLASSES_TEST_STATEMENTS.insert_params, chunk_size, set_id_clean, self._insert_cold)
+
+    def _insert_cold(self, tests, ids):
+        """The glasses_tests_cold rows of new tests (one per test, NULLs included)."""
+        cold_params = GLASSES_TEST_STATEMENTS.cold_params
+        rows = [(test_id, *self._encode_cold(values)) for test_id, values in zip(ids, map(cold_params, tests))]
+        insert_runs(self.conn, "glasses_tests_cold", ("id", *GLASSES_TEST_STATEMENTS.cold_columns), rows)
+
     # -----------------------------
     # READ (single)
     # -----------------------------
     def get_test(self, test_id: int) -> Optional[GlassesTest]:
-        row = self.conn.execute("""
-            SELECT * FROM glasses_tests WHERE id = ?
+        self.catalog.check()
+        row = self.conn.execute(f"""
+            SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_stored WHERE id = ?
         """, (test_id,)).fetchone()
 
-        if row:
-            return row_to_dataclass(row, GlassesTest)
-        return None
+        return self._tracked(row)
+
+    def get_latest_test(self, customer_id: int) -> Optional[GlassesTest]:
+        """
+        The customer's most recent exam: a single row read through the (customer_id, exam_date) index.
+        Of two exams on the same date, the one saved last wins.
+        """
+        validate_customer_id(customer_id)
+        self.catalog.check()
+
+        row = self.conn.execute(f"""
+            SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_stored
+            WHERE customer_id = ?
+            ORDER BY exam_date DESC, id DESC
+            LIMIT 1
+        """, (customer_id,)).fetchone()
+
+        return self._tracked(row)
 
     # -----------------------------
     # READ (all by customer)
@@ -48,54 +100,149 @@ class GlassesRepo:
     def list_tests_for_customer(self, customer_id: int):
         # Repo handles database-level risks (invalid types, corrupted rows)
         # While the Service handles user input and business rules before calling repo
-        if customer_id is None:
-            raise ValueError("customer_id must not be None")
+        validate_customer_id(customer_id)
+        self.catalog.check()
 
-        if not isinstance(customer_id, int):
-            raise TypeError("customer_id must be an integer")
+        rows = self.conn.execute(f"""
+            SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_stored
+            WHERE customer_id = ?
+            ORDER BY exam_date DESC
+        """, (customer_id,)).fetchall()
+
+        return [self._from_row(r) for r in rows]
 
-        if customer_id <= 0:
-            raise ValueError("customer_id must be a positive integer")
+    def list_test_summaries(self, customer_id: int) -> List[GlassesTestSummary]:
+        """
+        The customer's history for list screens, newest first: the summary columns only, read from the covering
+        (customer_id, exam_date) index. Any other field of a summary loads its full test on first access.
+        """
+        validate_customer_id(customer_id)
 
-        rows = self.conn.execute("""
-            SELECT * FROM glasses_tests
+        rows = self.conn.execute(f"""
+            SELECT {GLASSES_TEST_SUMMARY_SELECT} FROM glasses_tests
             WHERE customer_id = ?
             ORDER BY exam_date DESC
         """, (customer_id,)).fetchall()
 
-        results = []
-        for r in rows:
-            data = dict_from_row(r)
-            if not (data["exam_date"] is None):
-                try:
-                    data["exam_date"] = text_to_datetime(data["exam_date"])
-                except Exception:
-                    pass  # do nothing
-            results.append(GlassesTest(**data))
+        summaries = [glasses_test_summary_from_row(r) for r in rows]
+        for summary in summaries:
+            summary._loader = self.get_test
+        return summaries
+
+    def list_tests_page(self, customer_id: int, after: Optional[str] = None, limit: int = 20) -> Page:
+        """
+        One page of the customer's history, newest first. Pass the previous page's next_token as `after`.
+        Keyset pagination over (exam_date DESC, id): the order of the (customer_id, exam_date DESC) index.
+        """
+        validate_customer_id(customer_id)
+        validate_page_size(limit)
+        self.catalog.check()
+        kind = f"glasses_tests:{customer_id}"
+
+        where = ""
+        params = [customer_id]
+        if after:
+            exam_date, test_id = decode_cursor(after, kind, 2)
+            where = "AND exam_date <= ? AND (exam_date < ? OR id > ?)"
+            params += [exam_date, exam_date, test_id]
+
+        rows = self.conn.execute(f"""
+            SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_stored
+            WHERE customer_id = ? {where}
+            ORDER BY exam_date DESC, id
+            LIMIT ?
+        """, (*params, limit + 1)).fetchall()
+
+        return build_page(rows, limit, kind, ("exam_date", "id"), self._from_row)
 
+    def iter_glasses_tests(self, batch_size: int = DEFAULT_BATCH_SIZE, customer_id: Optional[int] = None,
+                           since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[GlassesTest]:
+        """
+        Streams exams in id order, optionally for one customer and/or an exam_date range (inclusive).
+        Rows are fetched `batch_size` at a time, so memory stays flat however big the table is.
+        """
+        where, params = exam_date_filters(customer_id, since, until)
+        self.catalog.check()
+        cursor = self.conn.execute(f"SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_stored {where} ORDER BY id", params)
+        for row in iter_rows(cursor, batch_size):
+            yield self._from_row(row)
+
+    def latest_tests_for_customers(self, customer_ids) -> Dict[int, GlassesTest]:
+        """
+        The newest exam of each given customer, in one query per 500 ids.
+        Returns {customer_id: GlassesTest}; customers without exams are left out.
+        """
+        self.catalog.check()
+        results = {}
+        for chunk in chunked(dict.fromkeys(customer_ids), 500):
+            for customer_id in chunk:
+                validate_customer_id(customer_id)
+            sql = LATEST_TESTS_FOR_CUSTOMERS_QUERY.format(table="glasses_tests_stored", columns=GLASSES_TEST_SELECT, values=", ".join("(?)" for _ in chunk))
+            for row in self.conn.execute(sql, chunk):
+                test = self._from_row(row)
+                results[test.customer_id] = test
         return results
 
+    # -----------------------------
+    # READ (by catalog value)
+    # -----------------------------
+    def list_tests_with(self, column: str, value: str) -> List[GlassesTest]:
+        """
+        The exams whose catalog column (e.g. frame_manufacturer) holds `value`, in any spelling, newest first.
+        An integer lookup: through an index for the two manufacturer columns.
+        """
+        self.catalog.check()
+        value_id = self.catalog.find(self._catalog_kind(column), value)
+        if value_id is None:
+            return []
+
+        rows = self.conn.execute(f"""
+            SELECT {GLASSES_TEST_SELECT} FROM glasses_tests_stored
+            WHERE {column} = ?
+            ORDER BY exam_date DESC
+        """, (value_id,)).fetchall()
+
+        return [self._from_row(r) for r in rows]
+
+    def count_tests_by(self, column: str) -> Dict[str, int]:
+        """{value: number of exams} of a catalog column, most frequent first (exams without a value are left out)."""
+        self._catalog_kind(column)
+        self.catalog.check()
+
+        rows = self.conn.execute(f"""
+            SELECT {column}, count(*) AS exams FROM glasses_tests_cold
+            WHERE {column} IS NOT NULL
+            GROUP BY {column}
+            ORDER BY exams DESC
+        """).fetchall()
+
+        return {self.catalog.values[value_id]: exams for value_id, exams in rows}
+
+    @staticmethod
+    def _catalog_kind(column: str) -> str:
+        if column not in GLASSES_TEST_CATALOG_COLUMNS:
+            raise ValueError(f"{column} is not a catalog column ({', '.join(GLASSES_TEST_CATALOG_COLUMNS)})")
+        return GLASSES_TEST_CATALOG_COLUMNS[column]
+
+    def _tracked(self, row):
+        # Single-record loads are the ones edited and saved: they remember their values (lists don't pay for it)
+        if row is None:
+            return None
+        test = self._from_row(row)
+        test.mark_clean()
+        return test
+
     # -----------------------------
     # UPDATE
     # -----------------------------
     def update_test(self, test: GlassesTest) -> bool:
-        """Receives an object, not a dict, to ensure complete objects & correct field naming."""
-        # convenience wrapper that internally creates a cursor, runs the query, and returns that cursor.
-
-        self.conn.execute(UPDATE_GLASSES_TEST_QUERY, (
-            test.customer_id,
-            datetime_to_text(test.exam_date),
-            test.examiner,
-            test.r_fv, test.r_sphere, test.r_cylinder, test.r_axis, test.r_prism,
-            test.r_base, test.r_va, test.both_va, test.r_add_read, test.r_add_int, test.r_add_bif, test.r_add_mul, test.r_high, test.r_pd, test.sum_pd, test.near_pd,
-            test.l_fv, test.l_sphere, test.l_cylinder, test.l_axis, test.l_prism,
-            test.l_base, test.l_va, test.l_add_read, test.l_add_int, test.l_add_bif, test.l_add_mul, test.l_high, test.l_pd,
-            test.dominant_eye, test.r_iop, test.l_iop, test.glasses_role, test.lenses_material, test.lenses_diameter_1, test.lenses_diameter_2, test.lenses_diameter_decentration_horizontal, test.lenses_diameter_decentration_vertical, test.segment_diameter, test.lenses_manufacturer, test.lenses_color, test.lenses_coated, test.catalog_num, test.frame_manufacturer, test.frame_supplier, test.frame_model, test.frame_size, test.frame_bar_length, test.frame_color,
-            test.diagnosis, test.notes,
-            test.id
-        ))
-
-        self.conn.commit()
+        """
+        Saves the columns changed since the test was loaded (all of them for a test built in code).
+        A loaded test that hasn't changed is not written at all.
+        """
+        self.catalog.check()
+        save_changes(self.conn, "glasses_tests", test, self._encoders,
+                     GLASSES_TEST_STATEMENTS.cold_table, GLASSES_TEST_STATEMENTS.cold_columns)
         return True
 
     # -----------------------------
@@ -103,8 +250,9 @@ class GlassesRepo:
     # -----------------------------
     def delete_test(self, test_id: int) -> bool:
         # convenience wrapper that internally creates a cursor, runs the query, and returns that cursor.
+        # The exam's glasses_tests_cold row goes with it (ON DELETE CASCADE).
         self.conn.execute("""
             DELETE FROM glasses_tests WHERE id = ?
         """, (test_id,))
-        self.conn.commit()
+        commit(self.conn)
         return True
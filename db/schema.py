@@ -1,9 +1,7 @@
-# SQL for initial creation
-import connection as db
+# SQL for initial creation.
+# The statements are applied by the migration runner in db/migrations.py (version 1), never at import time.
 
-
-def create_tables(conn):
-    conn.execute("""
+CUSTOMERS_SCHEMA_SQL = """
         CREATE TABLE IF NOT EXISTS customers (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             ssn INTEGER NOT NULL,
@@ -26,24 +24,9 @@ def create_tables(conn):
             mailing INTEGER,
             notes TEXT
 )
-    """)
-    conn.commit()
-
-    """
-    conn.execute(
-    CREATE INDEX idx_customers_fname_nocase
-    ON customers (fname COLLATE NOCASE)
-    )
-    conn.commit();
-
-    conn.execute(
-    CREATE INDEX idx_customers_lname_nocase
-    ON customers (lname COLLATE NOCASE)
-    )
-    conn.commit();
     """
 
-    GLASSES_TEST_SCHEMA_SQL = """
+GLASSES_TEST_SCHEMA_SQL = """
     CREATE TABLE IF NOT EXISTS glasses_tests (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     customer_id INTEGER NOT NULL,
@@ -104,11 +87,8 @@ def create_tables(conn):
     FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
     )
     """
-    conn.execute(GLASSES_TEST_SCHEMA_SQL)
-    conn.commit()
-
 
-    CONTACT_LENSES_CHECK_SCHEMA_QUERY = """
+CONTACT_LENSES_CHECK_SCHEMA_QUERY = """
     CREATE TABLE IF NOT EXISTS contact_lenses_tests (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     customer_id INTEGER NOT NULL,
@@ -184,10 +164,18 @@ def create_tables(conn):
      FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
     );
     """
-    conn.execute(CONTACT_LENSES_CHECK_SCHEMA_QUERY)
+
+SCHEMA_STATEMENTS = (CUSTOMERS_SCHEMA_SQL, GLASSES_TEST_SCHEMA_SQL, CONTACT_LENSES_CHECK_SCHEMA_QUERY)
+
+
+def create_tables(conn):
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(statement)
     conn.commit()
 
 
-con = db.get_connection()
-create_tables(con)
-print("Created customers & glasses tables successfully!")
+if __name__ == "__main__":
+    from db.connection import get_connection
+
+    create_tables(get_connection())
+    print("Created customers & glasses tables successfully!")
@@ -0,0 +1,174 @@
+"""
+SQL statement registry.
+
+Everything the repos send for a model - its column lists, the SELECT projection, the INSERT and full-row UPDATE
+statements and the functions that pull their parameters out of a model - is derived once, at import time, from the
+dataclass in db/models.py. Adding a field to a model (and a migration adding the column) is the whole change.
+
+Parameter extractors are operator.attrgetter over the columns, plus a fix-up of the few columns stored in another
+form (exam dates as ISO text) or derived from a field (customers.birth_day from birth_date).
+
+A model can be stored in two tables: glasses_tests keeps the columns every history, scan and sync reads, and the
+rarely-read ones (GLASSES_TEST_COLD_COLUMNS) live in the 1:1 side table glasses_tests_cold. Full rows are read from `source` (a view joining the two); the INSERT and UPDATE
+statements cover the main table, and cold_insert_sql/cold_params the side table. Catalog columns (the side table's,
+and contact_lenses_tests' brands, materials and manufacturers) hold catalog_values ids (db/catalog.py): the repos encode
+them, and `source` shows them decoded.
+
+check_schema(conn) compares the registry with the live tables; the app runs it at startup, so a model and a schema
+that drifted apart fail loudly instead of failing (or silently dropping a field) on the first save.
+"""
+from dataclasses import dataclass
+from operator import attrgetter, itemgetter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from db.mappers import (
+    CONTACT_LENSES_TEST_COLUMNS, CUSTOMER_COLUMNS, GLASSES_TEST_COLUMNS,
+    contact_lenses_test_from_row, customer_from_row, glasses_test_from_row, select_list,
+)
+from db.models import ContactLensesTest, Customer, GlassesTest
+from db.utils import birth_date_to_epoch_day, encode_exam_date
+
+
+@dataclass(frozen=True)
+class ModelStatements:
+    model: type
+    table: str
+    columns: Tuple[str, ...]  # the model's fields = the SELECT list, in order
+    insert_columns: Tuple[str, ...]  # without id (assigned by SQLite), with the derived columns at the end
+    select: str
+    insert_sql: str
+    update_sql: str  # every insert column, WHERE id = ?
+    insert_params: Callable  # model -> values of insert_columns
+    update_params: Callable  # model -> values of insert_columns, then the id
+    values: Callable  # model -> values of columns (a shallow read, for validation dicts)
+    from_row: Callable
+    source: str  # where full rows are read from: the table, or the view joining it with its cold table
+    cold_table: Optional[str] = None
+    cold_columns: Tuple[str, ...] = ()  # stored in cold_table, not in insert_columns
+    cold_insert_sql: Optional[str] = None  # id, then every cold column
+    cold_params: Optional[Callable] = None  # model -> values of cold_columns
+
+    def as_dict(self, obj) -> dict:
+        """{field: value} without dataclasses.asdict()'s recursive deep copy."""
+        return dict(zip(self.columns, self.values(obj)))
+
+
+def make_params(fields: Tuple[str, ...], encoders: Dict[str, Callable] = None,
+                derived: Dict[str, Tuple[str, Callable]] = None) -> Callable:
+    """
+    Compiles model -> parameter tuple for `fields`, with encoders[field](value) applied, followed by one value per
+    derived column: derived[column] = (source field, function of the source value).
+    """
+    get = attrgetter(*fields)
+    encoded = [(i, encoders[f]) for i, f in enumerate(fields) if f in (encoders or {})]
+    extra = [(fields.index(source), derive) for source, derive in (derived or {}).values()]
+    if not encoded and not extra:
+        return get
+
+    def params(obj):
+        values = list(get(obj))
+        for i, encode in encoded:
+            values[i] = encode(values[i])
+        for i, derive in extra:
+            values.append(derive(values[i]))
+        return values
+
+    return params
+
+
+def register(model, table: str, columns: Tuple[str, ...], from_row: Callable, encoders: Dict[str, Callable] = None,
+             derived: Dict[str, Tuple[str, Callable]] = None, cold_table: str = None, cold_columns: Tuple[str, ...] = (),
+             source: str = None) -> ModelStatements:
+    fields = tuple(c for c in columns if c != "id" and c not in cold_columns)
+    insert_columns = fields + tuple(derived or ())
+    insert_params = make_params(fields, encoders, derived)
+    get_id = attrgetter("id")
+
+    def update_params(obj):
+        return (*insert_params(obj), get_id(obj))
+
+    statements = ModelStatements(
+        model=model,
+        table=table,
+        columns=columns,
+        insert_columns=insert_columns,
+        select=select_list(columns),
+        insert_sql=f"INSERT INTO {table} ({select_list(insert_columns)}) "
+                   f"VALUES ({', '.join('?' for _ in insert_columns)})",
+        update_sql=f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in insert_columns)} WHERE id = ?",
+        insert_params=insert_params,
+        update_params=update_params,
+        values=attrgetter(*columns),
+        from_row=from_row,
+        source=source or table,
+        cold_table=cold_table,
+        cold_columns=cold_columns,
+        cold_insert_sql=f"INSERT INTO {cold_table} (id, {select_list(cold_columns)}) "
+                        f"VALUES (?, {', '.join('?' for _ in cold_columns)})" if cold_table else None,
+        cold_params=make_params(cold_columns, encoders) if cold_table else None,
+    )
+    REGISTRY[table] = statements
+    return statements
+
+
+REGISTRY: Dict[str, ModelStatements] = {}
+
+# Dispensing details and notes, stored in glasses_tests_cold (migration 10): read only when one exam is opened
+GLASSES_TEST_COLD_COLUMNS = (
+    "lenses_material", "lenses_diameter_1", "lenses_diameter_2", "lenses_diameter_decentration_horizontal",
+    "lenses_diameter_decentration_vertical", "segment_diameter", "lenses_manufacturer", "lenses_color",
+    "lenses_coated", "catalog_num", "frame_manufacturer", "frame_supplier", "frame_model", "frame_size",
+    "frame_bar_length", "frame_color", "notes",
+)
+
+CUSTOMER_STATEMENTS = register(Customer, "customers", CUSTOMER_COLUMNS, customer_from_row,
+                               derived={"birth_day": ("birth_date", birth_date_to_epoch_day)})
+GLASSES_TEST_STATEMENTS = register(GlassesTest, "glasses_tests", GLASSES_TEST_COLUMNS, glasses_test_from_row,
+                                   encoders={"exam_date": encode_exam_date}, cold_table="glasses_tests_cold",
+                                   cold_columns=GLASSES_TEST_COLD_COLUMNS, source="glasses_tests_full")
+CONTACT_LENSES_TEST_STATEMENTS = register(ContactLensesTest, "contact_lenses_tests", CONTACT_LENSES_TEST_COLUMNS,
+                                          contact_lenses_test_from_row, encoders={"exam_date": encode_exam_date},
+                                          source="contact_lenses_tests_full")
+
+
+def split_columns(table: str, columns: Tuple[str, ...]) -> List[Tuple[str, Tuple[str, ...], Callable]]:
+    """
+    Where a full row of `table` with these columns is written: [(table, its columns, row -> their values)], the main
+    table first. A cold table's part starts with the id. Tables without a cold table are a single part.
+    """
+    statements = REGISTRY.get(table)
+    cold = [c for c in columns if statements is not None and c in statements.cold_columns]
+    if not cold:
+        return [(table, tuple(columns), tuple)]
+    parts = []
+    for part_table, part_columns in ((table, tuple(c for c in columns if c not in cold)),
+                                     (statements.cold_table, ("id", *cold))):
+        pick = itemgetter(*(columns.index(c) for c in part_columns))
+        parts.append((part_table, part_columns, pick))
+    return parts
+
+
+def schema_problems(conn) -> List[str]:
+    """Registered columns the live tables don't have (one message per table; empty = the schema matches)."""
+    problems = []
+    for table, statements in REGISTRY.items():
+        expected = {table: statements.insert_columns}
+        if statements.cold_table:
+            expected[statements.cold_table] = statements.cold_columns
+        expected[statements.source] = expected.get(statements.source, ()) + statements.columns
+        for name, columns in expected.items():
+            live = {row[1] for row in conn.execute(f"PRAGMA table_info({name})")}
+            if not live:
+                problems.append(f"{name}: table is missing")
+                break
+            missing = [c for c in dict.fromkeys(columns) if c not in live]
+            if missing:
+                problems.append(f"{name}: no column {', '.join(missing)} (model {statements.model.__name__})")
+    return problems
+
+
+def check_schema(conn):
+    """Raises ValueError if a registered model doesn't match the database it is about to be used with."""
+    problems = schema_problems(conn)
+    if problems:
+        raise ValueError("Models and database schema disagree: " + "; ".join(problems))
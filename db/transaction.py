@@ -0,0 +1,63 @@
+"""
+Unit of work for a connection.
+
+Repositories never call conn.commit() directly - they call commit(conn).
+Outside a transaction() block that commits right away, as before.
+Inside one, the commit is deferred to the end of the outermost block, so a multi-entity save is atomic
+and costs a single durable write. Nested blocks become SAVEPOINTs that can roll back on their own.
+"""
+from contextlib import contextmanager
+
+# conn -> nesting depth, only for connections currently inside a transaction() block.
+# (sqlite3.Connection can't be weak-referenced, so entries are removed when the outermost block exits.)
+_active = {}
+
+
+def in_unit_of_work(conn) -> bool:
+    return conn in _active
+
+
+def commit(conn):
+    """Commits now, unless the connection is inside a transaction() block (then the outermost block commits)."""
+    if conn not in _active:
+        conn.commit()
+
+
+@contextmanager
+def transaction(conn, immediate: bool = True):
+    """
+    Groups every repo call in the block into one transaction.
+    The outermost block commits on success and rolls back on error; nested blocks use savepoints.
+    immediate=True takes the write lock up front, so the block can't fail half-way with "database is locked".
+    """
+    depth = _active.get(conn, 0)
+
+    if depth == 0:
+        if conn.in_transaction:
+            conn.commit()  # flush an implicit transaction left open by a non-unit-of-work caller
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        _active[conn] = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            del _active[conn]
+        return
+
+    savepoint = f"uow_{depth}"
+    conn.execute(f"SAVEPOINT {savepoint}")
+    _active[conn] = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {savepoint}")
+        conn.execute(f"RELEASE {savepoint}")
+        raise
+    else:
+        conn.execute(f"RELEASE {savepoint}")
+    finally:
+        _active[conn] = depth
@@ -1,28 +1,101 @@
+import sqlite3
 from dataclasses import fields
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import islice
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
+EPOCH = date(1970, 1, 1)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Free-text birth dates seen in customer cards, tried in order
+BIRTH_DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d.%m.%Y", "%d-%m-%Y")
+
 
 def dict_from_row(row):
     """Converts sqlite3.Row to a plain dict."""
     return dict(row) if row else None
 
 
+@lru_cache(maxsize=None)
+def _field_names(cls):
+    return frozenset(f.name for f in fields(cls))
+
+
 def row_to_dataclass(row, cls):
-    """Convert sqlite3.Row to a dataclass instance."""
+    """Convert sqlite3.Row to a dataclass instance. (Repos use the compiled mappers in db/mappers.py instead.)"""
     if row is None:
         return None
     # Only include the fields that exist in the dataclass
-    data = {f.name: row[f.name] for f in fields(cls) if f.name in row.keys()}
+    names = _field_names(cls)
+    data = {key: row[key] for key in row.keys() if key in names}
     return cls(**data)
 
 
+def validate_customer_id(customer_id):
+    """Repo-level guard for customer_id arguments (the service validates user input before this)."""
+    if customer_id is None:
+        raise ValueError("customer_id must not be None")
+
+    if not isinstance(customer_id, int):
+        raise TypeError("customer_id must be an integer")
+
+    if customer_id <= 0:
+        raise ValueError("customer_id must be a positive integer")
+
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def iter_rows(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """Streams an executed cursor with fetchmany(), so only one batch of rows is in memory at a time."""
+    if batch_size <= 0:
+        raise ValueError("batch_size must be a positive integer")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def exam_date_filters(customer_id=None, since=None, until=None):
+    """WHERE clause + params for the optional filters of the exam iterators (dates are inclusive)."""
+    conditions = []
+    params = []
+    if customer_id is not None:
+        validate_customer_id(customer_id)
+        conditions.append("customer_id = ?")
+        params.append(customer_id)
+    if since is not None:
+        conditions.append("exam_date >= ?")
+        params.append(datetime_to_text(since))
+    if until is not None:
+        conditions.append("exam_date <= ?")
+        params.append(datetime_to_text(until))
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return where, params
+
+
+def chunked(iterable, size):
+    """Yields lists of up to `size` items (keeps IN (...) lists under SQLite's bound-parameter limit)."""
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def date_to_str(my_date):
     return my_date.strftime("%d/%m/%Y")
 
 
 def str_to_date(date_str):
+    if isinstance(date_str, datetime):
+        return date_str  # already converted (e.g. a record validated for an import)
+    if isinstance(date_str, date):
+        return datetime(date_str.year, date_str.month, date_str.day)
     dt_obj = datetime.strptime(date_str, "%d/%m/%Y")  # the input string's format
     return dt_obj
 
@@ -33,5 +106,53 @@ def datetime_to_text(dt: datetime) -> str:
 
 
 def text_to_datetime(text: str) -> datetime:
-    """Convert stored ISO8601 text back to datetime."""
-    return datetime.strptime(text, ISO_FORMAT)
+    """Convert stored ISO8601 text back to datetime (fromisoformat is a C fast path, unlike strptime)."""
+    return datetime.fromisoformat(text)
+
+
+def encode_exam_date(value):
+    """datetime/date -> stored ISO8601 text. Text (e.g. an undecodable legacy value read back) is kept as-is."""
+    if isinstance(value, (datetime, date)):
+        return datetime_to_text(value)
+    return value
+
+
+def decode_exam_date(value):
+    """
+    Stored exam_date -> datetime, for every repo.
+    Unparseable legacy values are returned as-is rather than failing the whole read.
+    """
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def date_to_epoch_day(d: date) -> int:
+    """Dates are stored as days since 1970-01-01: sortable, indexable, and one integer compare per row."""
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+def epoch_day_to_date(day: int) -> date:
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+def birth_date_to_epoch_day(text):
+    """Parses a free-text birth date (see BIRTH_DATE_FORMATS) to an epoch day, or None if it isn't a date."""
+    if not text:
+        return None
+    text = str(text).strip()
+    for fmt in BIRTH_DATE_FORMATS:
+        try:
+            return date_to_epoch_day(datetime.strptime(text, fmt).date())
+        except ValueError:
+            continue
+    return None
+
+
+# Every repo writes datetimes in the same ISO8601 text format (sortable, and what the exam_date indexes hold),
+# whether or not it converts them itself. Replaces sqlite3's default adapters (deprecated since Python 3.12).
+sqlite3.register_adapter(datetime, datetime_to_text)
+sqlite3.register_adapter(date, date.isoformat)
@@ -4,7 +4,7 @@
 # Press Double Shift to search everywhere for classes, files, tool windows, actions, and settings.
 from datetime import datetime
 from dataclasses import asdict
-from db.connection import get_connection
+from db.connection import get_connection, create_connection, close_connection
 from db.models import Customer, GlassesTest, ContactLensesTest
 from db.repositories.contact_lenses_repo import ContactLensesTestRepo
 from db.repositories.customer_repo import CustomerRepo
@@ -17,12 +17,13 @@ from services.customer_service import CustomerService
 DB_PATH = "database.db"
 
 
-def build_container():
+def build_container(profile="writer"):
     """
     Dependency Injection container.
     Creates reusable objects and returns them.
+    The profile picks the connection tuning: "writer" for the app, "reader" for reports, "memory" for tests.
     """
-    conn = get_connection()
+    conn = create_connection(profile)
     cus_repo = CustomerRepo(conn)
     glasses_repo = GlassesRepo(conn)
     lenses_repo = ContactLensesTestRepo(conn)
@@ -41,13 +42,15 @@ def main():
     else:
         print("Retrieved customer with SSN 205350547: ", customer_result)
 
+    close_connection(customer_service.cus_repo.conn)
+
 
 if __name__ == "__main__":
     main()
 
 """
 # USING the Customer Repo:
-from db.connection import get_connection
+from db.connection import get_connection, create_connection, close_connection
 from db.repositories.customers_repo import CustomersRepo
 
 conn = get_connection()
@@ -271,7 +274,7 @@ def create_lenses_check_and_update_it():
     print("The input exam date: " + lens_test_dict["exam_date"])
     # history = customer_service.get_latest_contact_lenses(1)
     # print(type(history.exam_date))
-    # print("Last lenses exam date is: " + date_to_str(text_to_datetime(history.exam_date)))
+    # print("Last lenses exam date is: " + date_to_str(history.exam_date))
 
     # history = customer_service.add_contact_lenses_test(1, lens_test_dict)
     # print(history)
@@ -0,0 +1,163 @@
+"""
+AsyncCustomerService: the CustomerService API as coroutines, for the Textual UI.
+
+Every call runs on one dedicated database thread that owns the connection (and the service, and its cache), so the
+event loop - keystrokes, rendering - never waits on a query, a lock or an fsync. Calls run one at a time, in order.
+
+Cancelling the awaiting task cancels the call: a call still queued is dropped; a running read is stopped with
+Connection.interrupt() (the query raises "interrupted" on the database thread and its result is discarded).
+Writes are never interrupted - a cancelled save still finishes, only its result is dropped.
+
+Search-as-you-type:
+
+    customers = await service.latest("search", service.search_customers(text))
+
+cancels the previous still-running "search" call, so only the newest keystroke's query uses the database.
+
+The checks that never touch the database (PURE_METHODS: form validation, per-field checks) are plain methods, called
+on the caller's thread: a field checked on every keystroke doesn't queue behind a slow query.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from db.bootstrap import DB_PATH
+from db.connection import create_connection, close_connection
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from services.customer_service import CustomerService
+
+# Run directly, not on the database thread: they only check the values given to them.
+PURE_METHODS = frozenset({
+    "validate_input_customer", "check_glasses_field", "check_contact_lenses_field", "report_violations",
+})
+
+# Not mirrored: a unit of work spans several calls - use `await service.run(fn)` and open it inside fn.
+NOT_MIRRORED = {"transaction", *PURE_METHODS}
+
+MIRRORED_METHODS = tuple(
+    name for name in dir(CustomerService)
+    if not name.startswith("_") and name not in NOT_MIRRORED and callable(getattr(CustomerService, name))
+)
+
+# Calls that change data run to completion even when cancelled.
+WRITE_METHODS = frozenset(name for name in MIRRORED_METHODS if name.startswith(("add_", "update_", "delete_")))
+
+
+def open_customer_service(db_path: str = DB_PATH, profile: str = "writer", cache_size: int = 256) -> CustomerService:
+    conn = create_connection(profile, path=db_path)
+    return CustomerService(CustomerRepo(conn), GlassesRepo(conn), ContactLensesTestRepo(conn), cache_size)
+
+
+class _Call:
+    __slots__ = ("interruptible",)
+
+    def __init__(self, interruptible: bool):
+        self.interruptible = interruptible
+
+
+class AsyncCustomerService:
+    """
+    `service_factory` builds the CustomerService; it is called on the database thread, which then owns the
+    connection. The default opens the app database with the writer profile.
+    """
+
+    def __init__(self, service_factory: Callable[[], CustomerService] = open_customer_service):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="customer-db")
+        self._service: Optional[CustomerService] = None
+        self._running: Optional[_Call] = None
+        self._lock = threading.Lock()
+        self._latest: Dict[str, asyncio.Future] = {}
+        self.interrupts = 0
+        self._opened = self._executor.submit(self._open, service_factory)
+
+    def _open(self, service_factory):
+        self._service = service_factory()
+
+    @property
+    def conn(self):
+        return self._service.cus_repo.conn if self._service is not None else None
+
+    async def run(self, fn: Callable[[CustomerService], object], interruptible: bool = False):
+        """Runs fn(service) on the database thread - for several calls that belong together (e.g. a transaction)."""
+        return await self._submit(_Call(interruptible), fn)
+
+    async def latest(self, key: str, call):
+        """Awaits `call` (a coroutine of this service) after cancelling the previous unfinished call made with `key`."""
+        previous = self._latest.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        task = asyncio.ensure_future(call)
+        self._latest[key] = task
+        return await task
+
+    async def close(self):
+        """Waits for the queued calls, then closes the connection on its own thread."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+
+    def _close(self):
+        if self._service is not None:
+            close_connection(self.conn)
+            self._service = None
+
+    async def _call(self, name: str, args, kwargs):
+        return await self._submit(_Call(name not in WRITE_METHODS),
+                                  lambda service: getattr(service, name)(*args, **kwargs))
+
+    async def _submit(self, call: _Call, fn):
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._run, call, fn)
+        try:
+            return await future  # cancelling this also drops the call if it hasn't started yet
+        except asyncio.CancelledError:
+            self._interrupt(call)
+            raise
+
+    def _run(self, call: _Call, fn):
+        # database thread
+        self._opened.result()  # surfaces a failed connection open on every call
+        with self._lock:
+            self._running = call
+        try:
+            return fn(self._service)
+        finally:
+            with self._lock:
+                self._running = None
+
+    def _interrupt(self, call: _Call):
+        # Under the lock the call can't finish (and the next one can't start) while the interrupt is sent,
+        # so it can only hit this call's statements.
+        with self._lock:
+            if self._running is call and call.interruptible:
+                self.conn.interrupt()
+                self.interrupts += 1
+
+
+def _mirror(name: str):
+    async def method(self, *args, **kwargs):
+        return await self._call(name, args, kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"AsyncCustomerService.{name}"
+    method.__doc__ = getattr(CustomerService, name).__doc__
+    return method
+
+
+def _direct(name: str):
+    def method(self, *args, **kwargs):
+        self._opened.result()
+        return getattr(self._service, name)(*args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"AsyncCustomerService.{name}"
+    method.__doc__ = getattr(CustomerService, name).__doc__
+    return method
+
+
+for _name in MIRRORED_METHODS:
+    setattr(AsyncCustomerService, _name, _mirror(_name))
+for _name in PURE_METHODS:
+    setattr(AsyncCustomerService, _name, _direct(_name))
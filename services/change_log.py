@@ -0,0 +1,147 @@
+"""
+Change-data capture for the read-only companion app.
+
+Triggers (migration 8) append (seq, table, row id, op) to change_log on every insert/update/delete of a customer or
+an exam. A client remembers the last seq it applied and asks for changes_since(seq): the answer is one entry per
+changed row - the row's current values, or a tombstone if it was deleted - so a sync costs what changed since the
+client's cursor, not the size of the database.
+
+An exam's row is its full row (glasses_tests_full for glasses), and an edit of only its glasses_tests_cold columns is
+logged as an update of the exam (migration 10).
+
+Rows that were created and deleted after the cursor are left out (the client never had them).
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from db.migrations import CHANGE_LOG_TABLES
+from db.statements import REGISTRY
+from db.transaction import transaction
+from db.utils import chunked
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+_IDS_PER_QUERY = 500
+
+
+@dataclass
+class Change:
+    seq: int  # the last log entry of this row that is included
+    table: str
+    row_id: int
+    op: str  # UPSERT or DELETE
+    row: Optional[dict] = None  # column -> stored value; None for tombstones
+
+
+@dataclass
+class ChangeSet:
+    changes: List[Change] = field(default_factory=list)
+    last_seq: int = 0  # the client's next cursor
+    has_more: bool = False  # more changes after last_seq - call changes_since(last_seq) again
+
+
+class ChangeLog:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def latest_seq(self) -> int:
+        return self.conn.execute("SELECT coalesce(max(seq), 0) FROM change_log").fetchone()[0]
+
+    def changes_since(self, seq: int = 0, limit: int = 1000) -> ChangeSet:
+        """
+        The rows changed after `seq`, oldest change first, read from at most `limit` log entries.
+        Repeated changes to a row within those entries collapse into one entry carrying its current values;
+        a row that changes again later shows up again on a later page.
+        """
+        if limit <= 0:
+            raise ValueError("limit must be a positive integer")
+
+        # One read transaction: the log and the rows it points at come from the same snapshot.
+        with transaction(self.conn, immediate=False):
+            # op is a bare column next to the only aggregate, max(seq): SQLite takes it from the row holding the max,
+            # i.e. it is the row's last op. The page is a seq range of the primary key, so a call costs `limit`.
+            entries = self.conn.execute("""
+                SELECT table_name, row_id, last_seq, op,
+                       op = 'D' AND EXISTS (
+                           SELECT 1 FROM change_log AS insert_entry
+                           WHERE insert_entry.table_name = last_entry.table_name
+                             AND insert_entry.row_id = last_entry.row_id
+                             AND insert_entry.op = 'I' AND insert_entry.seq > ?
+                       ) AS created
+                FROM (
+                    SELECT table_name, row_id, max(seq) AS last_seq, op
+                    FROM (SELECT * FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?)
+                    GROUP BY table_name, row_id
+                ) AS last_entry
+                ORDER BY last_seq
+            """, (seq, seq, limit)).fetchall()
+            if not entries:
+                return ChangeSet([], seq, False)
+
+            last_seq = entries[-1][2]
+            has_more = self.conn.execute("SELECT EXISTS (SELECT 1 FROM change_log WHERE seq > ?)",
+                                         (last_seq,)).fetchone()[0]
+
+            changes = []
+            upserts = {}
+            for table_name, row_id, entry_seq, op, created in entries:
+                if op == "D":
+                    if not created:
+                        changes.append(Change(entry_seq, table_name, row_id, DELETE))
+                    continue
+                change = Change(entry_seq, table_name, row_id, UPSERT)
+                changes.append(change)
+                upserts.setdefault(table_name, {})[row_id] = change
+
+            gone = []
+            for table_name, by_id in upserts.items():
+                self._load_rows(table_name, by_id)
+                gone += [change for change in by_id.values() if change.row is None]
+            # Changed within the page and deleted after it: the row is not in the snapshot any more. It is sent as a
+            # tombstone (the delete's own entry comes on a later page), or left out if the client never had it.
+            for change in gone:
+                if self._created_since(change.table, change.row_id, seq):
+                    changes.remove(change)
+                else:
+                    change.op = DELETE
+
+        return ChangeSet(changes, last_seq, bool(has_more))
+
+    def _created_since(self, table: str, row_id: int, seq: int) -> bool:
+        return bool(self.conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM change_log WHERE table_name = ? AND row_id = ? AND op = 'I' AND seq > ?)",
+            (table, row_id, seq),
+        ).fetchone()[0])
+
+    def _load_rows(self, table: str, changes_by_id: dict):
+        if table not in CHANGE_LOG_TABLES:
+            raise ValueError(f"Unknown table {table!r}")
+        for ids in chunked(changes_by_id, _IDS_PER_QUERY):
+            cursor = self.conn.execute(
+                f"SELECT * FROM {REGISTRY[table].source} WHERE id IN ({', '.join('?' for _ in ids)})", ids
+            )
+            columns = [description[0] for description in cursor.description]
+            for row in cursor:
+                row = dict(zip(columns, row))
+                changes_by_id[row["id"]].row = row
+
+    # -----------------------------------------
+    # Maintenance
+    # -----------------------------------------
+
+    def compact(self) -> int:
+        """
+        Drops every log entry superseded by a later entry for the same row; returns how many were removed.
+        changes_since() answers stay valid for every cursor (at worst a client gets a tombstone for a row it never had).
+        The log then holds one entry per row, deleted rows included - their tombstones.
+        """
+        with transaction(self.conn):
+            cursor = self.conn.execute("""
+                DELETE FROM change_log
+                WHERE seq < (
+                    SELECT max(latest.seq) FROM change_log AS latest
+                    WHERE latest.table_name = change_log.table_name AND latest.row_id = change_log.row_id
+                )
+            """)
+        return cursor.rowcount
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from copy import copy
+from typing import Optional
+
+from db.models import Customer
+
+
+class CustomerCache:
+    """
+    Bounded LRU cache of Customer objects, looked up by internal id or by SSN.
+    Lives in the service layer: the service fills it on reads and invalidates it on its own writes.
+    Callers always get a copy, so editing a returned Customer can't change the cached one.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        if maxsize <= 0:
+            raise ValueError("Cache size must be a positive number")
+        self.maxsize = maxsize
+        self._by_id = OrderedDict()  # id -> Customer, least recently used first
+        self._id_by_ssn = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, customer_id):
+        try:
+            return _key(customer_id) in self._by_id
+        except (TypeError, ValueError):
+            return False
+
+    def get(self, customer_id) -> Optional[Customer]:
+        key = _key(customer_id)
+        customer = self._by_id.get(key)
+        if customer is None:
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(key)
+        self.hits += 1
+        return copy(customer)
+
+    def get_by_ssn(self, ssn) -> Optional[Customer]:
+        customer_id = self._id_by_ssn.get(str(ssn))
+        if customer_id is None:
+            self.misses += 1
+            return None
+        return self.get(customer_id)
+
+    def put(self, customer: Customer):
+        if customer is None or customer.id is None:
+            return
+        key = _key(customer.id)
+        self.invalidate(key)
+        self._by_id[key] = copy(customer)
+        self._id_by_ssn[str(customer.ssn)] = key
+        while len(self._by_id) > self.maxsize:
+            _, evicted = self._by_id.popitem(last=False)
+            self._id_by_ssn.pop(str(evicted.ssn), None)
+
+    def invalidate(self, customer_id):
+        customer = self._by_id.pop(_key(customer_id), None)
+        if customer is not None:
+            self._id_by_ssn.pop(str(customer.ssn), None)
+
+    def clear(self):
+        self._by_id.clear()
+        self._id_by_ssn.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._by_id),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _key(customer_id) -> int:
+    return int(customer_id)
@@ -1,18 +1,41 @@
-from dataclasses import asdict
+from datetime import date, timedelta
 
+from db.dirty import tracked_fields
 from db.models import Customer, GlassesTest, ContactLensesTest
 from db.repositories.contact_lenses_repo import ContactLensesTestRepo
 from db.repositories.customer_repo import CustomerRepo
 from db.repositories.glasses_repo import GlassesRepo
+from db.statements import CUSTOMER_STATEMENTS
+from db.transaction import in_unit_of_work, transaction
+from services.customer_cache import CustomerCache
+from services.validation import CUSTOMER_VALIDATOR, GLASSES_TEST_VALIDATOR, CONTACT_LENSES_TEST_VALIDATOR
 from db.utils import *
 
 
+def years_before(day: date, years: int) -> date:
+    """The same calendar day `years` earlier (Feb 29 -> Feb 28 in non-leap years)."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
 class CustomerService:
 
-    def __init__(self, customer_repo: CustomerRepo, glasses_repo: GlassesRepo, lenses_repo: ContactLensesTestRepo):
+    def __init__(self, customer_repo: CustomerRepo, glasses_repo: GlassesRepo, lenses_repo: ContactLensesTestRepo,
+                 cache_size: int = 256):
         self.cus_repo = customer_repo
         self.glasses_repo = glasses_repo
         self.lenses_repo = lenses_repo
+        self.customer_cache = CustomerCache(cache_size)
+
+    def transaction(self):
+        """
+        Unit of work: `with service.transaction(): ...`
+        Every repo call inside the block is committed once, at the end - or rolled back together on error.
+        Blocks can be nested (inner blocks are savepoints).
+        """
+        return transaction(self.cus_repo.conn)
 
     def add_customer(self, customer_data: dict):
         # Adds and returns a newly-created Customer object
@@ -35,6 +58,12 @@ class CustomerService:
         # Example: normalize input
         return self.cus_repo.search_by_name(query=query.strip())
 
+    def search_customers(self, query: str, limit: int = 50):
+        # Search-box lookup: name, SSN, phone or town, best matches first
+        if limit <= 0:
+            raise ValueError("Search limit must be a positive number!")
+        return self.cus_repo.search_customers(query.strip(), limit)
+
     def get_customer_by_ssn(self, customer_ssn: str):
         if not customer_ssn:
             raise ValueError("ID must be provided!")
@@ -42,7 +71,11 @@ class CustomerService:
             raise ValueError("Invalid ID provided!")
         if not customer_ssn.isdigit():
             raise ValueError("ID must contain only numbers!")
-        return self.cus_repo.get_customer_by_ssn(customer_ssn)
+
+        cached = self.customer_cache.get_by_ssn(customer_ssn)
+        if cached is not None:
+            return cached
+        return self._cache_customer(self.cus_repo.get_customer_by_ssn(customer_ssn))
 
     def get_customer(self, customer_id: int):
         if not customer_id:
@@ -51,13 +84,30 @@ class CustomerService:
         if not str(customer_id).isdigit():
             raise ValueError("Customer internal ID must be number only!")
 
-        return self.cus_repo.get_customer(customer_id)
+        cached = self.customer_cache.get(customer_id)
+        if cached is not None:
+            return cached
+        return self._cache_customer(self.cus_repo.get_customer(customer_id))
+
+    def customer_exists(self, customer_id) -> bool:
+        # Cheap check: the cache, or an EXISTS query that doesn't read the row
+        if customer_id in self.customer_cache:
+            return True
+        return self.cus_repo.customer_exists(customer_id)
+
+    def customer_cache_stats(self) -> dict:
+        return self.customer_cache.stats()
+
+    def _cache_customer(self, customer):
+        # Rows read inside a unit of work may still be rolled back - only committed data is cached
+        if customer is not None and not in_unit_of_work(self.cus_repo.conn):
+            self.customer_cache.put(customer)
+        return customer
 
     def update_customer(self, customer: Customer):
         if not customer.id:
             raise ValueError("Customer does not contain an ID!")
-        cus_exists = self.cus_repo.get_customer(customer.id)
-        if cus_exists is None:
+        if not self.customer_exists(customer.id):
             raise ValueError("Customer does not exist in DB!")
         if not customer.ssn:
             raise ValueError("Must provide customer SSN!")
@@ -67,14 +117,29 @@ class CustomerService:
             raise ValueError("First and last name are required!")
 
         # Validate fields:
-        valid = self.validate_input_customer(asdict(customer))
+        valid = self.validate_input_customer(CUSTOMER_STATEMENTS.as_dict(customer))
         if not valid:
             return None
 
-        self.cus_repo.update_customer(customer)
+        self.customer_cache.invalidate(customer.id)
+        return self.cus_repo.update_customer(customer)
 
     def delete_customer(self, customer_id: int):
-        self.cus_repo.delete_customer(customer_id)
+        self.customer_cache.invalidate(customer_id)
+        return self.cus_repo.delete_customer(customer_id)
+
+    def get_customers_by_age(self, min_age: int, max_age: int, today: date = None):
+        # Customers aged min_age..max_age (inclusive) on `today`, oldest first
+        if min_age < 0 or max_age < min_age:
+            raise ValueError("Invalid age range!")
+        today = today or date.today()
+        born_from = years_before(today, max_age + 1) + timedelta(days=1)
+        born_to = years_before(today, min_age)
+        return self.cus_repo.list_customers_born_between(born_from, born_to)
+
+    def list_customers_page(self, after=None, limit: int = 50, order_by: str = "id"):
+        # Returns a Page of Customers; pass page.next_token back as `after` for the next one
+        return self.cus_repo.list_customers_page(after=after, limit=limit, order_by=order_by)
 
     # -----------------------------------------
     # 'Glasses Test' Operations
@@ -103,12 +168,29 @@ class CustomerService:
 
         return self.glasses_repo.list_tests_for_customer(customer_id)
 
+    def get_glasses_history_summaries(self, customer_id):
+        # Returns a list of GlassesTestSummary (the history list screen); the full test loads when a row is opened
+        if not self.validate_customer_exists(customer_id):
+            return None
+
+        return self.glasses_repo.list_test_summaries(customer_id)
+
+    def get_glasses_history_page(self, customer_id, after=None, limit: int = 20):
+        # Returns a Page of GlassesTest, newest first
+        if not self.validate_customer_exists(customer_id):
+            return None
+
+        return self.glasses_repo.list_tests_page(customer_id, after=after, limit=limit)
+
     def get_latest_glasses(self, customer_id) -> GlassesTest:
         if not self.validate_customer_exists(customer_id):
             return None
 
-        history = self.glasses_repo.list_tests_for_customer(customer_id)
-        return history[0] if history else None
+        return self.glasses_repo.get_latest_test(customer_id)
+
+    def get_latest_glasses_for_customers(self, customer_ids):
+        """Returns {customer_id: latest GlassesTest} for a whole customer list / recall screen in one query."""
+        return self.glasses_repo.latest_tests_for_customers(customer_ids)
 
     def update_glasses_test(self, customer_id, updated_test_data: dict):
         """Returns a boolean"""
@@ -124,7 +206,7 @@ class CustomerService:
         # Create dataclass
         ref_test = GlassesTest(**updated_test_data)  # is passed an object, not a dict, to ensure complete and correct objects.
 
-        return self.glasses_repo.update_test(ref_test)
+        return self.glasses_repo.update_test(self._onto_stored(self.glasses_repo, ref_test))
 
     def delete_glasses_test(self, test_id: int):
         return self.glasses_repo.delete_test(test_id)  # DB doesn't fail if the test_id doesn't exist.
@@ -157,12 +239,29 @@ class CustomerService:
 
         return self.lenses_repo.list_tests_for_customer(customer_id)
 
+    def get_contact_lenses_history_summaries(self, customer_id):
+        # Returns a list of ContactLensesTestSummary (the history list screen); the full test loads when a row is opened
+        if not self.validate_customer_exists(customer_id):
+            return None
+
+        return self.lenses_repo.list_test_summaries(customer_id)
+
+    def get_contact_lenses_history_page(self, customer_id, after=None, limit: int = 20):
+        # Returns a Page of ContactLensesTest, newest first
+        if not self.validate_customer_exists(customer_id):
+            return None
+
+        return self.lenses_repo.list_tests_page(customer_id, after=after, limit=limit)
+
     def get_latest_contact_lenses(self, customer_id) -> ContactLensesTest:
         if not self.validate_customer_exists(customer_id):
             return None
 
-        history = self.lenses_repo.list_tests_for_customer(customer_id)
-        return history[0] if history else None
+        return self.lenses_repo.get_latest_test(customer_id)
+
+    def get_latest_contact_lenses_for_customers(self, customer_ids):
+        """Returns {customer_id: latest ContactLensesTest} for a whole customer list / recall screen in one query."""
+        return self.lenses_repo.latest_tests_for_customers(customer_ids)
 
     def update_contact_lenses_test(self, customer_id, updated_test_data: dict):
         """Returns a boolean"""
@@ -178,223 +277,73 @@ class CustomerService:
         # Create dataclass
         ref_test = ContactLensesTest(**updated_test_data)  # is passed an object, not a dict, to ensure complete and correct objects.
 
-        return self.lenses_repo.update_test(ref_test)
+        return self.lenses_repo.update_test(self._onto_stored(self.lenses_repo, ref_test))
 
     def delete_contact_lenses_test(self, test_id: int):
         return self.lenses_repo.delete_test(test_id)  # DB doesn't fail if the test_id doesn't exist.
 
+    @staticmethod
+    def _onto_stored(repo, edited):
+        """
+        The stored test with every field of `edited` copied onto it: the repo then UPDATEs only the columns the
+        form actually changed (one PK read instead of rewriting all the columns). Unknown ids are saved as given.
+        """
+        stored = repo.get_test(edited.id) if edited.id is not None else None
+        if stored is None:
+            return edited
+        for name in tracked_fields(type(edited))[0]:
+            setattr(stored, name, getattr(edited, name))
+        return stored
+
     # -----------------------------------------------------------------------------------------------------------------
     #                                               Validation helper functions:
     # -----------------------------------------------------------------------------------------------------------------
 
     def validate_input_customer(self, customer_data: dict):
         """
-        Apply validation/business logic here.
+        Apply validation/business logic here (the CUSTOMER_RULES table in services/validation.py).
         """
-        if not customer_data["ssn"]:
-            print("Must provide customer SSN!")
-            return False
-
-        if len(str(customer_data["ssn"])) != 9:
-            print("ID should be 9 digits long!")
-            return False
-
-        if not customer_data["fname"].strip() or not customer_data["lname"].strip():
-            print("First and last name are required!")
-            return False
-
-        if customer_data["tel_mobile"] and (len(customer_data["tel_mobile"]) != 10 or not customer_data["tel_mobile"].isdigit()):
-            print("Invalid phone number!")
-            return False
-
-        if len(customer_data["fname"].strip()) > 50 or len(customer_data["lname"].strip()) > 50:
-            print("Name is too long!")
-            return False
-
-        if customer_data["town"] and len(customer_data["town"]) > 50:
-            print("Town name is too long!")
-            return False
-
-        if customer_data["notes"] and len(customer_data["notes"]) > 500:
-            print("Notes exceed maximum length of 500 characters!")
-            return False
-
-        if customer_data["glasses_num"] and not isinstance(customer_data["glasses_num"], int):
-            print("Error: Glasses number must be an integer!")
-            return False
-
-        if customer_data["lenses_num"] and not isinstance(customer_data["lenses_num"], int):
-            print("Error: Lenses number must be an integer!")
-            return False
-        if customer_data["mailing"] and not isinstance(customer_data["mailing"], int):
-            print("Error: Mailing must be an integer!")
-            return False
-
-        # Lengths checks:
-        if customer_data["birth_date"] and len(customer_data["birth_date"]) > 50:
-            print("Birth date exceed maximum length of 50 characters!")
-            return False
-        if customer_data["sex"] and len(customer_data["sex"]) > 20:
-            print("Sex exceed maximum length of 20 characters!")
-            return False
-        if customer_data["tel_home"] and len(customer_data["tel_home"]) > 15:
-            print("Tel. Home exceed maximum length of 15 characters!")
-            return False
-        if customer_data["address"] and len(customer_data["address"]) > 100:
-            print("Address exceed maximum length of 100 characters!")
-            return False
-        if customer_data["postal_code"] and len(customer_data["postal_code"]) > 20:
-            print("Postal code exceed maximum length of 20 characters!")
-            return False
-        if customer_data["status"] and len(customer_data["status"]) > 50:
-            print("Status exceed maximum length of 50 characters!")
-            return False
-        if customer_data["org"] and len(customer_data["org"]) > 50:
-            print("Org exceed maximum length of 50 characters!")
-            return False
-        if customer_data["occupation"] and len(customer_data["occupation"]) > 50:
-            print("Occupation exceed maximum length of 50 characters!")
-            return False
-        if customer_data["hobbies"] and len(customer_data["hobbies"]) > 50:
-            print("Hobbies exceed maximum length of 50 characters!")
-            return False
-        if customer_data["referer"] and len(customer_data["referer"]) > 50:
-            print("Referer exceed maximum length of 50 characters!")
-            return False
-
-        return True
-
+        return self.report_violations(CUSTOMER_VALIDATOR.validate(customer_data))
 
     def validate_input_glasses_test(self, customer_id, test_data: dict):
-        # --- Step 1: Validate customer_id ---
-        if not isinstance(customer_id, int) or customer_id <= 0:
-            print("Invalid customer ID")
-            return False
-
-        # Check that customer actually exists
-        customer = self.cus_repo.get_customer(customer_id)
-        if customer is None:
-            print(f"Customer {customer_id} does not exist")
+        if not self.validate_test_customer(customer_id):
             return False
+        return self.report_violations(GLASSES_TEST_VALIDATOR.validate(test_data))
 
-        # --- Step 2: Validate required field(s) ---
-        if "exam_date" not in test_data:
-            print("exam_date is required")
-            return False
-
-        # --- Step 3: Validate exam_date (must be YYYY-MM-DD) ---
-        try:
-            str_to_date(test_data["exam_date"])
-        except ValueError:
-            print("exam_date must be in format YYYY-MM-DD")
+    def validate_input_contact_lenses_test(self, customer_id, test_data: dict):
+        if not self.validate_test_customer(customer_id):
             return False
+        return self.report_violations(CONTACT_LENSES_TEST_VALIDATOR.validate(test_data))
 
-        # --- Step 4: Validate numeric fields (optional, if given) ---
-        numeric_fields = [
-            "r_cylinder", "r_axis", "r_prism", "r_add_read", "r_add_int",
-            "r_add_bif", "r_add_mul", "r_high",
-            "l_cylinder", "l_axis", "l_prism", "l_add_read", "l_add_int",
-            "l_add_bif", "l_add_mul", "l_high",
-            "lenses_diameter_1", "lenses_diameter_2", "segment_diameter",
-        ]
-
-        for field in numeric_fields:
-            if field in test_data and test_data[field] is not None:
-                if not isinstance(test_data[field], (int, float)):
-                    print(f"{field} must be numeric")
-                    return False
-
-        # If Right cylinder is 0 → axis must be None
-        if test_data["r_cylinder"] is None:  #  or test_data["r_cylinder"] == 0
-            if test_data["r_axis"] not in (None,):
-                raise ValueError("R_Axis must be None when cylinder is 0.00")
-        # Otherwise must be 0–180 integer
-        if not isinstance(test_data["r_axis"], int):
-            raise ValueError("R_Axis must be an integer between 0 and 180")
-
-        if not (0 <= test_data["r_axis"] <= 180):
-            raise ValueError("R_Axis must be between 0 and 180")
-
-        # Left Cylinder/Axis validation:
-        if test_data["l_cylinder"] is None:  # or test_data["l_cylinder"] == 0
-            if test_data["l_axis"] not in (None,):
-                raise ValueError("L_Axis must be None when cylinder is 0.00")
-        # Otherwise must be 0–180 integer
-        if not isinstance(test_data["l_axis"], int):
-            raise ValueError("L_Axis must be an integer between 0 and 180")
-
-        if not (0 <= test_data["l_axis"] <= 180):
-            raise ValueError("L_Axis must be between 0 and 180")
-
-        return True
-
-    def validate_input_contact_lenses_test(self, customer_id, test_data: dict):
-        # --- Step 1: Validate customer_id ---
+    def validate_test_customer(self, customer_id):
         if not isinstance(customer_id, int) or customer_id <= 0:
             print("Invalid customer ID")
             return False
 
         # Check that customer actually exists
-        customer = self.cus_repo.get_customer(customer_id)
-        if customer is None:
+        if not self.customer_exists(customer_id):
             print(f"Customer {customer_id} does not exist")
             return False
+        return True
 
-        # --- Step 2: Validate required field(s) ---
-        if "exam_date" not in test_data:
-            print("exam_date is required")
-            return False
-
-        # --- Step 3: Validate exam_date (must be YYYY-MM-DD) ---
-        try:
-            str_to_date(test_data["exam_date"])
-        except ValueError:
-            print("exam_date must be in format YYYY-MM-DD")
-            return False
-
-        # --- Step 4: Validate numeric fields (optional, if given) ---
-        numeric_fields = [
-            "r_lens_sp", "r_lens_cyl", "r_lens_axis",
-            "l_lens_sph", "l_lens_cyl", "l_lens_axis"
-        ]
-
-        for field in numeric_fields:
-            if field in test_data and test_data[field] is not None:
-                if not isinstance(test_data[field], (int, float)):
-                    print(f"{field} must be numeric")
-                    return False
-
-        # --- Step 5: Validation Cylinder/Axis relationship ---
-
-
-        # If RIGHT cylinder is 0 → RIGHT axis must be None
-        if test_data["r_lens_cyl"] is None:  # or test_data["r_lens_cyl"] == 0
-            if test_data["r_lens_axis"] not in (None,):
-                raise ValueError("R_lens_axis must be None when cylinder is None")
-        # Otherwise must be 0–180 integer
-        if not isinstance(test_data["r_lens_axis"], int):
-            raise ValueError("R_lens_axis must be an integer between 0 and 180")
-
-        if not (0 <= test_data["r_lens_axis"] <= 180):
-            raise ValueError("R_lens_Axis must be between 0 and 180")
-
-        # If LEFT cylinder is 0 → LEFT axis must be None:
-        if test_data["l_lens_cyl"] is None:  # or test_data["l_lens_cyl"] == 0
-            if test_data["l_lens_axis"] not in (None,):
-                raise ValueError("L_lens_Axis must be None when cylinder is 0.00")
-        # Otherwise must be 0–180 integer
-        if not isinstance(test_data["l_lens_axis"], int):
-            raise ValueError("L_lens_Axis must be an integer between 0 and 180")
+    @staticmethod
+    def report_violations(violations) -> bool:
+        """Prints every violation (not just the first one); returns True when there are none."""
+        for violation in violations:
+            print(violation)
+        return not violations
 
-        if not (0 <= test_data["l_lens_axis"] <= 180):
-            raise ValueError("L_lens_Axis must be between 0 and 180")
+    # Per-field checks for the TUI forms (cheap enough to run on every keystroke).
+    # `test_data` is the rest of the form, for the cross-field rules (cyl/axis, prism/base, PD sum).
+    def check_glasses_field(self, field: str, value, test_data: dict = None):
+        return GLASSES_TEST_VALIDATOR.validate_field(field, value, test_data)
 
-        return True
+    def check_contact_lenses_field(self, field: str, value, test_data: dict = None):
+        return CONTACT_LENSES_TEST_VALIDATOR.validate_field(field, value, test_data)
 
     def validate_customer_exists(self, customer_id):
         # Validate customer exists
-        customer = self.cus_repo.get_customer(customer_id)
-        if not customer:
+        if not self.customer_exists(customer_id):
             print(f"Customer with ID {customer_id} is not found")
             return False
         return True
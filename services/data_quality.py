@@ -0,0 +1,294 @@
+"""
+Data-quality scanner: audits the exams already in the database against the optical rules.
+
+The rules are the ones in services/validation.py (the same tables the forms validate with), translated to SQL:
+every field rule / dependency rule becomes a CASE expression, and a table's rules run as ONE
+`INSERT INTO dq_violations ... SELECT` (scan_sql) that reads the table once - no rows are loaded into Python.
+
+Incremental re-scans: triggers (migration 6) record every inserted/updated/deleted exam id in dq_dirty.
+scan() re-checks only those rows, unless the table was never scanned (or full=True).
+
+Run from the project root:  python -m services.data_quality [--full]
+"""
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from db.statements import REGISTRY
+from db.transaction import transaction
+from db.utils import datetime_to_text
+from services.validation import (
+    FieldRule, GLASSES_TEST_RULES, GLASSES_TEST_DEPENDENCIES,
+    CONTACT_LENSES_TEST_RULES, CONTACT_LENSES_TEST_DEPENDENCIES,
+)
+
+# What each violation code means (for reports).
+RULE_MESSAGES = {
+    "required": "is required",
+    "not_numeric": "is not a number",
+    "stored_as_text": "number stored as text",
+    "not_integer": "must be a whole number",
+    "out_of_range": "is out of range",
+    "step": "is not in the allowed steps",
+    "too_long": "exceeds maximum length",
+    "invalid_choice": "is not one of the allowed values",
+    "invalid_acuity": "is not a valid visual acuity",
+    "invalid_date": "is not an ISO date ('YYYY-MM-DDTHH:MM:SS')",
+    "axis_without_cylinder": "axis given without cylinder",
+    "cylinder_without_axis": "cylinder given without axis",
+    "base_without_prism": "base given without prism",
+    "prism_without_base": "prism given without base",
+    "pd_sum_mismatch": "sum_pd is not r_pd + l_pd",
+}
+
+TABLE_RULES = {
+    "glasses_tests": (GLASSES_TEST_RULES, GLASSES_TEST_DEPENDENCIES),
+    "contact_lenses_tests": (CONTACT_LENSES_TEST_RULES, CONTACT_LENSES_TEST_DEPENDENCIES),
+}
+
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T[0-9][0-9]:[0-9][0-9]:[0-9][0-9]"
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Rules -> SQL
+# -----------------------------------------------------------------------------------------------------------------
+
+def _sql_literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def _sql_in(values) -> str:
+    return "(" + ", ".join(_sql_literal(v) for v in sorted(values, key=str)) + ")"
+
+
+def _sql_is_numeric_text(column: str) -> str:
+    return f"(trim({column}) GLOB '[0-9+.-]*' AND NOT trim({column}) GLOB '*[^0-9.eE+-]*')"
+
+
+def _number_checks(rule: FieldRule, number: str) -> List[Tuple[str, str]]:
+    checks = []
+    if rule.kind == "integer":
+        checks.append((f"{number} != CAST({number} AS INTEGER)", "'not_integer'"))
+    if rule.min is not None:
+        checks.append((f"{number} < {rule.min!r}", "'out_of_range'"))
+    if rule.max is not None:
+        checks.append((f"{number} > {rule.max!r}", "'out_of_range'"))
+    if rule.step is not None:
+        checks.append((f"abs({number} / {rule.step!r} - round({number} / {rule.step!r})) > 1e-6", "'step'"))
+    return checks
+
+
+def _case(whens: List[Tuple[str, str]]) -> str:
+    if not whens:
+        return "NULL"
+    return "CASE " + " ".join(f"WHEN {condition} THEN {code}" for condition, code in whens) + " END"
+
+
+def field_rule_sql(rule: FieldRule, text_column: bool = False) -> str:
+    """
+    A CASE expression over the rule's column that evaluates to a violation code (see RULE_MESSAGES) or NULL.
+    `text_column`: the column has TEXT affinity (r_sphere, which also holds "Plano"), so a number in it is always
+    stored as text - that is not reported.
+    """
+    column = rule.field
+    whens: List[Tuple[str, str]] = []
+
+    text_allowed = {a.upper() for a in rule.allow if isinstance(a, str)}
+    number_allowed = {a for a in rule.allow if not isinstance(a, str)}
+
+    missing = "'required'" if rule.required else "NULL"
+    whens.append((f"{column} IS NULL", missing))
+    if rule.kind in ("number", "integer"):
+        # Stored numbers take a fast path straight to the value checks; only text goes through trim/GLOB/CAST.
+        fast = [(f"{column} IN {_sql_in(number_allowed)}", "NULL")] if number_allowed else []
+        whens.append((f"typeof({column}) IN ('integer', 'real')", _case(fast + _number_checks(rule, column))))
+    whens.append((f"trim({column}) = ''", missing))
+    if text_allowed:
+        whens.append((f"upper(trim({column})) IN {_sql_in(text_allowed)}", "NULL"))
+
+    if rule.kind in ("number", "integer"):
+        whens.append((f"NOT {_sql_is_numeric_text(column)}", "'not_numeric'"))
+        whens += _number_checks(rule, f"CAST({column} AS REAL)")
+        if not text_column:
+            whens.append(("1", "'stored_as_text'"))
+    elif rule.kind == "text":
+        if rule.max_length is not None:
+            whens.append((f"length({column}) > {rule.max_length}", "'too_long'"))
+    elif rule.kind == "choice":
+        whens.append((f"upper(trim({column})) NOT IN {_sql_in({c.upper() for c in rule.choices})}", "'invalid_choice'"))
+    elif rule.kind == "acuity":
+        low = 3 if rule.min is None else rule.min
+        high = 200 if rule.max is None else rule.max
+        denominator = f"CAST(CASE WHEN instr({column}, '/') THEN substr({column}, instr({column}, '/') + 1) ELSE {column} END AS REAL)"
+        whens.append((f"NOT trim({column}) GLOB '[0-9]*' OR {denominator} NOT BETWEEN {low!r} AND {high!r}", "'invalid_acuity'"))
+    elif rule.kind == "date":
+        whens.append((f"typeof({column}) != 'text' OR {column} NOT GLOB '{ISO_DATE_GLOB}'", "'invalid_date'"))
+
+    return _case(whens)
+
+
+def compile_table_rules(field_rules, dependency_rules, text_columns=frozenset()) -> List[Tuple[str, str]]:
+    """(reported field, violation-code SQL expression) for every rule of a table."""
+    compiled = [(rule.field, field_rule_sql(rule, rule.field in text_columns)) for rule in field_rules]
+    compiled += [(rule.field, rule.sql) for rule in dependency_rules if rule.sql]
+    return compiled
+
+
+MASK_BITS = 62  # rules per bitmask column: SQLite integers are signed 64-bit
+
+
+def scan_sql(rules: List[Tuple[str, str]], source: str, scope: str = "") -> str:
+    """
+    The INSERT INTO dq_violations of every rule, in one pass over `source` (parameters: the scope's, then the table
+    name). The pass only records which rules each row breaks, as bitmasks; `broken` walks the set bits (one step per
+    violation, not per rule), and the code of each broken rule is evaluated again on the row, re-read by id.
+    """
+    groups = [rules[start:start + MASK_BITS] for start in range(0, len(rules), MASK_BITS)]
+    masks = ", ".join(
+        " | ".join(f"((({expression}) IS NOT NULL) << {bit})" for bit, (_, expression) in enumerate(group))
+        + f" AS dq_mask{g}" for g, group in enumerate(groups)
+    )
+    seeds = " UNION ALL ".join(
+        f"SELECT dq_id, {g}, dq_mask{g} & (dq_mask{g} - 1), dq_mask{g} & -dq_mask{g} FROM flagged WHERE dq_mask{g} != 0"
+        for g in range(len(groups))
+    )
+    numbered = ", ".join(f"({i // MASK_BITS}, {1 << i % MASK_BITS}, {i}, {_sql_literal(field)})"
+                         for i, (field, _) in enumerate(rules))
+    return f"""
+        INSERT INTO dq_violations (table_name, row_id, customer_id, field, rule, value)
+        WITH RECURSIVE
+            flagged AS MATERIALIZED (SELECT id AS dq_id, {masks} FROM {source} {scope}),
+            broken (dq_id, dq_group, dq_rest, dq_bit) AS (
+                {seeds}
+                UNION ALL
+                SELECT dq_id, dq_group, dq_rest & (dq_rest - 1), dq_rest & -dq_rest FROM broken WHERE dq_rest != 0
+            ),
+            rules (dq_group, dq_bit, dq_rule, dq_field) AS (VALUES {numbered})
+        SELECT ?, t.id, t.customer_id, dq_field, {_case_of("dq_rule", [expression for _, expression in rules])},
+               {_case_of("dq_rule", [f"t.{field}" for field, _ in rules])}
+        FROM broken JOIN rules USING (dq_group, dq_bit) JOIN {source} AS t ON t.id = broken.dq_id
+    """
+
+
+def _case_of(number: str, expressions: List[str]) -> str:
+    """CASE over 0..n-1: the expression at position `number`."""
+    return f"CASE {number} " + " ".join(f"WHEN {i} THEN {e}" for i, e in enumerate(expressions)) + " END"
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Scanner
+# -----------------------------------------------------------------------------------------------------------------
+
+class DataQualityScanner:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rules = {table: compile_table_rules(*rules, self.text_columns(REGISTRY[table].source))
+                      for table, rules in TABLE_RULES.items()}
+
+    def text_columns(self, source: str) -> frozenset:
+        """The columns of `source` with TEXT affinity (declared type containing CHAR, CLOB or TEXT)."""
+        return frozenset(row[1] for row in self.conn.execute(f"PRAGMA table_info({source})")
+                         if any(name in row[2].upper() for name in ("CHAR", "CLOB", "TEXT")))
+
+    def scan(self, full: bool = False) -> Dict[str, dict]:
+        """Scans every exam table; returns {table: {"full": bool, "rows_checked": int, "violations": int}}."""
+        return {table: self.scan_table(table, full=full) for table in self.rules}
+
+    def scan_table(self, table: str, full: bool = False) -> dict:
+        if table not in self.rules:
+            raise ValueError(f"Unknown table {table!r}")
+
+        with transaction(self.conn):
+            full = full or self.last_scan(table) is None
+            if full:
+                rows_checked = self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                self.conn.execute("DELETE FROM dq_violations WHERE table_name = ?", (table,))
+                scope, scope_params = "", ()
+            else:
+                rows_checked = self.conn.execute(
+                    "SELECT count(*) FROM dq_dirty WHERE table_name = ?", (table,)
+                ).fetchone()[0]
+                self.conn.execute(
+                    "DELETE FROM dq_violations WHERE table_name = ? "
+                    "AND row_id IN (SELECT row_id FROM dq_dirty WHERE table_name = ?)", (table, table)
+                )
+                scope, scope_params = "WHERE id IN (SELECT row_id FROM dq_dirty WHERE table_name = ?)", (table,)
+
+            violations = 0
+            source = REGISTRY[table].source  # glasses_tests_full: rules on cold columns join glasses_tests_cold
+            if rows_checked:
+                sql = scan_sql(self.rules[table], source, scope)
+                violations = self.conn.execute(sql, (*scope_params, table)).rowcount
+
+            self.conn.execute("DELETE FROM dq_dirty WHERE table_name = ?", (table,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO dq_scans (table_name, scanned_at, full_scan, rows_checked) VALUES (?, ?, ?, ?)",
+                (table, datetime_to_text(datetime.now()), int(full), rows_checked),
+            )
+        return {"full": full, "rows_checked": rows_checked, "violations": violations}
+
+    def last_scan(self, table: str):
+        row = self.conn.execute("SELECT scanned_at FROM dq_scans WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    # -----------------------------------------
+    # Reports
+    # -----------------------------------------
+
+    def summary_by_rule(self) -> List[dict]:
+        """Violation counts per (table, field, rule), most frequent first."""
+        rows = self.conn.execute("""
+            SELECT table_name, field, rule, count(*) AS violations, count(DISTINCT customer_id) AS customers
+            FROM dq_violations
+            GROUP BY table_name, field, rule
+            ORDER BY violations DESC, table_name, field, rule
+        """).fetchall()
+        return [dict(zip(("table_name", "field", "rule", "violations", "customers"), row)) for row in rows]
+
+    def summary_by_customer(self, limit: int = 100) -> List[dict]:
+        """Customers with the most violations, with the distinct rules they break."""
+        rows = self.conn.execute("""
+            SELECT customer_id, count(*) AS violations, group_concat(DISTINCT rule) AS rules
+            FROM dq_violations
+            GROUP BY customer_id
+            ORDER BY violations DESC, customer_id
+            LIMIT ?
+        """, (limit,)).fetchall()
+        return [
+            {"customer_id": customer_id, "violations": count, "rules": sorted(rules.split(","))}
+            for customer_id, count, rules in rows
+        ]
+
+    def violations_for_customer(self, customer_id: int) -> List[dict]:
+        rows = self.conn.execute("""
+            SELECT table_name, row_id, field, rule, value FROM dq_violations
+            WHERE customer_id = ?
+            ORDER BY table_name, row_id, field
+        """, (customer_id,)).fetchall()
+        return [dict(zip(("table_name", "row_id", "field", "rule", "value"), row)) for row in rows]
+
+    def format_report(self) -> str:
+        lines = []
+        for entry in self.summary_by_rule():
+            message = RULE_MESSAGES.get(entry["rule"], entry["rule"])
+            lines.append(
+                f"{entry['table_name']:<22} {entry['field']:<28} {message:<40} "
+                f"{entry['violations']:>8} rows {entry['customers']:>6} customers"
+            )
+        return "\n".join(lines) if lines else "No violations."
+
+
+if __name__ == "__main__":
+    from db.connection import create_connection, close_connection
+    from db.migrations import migrate
+
+    connection = create_connection("writer")
+    migrate(connection)
+    scanner = DataQualityScanner(connection)
+    for table_name, result in scanner.scan(full="--full" in sys.argv).items():
+        kind = "full" if result["full"] else "incremental"
+        print(f"[DQ] {table_name}: {kind} scan of {result['rows_checked']} rows, {result['violations']} violations")
+    print(scanner.format_report())
+    close_connection(connection)
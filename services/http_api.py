@@ -0,0 +1,312 @@
+"""
+Read-only HTTP API for the companion app (stdlib only: asyncio streams, no framework).
+
+    GET /customers?limit=&after=                    customers in id order, paginated
+    GET /customers/{id}                              one customer
+    GET /customers/{id}/glasses?limit=&after=        glasses history, newest first, paginated
+    GET /customers/{id}/contact-lenses?limit=&after= contact-lens history, newest first, paginated
+
+Pages look like {"items": [...], "next": token}; pass `next` back as `after` (null = last page).
+
+Every response carries a strong ETag computed from the versions of the rows in it - a row's version is its last
+change_log seq (migration 8) - so a client revalidating with If-None-Match gets a 304 unless one of those rows
+changed (or the page's membership did). Bodies are gzip-compressed for clients that accept it.
+
+The API has its own read-only connection ("reader" profile), owned by one worker thread: the event loop only moves
+bytes, and in WAL mode the reads never block - or wait for - the front-desk writer.
+
+Run from the project root:  python -m services.http_api [--port 8765] [--db PATH]
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from http import HTTPStatus
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from db.bootstrap import DB_PATH
+from db.connection import create_connection, close_connection
+from db.pagination import Page
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.transaction import transaction
+from services.customer_service import CustomerService
+
+API_VERSION = 1  # part of every ETag: bump it when the JSON layout changes
+DEFAULT_PORT = 8765
+GZIP_MIN_SIZE = 256  # smaller bodies are sent as they are
+KEEP_ALIVE_TIMEOUT = 15  # seconds an idle connection is kept open
+MAX_HEADER_SIZE = 16 * 1024
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes = b""
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def error_response(status: HTTPStatus, message: str = None) -> Response:
+    body = json.dumps({"error": message or status.phrase}).encode("utf-8")
+    return Response(status, body, {"Content-Type": "application/json"})
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class ApiHandler:
+    """Turns a request into a Response. Runs on the API's database thread only (it owns the connection)."""
+
+    ROUTES = (
+        (re.compile(r"/customers"), "list_customers"),
+        (re.compile(r"/customers/(\d+)"), "get_customer"),
+        (re.compile(r"/customers/(\d+)/glasses"), "glasses_history"),
+        (re.compile(r"/customers/(\d+)/contact-lenses"), "contact_lenses_history"),
+    )
+
+    def __init__(self, conn):
+        self.conn = conn
+        # Reads run inside a read transaction (below), where the service never fills its customer cache: the API
+        # always reads the database, so writes made through other connections show up on the next request.
+        self.service = CustomerService(CustomerRepo(conn), GlassesRepo(conn), ContactLensesTestRepo(conn))
+
+    def handle(self, method: str, target: str, headers: Dict[str, str]) -> Response:
+        if method not in ("GET", "HEAD"):
+            response = error_response(HTTPStatus.METHOD_NOT_ALLOWED)
+            response.headers["Allow"] = "GET, HEAD"
+            return response
+
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        for pattern, name in self.ROUTES:
+            match = pattern.fullmatch(url.path.rstrip("/") or "/")
+            if match:
+                break
+        else:
+            return error_response(HTTPStatus.NOT_FOUND)
+
+        try:
+            # One read transaction: the payload and its versions (the ETag) come from the same snapshot, so a write
+            # landing in between can't put the new ETag on the old body.
+            with transaction(self.conn, immediate=False):
+                result = getattr(self, name)(*map(int, match.groups()), **self._page_args(query))
+                if result is None:
+                    return error_response(HTTPStatus.NOT_FOUND)
+                payload, table, rows = result
+                versions = self.row_versions(table, rows)
+        except ValueError as e:
+            return error_response(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception:
+            traceback.print_exc()
+            return error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+        return self._representation(payload, table, versions, headers)
+
+    # -----------------------------------------
+    # Endpoints: (payload, versioned table, row ids in the payload)
+    # -----------------------------------------
+
+    def list_customers(self, after=None, limit=50):
+        page = self.service.list_customers_page(after=after, limit=limit)
+        return self._page_payload(page), "customers", [c.id for c in page.items]
+
+    def get_customer(self, customer_id, after=None, limit=None):
+        customer = self.service.get_customer(customer_id)
+        if customer is None:
+            return None
+        return asdict(customer), "customers", [customer.id]
+
+    def glasses_history(self, customer_id, after=None, limit=20):
+        page = self.service.get_glasses_history_page(customer_id, after=after, limit=limit)
+        if page is None:
+            return None
+        return self._page_payload(page), "glasses_tests", [t.id for t in page.items]
+
+    def contact_lenses_history(self, customer_id, after=None, limit=20):
+        page = self.service.get_contact_lenses_history_page(customer_id, after=after, limit=limit)
+        if page is None:
+            return None
+        return self._page_payload(page), "contact_lenses_tests", [t.id for t in page.items]
+
+    # -----------------------------------------
+    # Helpers
+    # -----------------------------------------
+
+    @staticmethod
+    def _page_args(query: Dict[str, str]) -> dict:
+        args = {}
+        if "after" in query:
+            args["after"] = query["after"]
+        if "limit" in query:
+            if not query["limit"].isdigit():
+                raise ValueError("limit must be a positive integer")
+            args["limit"] = int(query["limit"])
+        return args
+
+    @staticmethod
+    def _page_payload(page: Page) -> dict:
+        return {"items": [asdict(item) for item in page.items], "next": page.next_token}
+
+    def row_versions(self, table: str, row_ids) -> list:
+        """[(id, version)] - a row's version is its last change_log seq (0 if it predates the log)."""
+        if not row_ids:
+            return []
+        rows = self.conn.execute(
+            f"SELECT row_id, max(seq) FROM change_log WHERE table_name = ? AND row_id IN "
+            f"({', '.join('?' for _ in row_ids)}) GROUP BY row_id",
+            (table, *row_ids),
+        ).fetchall()
+        versions = dict(map(tuple, rows))
+        return [(row_id, versions.get(row_id, 0)) for row_id in row_ids]
+
+    def _representation(self, payload, table, versions, headers) -> Response:
+        next_token = payload.get("next") if isinstance(payload, dict) else None
+        version_key = json.dumps([API_VERSION, table, versions, next_token])
+        tag = hashlib.sha256(version_key.encode("utf-8")).hexdigest()[:32]
+
+        compress = "gzip" in headers.get("accept-encoding", "").lower()
+        etag = f'"{tag}-gz"' if compress else f'"{tag}"'  # strong ETags differ per content encoding
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if _etag_matches(headers.get("if-none-match"), etag):
+            return Response(HTTPStatus.NOT_MODIFIED, headers=response_headers)
+
+        body = json.dumps(payload, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        response_headers["Content-Type"] = "application/json; charset=utf-8"
+        if compress and len(body) >= GZIP_MIN_SIZE:
+            body = gzip.compress(body, compresslevel=6)
+            response_headers["Content-Encoding"] = "gzip"
+        return Response(HTTPStatus.OK, body, response_headers)
+
+
+class ApiServer:
+    """The asyncio HTTP/1.1 front end. `port=0` picks a free port (see `port` after start())."""
+
+    def __init__(self, db_path: str = DB_PATH, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        self.db_path = db_path
+        self.host = host
+        self.port = port
+        self._server = None
+        self._db = None
+        self._handler = None
+
+    async def start(self):
+        # One thread owns the read-only connection (sqlite3 connections stay on the thread that opened them).
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-db")
+        await asyncio.get_running_loop().run_in_executor(self._db, self._open)
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port, limit=MAX_HEADER_SIZE)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._db is not None:
+            await asyncio.get_running_loop().run_in_executor(self._db, self._close)
+            self._db.shutdown()
+
+    def _open(self):
+        self._handler = ApiHandler(create_connection("reader", path=self.db_path))
+
+    def _close(self):
+        close_connection(self._handler.conn)
+
+    async def _serve_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, error_response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE), False, False)
+                    return
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                    headers = {}
+                    for line in filter(None, lines[1:]):
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                except ValueError:
+                    await self._send(writer, error_response(HTTPStatus.BAD_REQUEST), False, False)
+                    return
+                if headers.get("content-length", "0") != "0" or "transfer-encoding" in headers:
+                    await self._send(writer, error_response(HTTPStatus.BAD_REQUEST, "Requests have no body"),
+                                     False, False)
+                    return
+
+                response = await loop.run_in_executor(self._db, self._handler.handle, method, target, headers)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._send(writer, response, keep_alive, method == "HEAD")
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _send(writer, response: Response, keep_alive: bool, head_only: bool):
+        status = HTTPStatus(response.status)
+        headers = dict(response.headers)
+        if status != HTTPStatus.NOT_MODIFIED:
+            headers["Content-Length"] = str(len(response.body))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1"))
+        if not head_only and status != HTTPStatus.NOT_MODIFIED:
+            writer.write(response.body)
+        await writer.drain()
+
+
+async def serve(db_path: str = DB_PATH, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+    server = ApiServer(db_path, host, port)
+    await server.start()
+    print(f"Serving the read-only API on http://{server.host}:{server.port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the read-only API for the companion app.")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.db, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Legacy data import: CSV dumps of the old optics software -> customers / glasses_tests / contact_lenses_tests.
+
+    reader (main process)  streams the source file in blocks of rows
+    process pool           parses and validates every block with the service-layer rules (services/validation.py)
+    writer thread          the only database connection: resolves ssn -> customers.id, bulk-inserts each block and
+                           advances the checkpoint in the same transaction (so a resumed import never duplicates rows)
+
+Columns are matched to model fields by name (case-insensitive); `field_map` renames legacy headers.
+Exam files identify the customer by an `ssn` column. Rejected rows go to a CSV report next to the source file.
+
+Run from the project root:
+    python -m services.importer customers legacy/customers.csv
+    python -m services.importer glasses legacy/glasses.csv --workers 8 --map "תז=ssn"
+"""
+import argparse
+import csv
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db.bootstrap import DB_PATH
+from db.connection import create_connection, close_connection
+from db.mappers import model_columns
+from db.migrations import migrate
+from db.models import Customer, GlassesTest, ContactLensesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.transaction import transaction
+from db.utils import chunked, datetime_to_text, str_to_date
+from services.validation import (
+    CUSTOMER_RULES, CUSTOMER_VALIDATOR, GLASSES_TEST_RULES, GLASSES_TEST_VALIDATOR,
+    CONTACT_LENSES_TEST_RULES, CONTACT_LENSES_TEST_VALIDATOR,
+)
+
+DEFAULT_BLOCK_SIZE = 1000
+SSN_LOOKUP_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class ImportKind:
+    name: str
+    model: type
+    validator: object
+    rules: list
+    is_exam: bool
+
+
+IMPORT_KINDS = {
+    "customers": ImportKind("customers", Customer, CUSTOMER_VALIDATOR, CUSTOMER_RULES, is_exam=False),
+    "glasses": ImportKind("glasses", GlassesTest, GLASSES_TEST_VALIDATOR, GLASSES_TEST_RULES, is_exam=True),
+    "contact_lenses": ImportKind("contact_lenses", ContactLensesTest, CONTACT_LENSES_TEST_VALIDATOR,
+                                 CONTACT_LENSES_TEST_RULES, is_exam=True),
+}
+
+
+@dataclass
+class ParsedBlock:
+    last_row: int
+    records: List[Tuple[int, dict, dict]] = field(default_factory=list)    # (row number, model fields + ssn, raw row)
+    rejects: List[Tuple[int, str, dict]] = field(default_factory=list)     # (row number, reason, raw row)
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    source: str
+    imported: int = 0
+    rejected: int = 0
+    resumed_from: int = 0
+    last_row: int = 0
+    interrupted: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.last_row - self.resumed_from) / self.elapsed if self.elapsed else 0.0
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                   Parsing + validation (runs in the worker processes)
+# -----------------------------------------------------------------------------------------------------------------
+
+def _coerce(rule, value):
+    """Typed value for the model, from the (already validated) text of a CSV cell."""
+    if value is None or value.upper() in {a.upper() for a in rule.allow if isinstance(a, str)}:
+        return value
+    if rule.kind == "number":
+        return float(value)
+    if rule.kind == "integer":
+        return int(float(value))
+    if rule.kind == "date":
+        return str_to_date(value)
+    return value
+
+
+def parse_record(kind: ImportKind, raw: dict, field_map: Dict[str, str]):
+    """Returns (record, None) for a valid row or (None, reason) for a rejected one."""
+    names = {f.name.lower(): f.name for f in fields(kind.model) if f.name not in ("id", "customer_id")}
+    names["ssn"] = "ssn"
+
+    record = {}
+    for header, value in raw.items():
+        if header is None:
+            continue  # extra cells beyond the header row
+        name = field_map.get(header) or names.get(header.strip().lower())
+        if name is None:
+            continue
+        value = value.strip() if isinstance(value, str) else value
+        record[name] = value if value not in ("", None) else None
+
+    violations = kind.validator.validate(record)
+    if kind.is_exam:
+        violations += CUSTOMER_VALIDATOR.validate_field("ssn", record.get("ssn"))
+    if violations:
+        return None, "; ".join(str(v) for v in violations)
+
+    for rule in kind.rules:
+        if rule.field in record:
+            record[rule.field] = _coerce(rule, record[rule.field])
+    record["ssn"] = int(record["ssn"])
+    return record, None
+
+
+def parse_block(kind_name: str, field_map: Dict[str, str], rows: List[Tuple[int, dict]]) -> ParsedBlock:
+    kind = IMPORT_KINDS[kind_name]
+    block = ParsedBlock(last_row=rows[-1][0])
+    for row_number, raw in rows:
+        try:
+            record, reason = parse_record(kind, raw, field_map)
+        except (ValueError, TypeError, ArithmeticError) as e:  # ArithmeticError: e.g. a 1e400 cell overflowing
+            record, reason = None, f"unreadable row: {e}"
+        if record is None:
+            block.rejects.append((row_number, reason, raw))
+        else:
+            block.records.append((row_number, record, raw))
+    return block
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Writer thread
+# -----------------------------------------------------------------------------------------------------------------
+
+class ImportWriter(threading.Thread):
+    """Owns the database connection; writes one ParsedBlock per transaction, checkpoint included."""
+
+    def __init__(self, kind: ImportKind, source: str, db_path: str, rejects_path: str, columns: List[str],
+                 append_rejects: bool, max_pending: int = 4):
+        super().__init__(name="import-writer", daemon=True)
+        self.kind = kind
+        self.source = source
+        self.db_path = db_path
+        self.rejects_path = rejects_path
+        self.columns = columns
+        self.append_rejects = append_rejects
+        self.blocks = queue.Queue(maxsize=max_pending)
+        self.error: Optional[BaseException] = None
+        self.imported = 0
+        self.rejected = 0
+        self.last_row = 0
+        self._customer_ids: Dict[int, int] = {}
+
+    def run(self):
+        conn = create_connection("writer", path=self.db_path)
+        mode = "a" if self.append_rejects and os.path.exists(self.rejects_path) else "w"
+        try:
+            with open(self.rejects_path, mode, newline="", encoding="utf-8") as report:
+                rejects = csv.writer(report)
+                if mode == "w":
+                    rejects.writerow(["row", "reason", *self.columns])
+                while True:
+                    block = self.blocks.get()
+                    if block is None:
+                        return
+                    self._write_block(conn, block, rejects)
+                    report.flush()
+        except BaseException as e:
+            self.error = e
+            while self.blocks.get() is not None:  # drain so the reader never blocks on a full queue
+                pass
+        finally:
+            close_connection(conn)
+
+    def _write_block(self, conn, block: ParsedBlock, rejects):
+        records, rejected = block.records, list(block.rejects)
+        with transaction(conn):
+            if self.kind.is_exam:
+                records, unknown = self._attach_customers(conn, records)
+            else:
+                records, unknown = self._skip_existing_customers(conn, records)
+            rejected += unknown
+
+            models = [self._to_model(record) for _, record, _ in records]
+            if self.kind.name == "customers":
+                CustomerRepo(conn).add_customers_bulk(models, chunk_size=max(len(models), 1))
+            elif self.kind.name == "glasses":
+                GlassesRepo(conn).add_tests_bulk(models, chunk_size=max(len(models), 1))
+            else:
+                ContactLensesTestRepo(conn).add_tests_bulk(models, chunk_size=max(len(models), 1))
+
+            conn.execute("""
+                INSERT INTO import_checkpoints (source, kind, last_row, imported, rejected, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source, kind) DO UPDATE SET
+                    last_row = excluded.last_row,
+                    imported = imported + excluded.imported,
+                    rejected = rejected + excluded.rejected,
+                    updated_at = excluded.updated_at
+            """, (self.source, self.kind.name, block.last_row, len(models), len(rejected),
+                  datetime_to_text(datetime.now())))
+
+        for row_number, reason, raw in sorted(rejected, key=lambda r: r[0]):
+            rejects.writerow([row_number, reason, *(raw.get(c, "") for c in self.columns)])
+        self.imported += len(models)
+        self.rejected += len(rejected)
+        self.last_row = block.last_row
+
+    def _to_model(self, record: dict):
+        values = dict.fromkeys(model_columns(self.kind.model))  # columns missing from the dump stay NULL
+        values.update((k, v) for k, v in record.items() if k in values)
+        return self.kind.model(**values)
+
+    def _attach_customers(self, conn, records):
+        """Sets customer_id from the ssn; rows whose ssn has no customer are rejected."""
+        missing = {record["ssn"] for _, record, _ in records} - self._customer_ids.keys()
+        for ssns in chunked(missing, SSN_LOOKUP_CHUNK):
+            placeholders = ", ".join("?" for _ in ssns)
+            self._customer_ids.update(conn.execute(
+                f"SELECT ssn, id FROM customers WHERE ssn IN ({placeholders})", ssns
+            ).fetchall())
+
+        attached, rejected = [], []
+        for row_number, record, raw in records:
+            customer_id = self._customer_ids.get(record["ssn"])
+            if customer_id is None:
+                rejected.append((row_number, f"ssn: no customer with ssn {record['ssn']}", raw))
+            else:
+                attached.append((row_number, {**record, "customer_id": customer_id}, raw))
+        return attached, rejected
+
+    def _skip_existing_customers(self, conn, records):
+        """Customers whose ssn already exists (in the database or earlier in the file) are rejected."""
+        ssns = [record["ssn"] for _, record, _ in records]
+        existing = set()
+        for chunk in chunked(ssns, SSN_LOOKUP_CHUNK):
+            placeholders = ", ".join("?" for _ in chunk)
+            existing.update(row[0] for row in conn.execute(
+                f"SELECT ssn FROM customers WHERE ssn IN ({placeholders})", chunk
+            ))
+
+        fresh, rejected = [], []
+        for row_number, record, raw in records:
+            if record["ssn"] in existing:
+                rejected.append((row_number, f"ssn: customer with ssn {record['ssn']} already exists", raw))
+            else:
+                existing.add(record["ssn"])
+                fresh.append((row_number, record, raw))
+        return fresh, rejected
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Pipeline
+# -----------------------------------------------------------------------------------------------------------------
+
+def get_checkpoint(conn, source: str, kind: str) -> int:
+    row = conn.execute(
+        "SELECT last_row FROM import_checkpoints WHERE source = ? AND kind = ?", (source, kind)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _read_blocks(reader: Iterable[dict], start_after: int, block_size: int):
+    numbered = ((number, row) for number, row in enumerate(reader, start=1) if number > start_after)
+    return chunked(numbered, block_size)
+
+
+def run_import(kind: str, path: str, db_path: str = DB_PATH, workers: Optional[int] = None,
+               block_size: int = DEFAULT_BLOCK_SIZE, rejects_path: Optional[str] = None,
+               field_map: Optional[Dict[str, str]] = None, encoding: str = "utf-8-sig",
+               resume: bool = True) -> ImportResult:
+    """
+    Imports a legacy CSV file. workers=0 parses in-process; None uses one process per core.
+    With resume=True (the default) a previously interrupted import of the same file continues after its checkpoint.
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind {kind!r} (expected one of {', '.join(IMPORT_KINDS)})")
+    if block_size <= 0:
+        raise ValueError("block_size must be a positive integer")
+
+    source = os.path.abspath(path)
+    rejects_path = rejects_path or f"{os.path.splitext(path)[0]}.rejects.csv"
+    field_map = dict(field_map or {})
+    workers = os.cpu_count() if workers is None else workers
+
+    conn = create_connection("writer", path=db_path)
+    migrate(conn)
+    start_after = get_checkpoint(conn, source, kind) if resume else 0
+    close_connection(conn)
+
+    result = ImportResult(kind=kind, source=source, resumed_from=start_after, last_row=start_after)
+    started = time.perf_counter()
+
+    with open(path, newline="", encoding=encoding) as f:
+        reader = csv.DictReader(f)
+        columns = list(reader.fieldnames or [])
+        writer = ImportWriter(IMPORT_KINDS[kind], source, db_path, rejects_path, columns,
+                              append_rejects=start_after > 0)
+        writer.start()
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        try:
+            blocks = _read_blocks(reader, start_after, block_size)
+            if pool is None:
+                parsed = (parse_block(kind, field_map, rows) for rows in blocks)
+            else:
+                parsed = _parse_in_pool(pool, kind, field_map, blocks, max_in_flight=workers * 2)
+            for block in parsed:
+                if writer.error is not None:
+                    break
+                writer.blocks.put(block)
+        except KeyboardInterrupt:
+            result.interrupted = True
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            writer.blocks.put(None)
+            writer.join()
+
+    if writer.error is not None:
+        raise writer.error
+
+    result.imported, result.rejected = writer.imported, writer.rejected
+    result.last_row = max(writer.last_row, start_after)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _parse_in_pool(pool, kind, field_map, blocks, max_in_flight):
+    """Parses blocks in the pool, yielding them in file order with at most `max_in_flight` blocks pending."""
+    pending = deque()
+    for rows in blocks:
+        pending.append(pool.submit(parse_block, kind, field_map, rows))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a legacy CSV dump.")
+    parser.add_argument("kind", choices=sorted(IMPORT_KINDS))
+    parser.add_argument("path")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: one per core)")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--rejects", default=None, help="rejected-rows report (default: <file>.rejects.csv)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="e.g. cp1255 for old Hebrew Windows dumps")
+    parser.add_argument("--map", action="append", default=[], metavar="LEGACY=FIELD", help="rename a legacy column")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    args = parser.parse_args(argv)
+
+    field_map = dict(item.split("=", 1) for item in args.map)
+    result = run_import(args.kind, args.path, db_path=args.db, workers=args.workers, block_size=args.block_size,
+                        rejects_path=args.rejects, field_map=field_map, encoding=args.encoding,
+                        resume=not args.restart)
+
+    if result.interrupted:
+        print(f"[IMPORT] Interrupted after row {result.last_row} - run the same command again to resume.")
+    if result.resumed_from:
+        print(f"[IMPORT] Resumed after row {result.resumed_from}.")
+    print(f"[IMPORT] {result.kind}: {result.imported} imported, {result.rejected} rejected "
+          f"({result.rows_per_second:.0f} rows/s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+"""
+Sync packs: the files the companion app downloads.
+
+A snapshot pack holds every row of the synced tables as of one change-log seq; a delta pack holds what changed between
+two seqs (current rows + tombstones, from ChangeLog.changes_since). The app loads the newest snapshot once, then
+applies the deltas after it in seq order.
+
+Layout - the whole file is one gzip stream, written and read incrementally (memory holds one block of rows):
+
+    b"OSPK" version:u8 frame*
+    frame = type:u8 length:u32 payload
+
+    HEADER   JSON {"kind": "snapshot" | "delta", "from_seq", "to_seq", "created_at"}
+    BLOCK    meta_length:u32 meta, then length:u32 + data per column
+             meta = JSON {"table", "rows", "columns": [[name, encoding], ...]}
+    DELETES  JSON {"table", "ids"}
+    END      JSON {"rows", "deletes"} - a pack without it is truncated
+
+Blocks are column-oriented; every column of a block is encoded by what it actually holds:
+
+    null   every value is NULL - no data
+    int    null mask, then int64 deltas from the previous value (ids, dates-as-days, counters -> small numbers)
+    real   null mask, then float64 values
+    text   null mask, then uint32 lengths and the UTF-8 bytes
+    dict   null mask, then the dictionary entries new in this block (count:u32, lengths, bytes) and uint32 indexes.
+           A column's dictionary grows across the whole pack, so a town or a lens brand is spelled out once per pack.
+    json   a JSON list - columns mixing types (e.g. a sphere typed as "plano" next to numbers)
+
+The null mask is a flag byte (0 = no NULLs), followed by one byte per row when set. Numbers are little-endian.
+
+Run from the project root:
+    python -m services.sync_pack snapshot OUT.pack
+    python -m services.sync_pack delta --since SEQ OUT.pack
+    python -m services.sync_pack info PACK [PACK ...]
+"""
+import argparse
+import gzip
+import json
+import os
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from db.bootstrap import DB_PATH
+from db.bulk import insert_sql
+from db.catalog import Catalog
+from db.dirty import update_sql
+from db.migrations import CHANGE_LOG_TABLES
+from db.statements import REGISTRY, split_columns
+from db.transaction import transaction
+from db.utils import chunked, datetime_to_text, iter_rows
+from services.change_log import ChangeLog, UPSERT
+
+MAGIC = b"OSPK"
+VERSION = 1
+
+SYNC_TABLES = CHANGE_LOG_TABLES  # parents first: a snapshot applies in this order
+
+PACK_BLOCK_SIZE = 2000
+MAX_DICTIONARY_SIZE = 1 << 16
+
+FRAME_HEADER, FRAME_BLOCK, FRAME_DELETES, FRAME_END = 1, 2, 3, 4
+
+_FRAME = struct.Struct("<BI")
+_LENGTH = struct.Struct("<I")
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Column encodings
+# -----------------------------------------------------------------------------------------------------------------
+
+def _pack_array(typecode: str, values) -> bytes:
+    values = array(typecode, values)
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _pack_strings(strings: Sequence[str]) -> bytes:
+    encoded = [s.encode("utf-8") for s in strings]
+    return _pack_array("I", map(len, encoded)) + b"".join(encoded)
+
+
+def _unpack_strings(data: bytes, count: int, offset: int = 0) -> Tuple[List[str], int]:
+    lengths = _unpack_array("I", data[offset:offset + 4 * count])
+    offset += 4 * count
+    strings = []
+    for length in lengths:
+        strings.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    return strings, offset
+
+
+def _fits_int64(values: Sequence[int]) -> bool:
+    low, high = min(values), max(values)
+    return _INT64_MIN <= low and high <= _INT64_MAX and high - low <= _INT64_MAX
+
+
+def choose_encoding(values: Sequence, dictionary: Optional[dict]) -> str:
+    """The encoding of one column of one block. `dictionary` is the column's dictionary so far (None if none yet)."""
+    present = [v for v in values if v is not None]
+    if not present:
+        return "null"
+    kinds = set(map(type, present))
+    if kinds == {int}:
+        return "int" if _fits_int64(present) else "json"
+    if kinds == {float}:
+        return "real"
+    if kinds == {str}:
+        distinct = set(present)
+        known = dictionary or {}
+        if len(known) + len(distinct - known.keys()) > MAX_DICTIONARY_SIZE:
+            return "text"
+        if dictionary is not None or 2 * len(distinct) <= len(present):
+            return "dict"
+        return "text"
+    return "json"
+
+
+def encode_column(encoding: str, values: Sequence, dictionary: Optional[dict]) -> bytes:
+    """`dictionary` (value -> index) is extended in place by the "dict" encoding."""
+    if encoding == "null":
+        return b""
+    if encoding == "json":
+        return json.dumps(list(values), ensure_ascii=False).encode("utf-8")
+
+    present = [v for v in values if v is not None]
+    mask = b"\x00" if len(present) == len(values) else b"\x01" + bytes(v is None for v in values)
+
+    if encoding == "int":
+        return mask + _pack_array("q", (b - a for a, b in zip([0] + present, present)))
+    if encoding == "real":
+        return mask + _pack_array("d", present)
+    if encoding == "text":
+        return mask + _pack_strings(present)
+    if encoding == "dict":
+        new_entries = []
+        for value in present:
+            if value not in dictionary:
+                dictionary[value] = len(dictionary)
+                new_entries.append(value)
+        return (mask + _LENGTH.pack(len(new_entries)) + _pack_strings(new_entries)
+                + _pack_array("I", (dictionary[value] for value in present)))
+    raise ValueError(f"Unknown column encoding {encoding!r}")
+
+
+def decode_column(encoding: str, data: bytes, rows: int, dictionary: Optional[list]) -> list:
+    """Inverse of encode_column(); `dictionary` (index -> value) is extended in place by the "dict" encoding."""
+    if encoding == "null":
+        return [None] * rows
+    if encoding == "json":
+        return json.loads(data.decode("utf-8"))
+
+    if data[0]:
+        mask, offset = data[1:1 + rows], 1 + rows
+        count = rows - sum(mask)
+    else:
+        mask, offset, count = None, 1, rows
+
+    if encoding == "int":
+        present = list(accumulate(_unpack_array("q", data[offset:])))
+    elif encoding == "real":
+        present = _unpack_array("d", data[offset:]).tolist()
+    elif encoding == "text":
+        present, _ = _unpack_strings(data, count, offset)
+    elif encoding == "dict":
+        new_count = _LENGTH.unpack_from(data, offset)[0]
+        new_entries, offset = _unpack_strings(data, new_count, offset + _LENGTH.size)
+        dictionary.extend(new_entries)
+        present = [dictionary[i] for i in _unpack_array("I", data[offset:])]
+    else:
+        raise ValueError(f"Unknown column encoding {encoding!r}")
+
+    if mask is None:
+        return present
+    values = iter(present)
+    return [None if is_null else next(values) for is_null in mask]
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Writer / reader
+# -----------------------------------------------------------------------------------------------------------------
+
+class PackWriter:
+    """Writes one pack; use as a context manager. A pack whose writing fails is deleted, never left half-written."""
+
+    def __init__(self, path: str, kind: str, from_seq: int, to_seq: int,
+                 block_size: int = PACK_BLOCK_SIZE, compresslevel: int = 6):
+        if block_size <= 0:
+            raise ValueError("block_size must be a positive integer")
+        self.path = path
+        self.block_size = block_size
+        self.rows = 0
+        self.deletes = 0
+        self._dictionaries: Dict[Tuple[str, str], dict] = {}
+        self._file = gzip.open(path, "wb", compresslevel=compresslevel)
+        self._file.write(MAGIC + bytes([VERSION]))
+        self._write_json(FRAME_HEADER, {
+            "kind": kind, "from_seq": from_seq, "to_seq": to_seq, "created_at": datetime_to_text(datetime.now()),
+        })
+
+    def write_rows(self, table: str, columns: Sequence[str], rows: Iterable[Sequence]):
+        """Writes `rows` (tuples in `columns` order, any iterable) in blocks of block_size rows."""
+        for block in chunked(rows, self.block_size):
+            self._write_block(table, columns, block)
+
+    def write_deletes(self, table: str, ids: Sequence[int]):
+        if ids:
+            self._write_json(FRAME_DELETES, {"table": table, "ids": list(ids)})
+            self.deletes += len(ids)
+
+    def close(self):
+        self._write_json(FRAME_END, {"rows": self.rows, "deletes": self.deletes})
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self.path)
+
+    def _write_block(self, table, columns, block):
+        meta_columns = []
+        chunks = []
+        for name, values in zip(columns, zip(*block)):
+            dictionary = self._dictionaries.get((table, name))
+            encoding = choose_encoding(values, dictionary)
+            if encoding == "dict" and dictionary is None:
+                dictionary = self._dictionaries[(table, name)] = {}
+            meta_columns.append([name, encoding])
+            chunks.append(encode_column(encoding, values, dictionary))
+
+        meta = json.dumps({"table": table, "rows": len(block), "columns": meta_columns}).encode("utf-8")
+        payload = b"".join([_LENGTH.pack(len(meta)), meta] + [_LENGTH.pack(len(c)) + c for c in chunks])
+        self._write_frame(FRAME_BLOCK, payload)
+        self.rows += len(block)
+
+    def _write_json(self, frame_type, value):
+        self._write_frame(frame_type, json.dumps(value).encode("utf-8"))
+
+    def _write_frame(self, frame_type, payload):
+        self._file.write(_FRAME.pack(frame_type, len(payload)))
+        self._file.write(payload)
+
+
+@dataclass
+class PackSegment:
+    kind: str  # "rows" or "deletes"
+    table: str
+    columns: Tuple[str, ...] = ()
+    rows: list = field(default_factory=list)  # tuples in `columns` order for "rows", ids for "deletes"
+
+
+class PackReader:
+    """Reads a pack frame by frame: `header` right away, then iterate for PackSegments, then `summary` (END)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a sync pack")
+        version = self._file.read(1)
+        if not version or version[0] != VERSION:
+            self._file.close()
+            raise ValueError(f"{path}: unsupported pack version {version[0] if version else None}")
+        frame_type, payload = self._read_frame()
+        if frame_type != FRAME_HEADER:
+            raise ValueError(f"{path}: missing pack header")
+        self.header = json.loads(payload)
+        self.summary = None
+        self._dictionaries: Dict[Tuple[str, str], list] = {}
+
+    def __iter__(self) -> Iterator[PackSegment]:
+        try:
+            while True:
+                frame_type, payload = self._read_frame()
+                if frame_type == FRAME_END:
+                    self.summary = json.loads(payload)
+                    return
+                if frame_type == FRAME_BLOCK:
+                    yield self._decode_block(payload)
+                elif frame_type == FRAME_DELETES:
+                    deletes = json.loads(payload)
+                    yield PackSegment("deletes", deletes["table"], rows=deletes["ids"])
+                # unknown frame types (newer writers) are skipped
+        finally:
+            self._file.close()
+
+    def _decode_block(self, payload) -> PackSegment:
+        meta_length = _LENGTH.unpack_from(payload)[0]
+        offset = _LENGTH.size + meta_length
+        meta = json.loads(payload[_LENGTH.size:offset])
+        table, rows = meta["table"], meta["rows"]
+
+        columns = []
+        for name, encoding in meta["columns"]:
+            length = _LENGTH.unpack_from(payload, offset)[0]
+            offset += _LENGTH.size
+            dictionary = self._dictionaries.setdefault((table, name), []) if encoding == "dict" else None
+            columns.append(decode_column(encoding, payload[offset:offset + length], rows, dictionary))
+            offset += length
+
+        names = tuple(name for name, _ in meta["columns"])
+        return PackSegment("rows", table, names, list(zip(*columns)))
+
+    def _read_frame(self):
+        head = self._file.read(_FRAME.size)
+        if len(head) < _FRAME.size:
+            raise ValueError(f"{self.path} is truncated")
+        frame_type, length = _FRAME.unpack(head)
+        payload = self._file.read(length)
+        if len(payload) < length:
+            raise ValueError(f"{self.path} is truncated")
+        return frame_type, payload
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Export / apply
+# -----------------------------------------------------------------------------------------------------------------
+
+def write_snapshot(conn, path: str, block_size: int = PACK_BLOCK_SIZE) -> dict:
+    """
+    Writes every row of the synced tables to a snapshot pack, streamed block by block from one read snapshot.
+    Returns the pack's header; its to_seq is the change-log cursor the app continues from.
+    """
+    with transaction(conn, immediate=False):
+        to_seq = ChangeLog(conn).latest_seq()
+        with PackWriter(path, "snapshot", 0, to_seq, block_size) as writer:
+            for table in SYNC_TABLES:
+                cursor = conn.execute(f"SELECT * FROM {REGISTRY[table].source} ORDER BY id")
+                columns = [description[0] for description in cursor.description]
+                writer.write_rows(table, columns, iter_rows(cursor, block_size))
+    return {"kind": "snapshot", "from_seq": 0, "to_seq": to_seq, "rows": writer.rows, "deletes": 0}
+
+
+def write_delta(conn, path: str, since_seq: int, block_size: int = PACK_BLOCK_SIZE) -> dict:
+    """Writes the changes after `since_seq` to a delta pack, one change-log page (block_size entries) at a time."""
+    change_log = ChangeLog(conn)
+    with transaction(conn, immediate=False):
+        to_seq = max(change_log.latest_seq(), since_seq)
+        with PackWriter(path, "delta", since_seq, to_seq, block_size) as writer:
+            seq = since_seq
+            while seq < to_seq:
+                page = change_log.changes_since(seq, limit=block_size)
+                # a row appears once per page, so the page's tables can be written in any order; a row without
+                # values (deleted after the page) goes out as a delete
+                for table in SYNC_TABLES:
+                    rows = [c.row for c in page.changes if c.table == table and c.op == UPSERT and c.row is not None]
+                    if rows:
+                        writer.write_rows(table, tuple(rows[0]), (tuple(row.values()) for row in rows))
+                    deletes = [c.row_id for c in page.changes
+                               if c.table == table and (c.op != UPSERT or c.row is None)]
+                    writer.write_deletes(table, deletes)
+                seq = page.last_seq
+    return {"kind": "delta", "from_seq": since_seq, "to_seq": to_seq, "rows": writer.rows, "deletes": writer.deletes}
+
+
+def apply_pack(conn, path: str) -> dict:
+    """
+    Applies a pack to a database with the same schema (the reference for the app's importer, and how the tests check
+    round-trips). A snapshot replaces the tables' contents; a delta upserts its rows and deletes its tombstones.
+    Returns the pack's header.
+    """
+    reader = PackReader(path)
+    catalog = Catalog(conn)
+    with transaction(conn):
+        if reader.header["kind"] == "snapshot":
+            for table in reversed(SYNC_TABLES):
+                conn.execute(f"DELETE FROM {table}")
+        for segment in reader:
+            if segment.kind == "deletes":
+                for ids in chunked(segment.rows, 500):
+                    conn.execute(f"DELETE FROM {segment.table} WHERE id IN ({', '.join('?' for _ in ids)})", ids)
+                continue
+            # A glasses_tests row is written to glasses_tests and glasses_tests_cold (migration 10); packs spell out
+            # catalog names, stored as catalog_values ids (migration 11).
+            parts = [(table, columns, _encoding(catalog.row_encoder(table, columns), pick))
+                     for table, columns, pick in split_columns(segment.table, segment.columns)]
+            if reader.header["kind"] == "snapshot":
+                for table, columns, pick in parts:
+                    conn.executemany(insert_sql(table, columns), map(pick, segment.rows))
+                continue
+            # Not INSERT ... ON CONFLICT DO UPDATE: an upsert's conflict handling overrides the INSERT OR IGNORE
+            # of the dq_dirty triggers, which then fail on rows already marked dirty.
+            statements = []
+            for table, columns, pick in parts:
+                id_position = columns.index("id")
+                update = update_sql(table, columns[:id_position] + columns[id_position + 1:])
+                statements.append((pick, id_position, update, insert_sql(table, columns)))
+            for row in segment.rows:
+                for pick, id_position, update, insert in statements:
+                    values = pick(row)
+                    others = values[:id_position] + values[id_position + 1:]
+                    if conn.execute(update, others + (values[id_position],)).rowcount == 0:
+                        conn.execute(insert, values)
+    return reader.header
+
+
+def _encoding(encode, pick):
+    if encode is None:
+        return pick
+    return lambda row: encode(pick(row))
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               CLI
+# -----------------------------------------------------------------------------------------------------------------
+
+def main(argv=None):
+    from db.connection import create_connection, close_connection
+
+    parser = argparse.ArgumentParser(description="Export sync packs for the companion app.")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="write a snapshot pack")
+    snapshot.add_argument("out")
+    delta = commands.add_parser("delta", help="write a delta pack")
+    delta.add_argument("--since", type=int, required=True, help="the to_seq of the client's last pack")
+    delta.add_argument("out")
+    info = commands.add_parser("info", help="read packs and print their contents")
+    info.add_argument("packs", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        for path in args.packs:
+            reader = PackReader(path)
+            for _ in reader:
+                pass
+            print(f"{path}: {reader.header['kind']} seq {reader.header['from_seq']}..{reader.header['to_seq']}, "
+                  f"{reader.summary['rows']} rows, {reader.summary['deletes']} deletes, {os.path.getsize(path)} bytes")
+        return
+
+    conn = create_connection("reader", path=args.db)
+    try:
+        if args.command == "snapshot":
+            result = write_snapshot(conn, args.out)
+        else:
+            result = write_delta(conn, args.out, args.since)
+    finally:
+        close_connection(conn)
+    print(f"{args.out}: {result['kind']} seq {result['from_seq']}..{result['to_seq']}, "
+          f"{result['rows']} rows, {result['deletes']} deletes, {os.path.getsize(args.out)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""
+Table-driven validation for exam records.
+
+Every rule is declared once, next to the field it belongs to (see GLASSES_TEST_RULES / CONTACT_LENSES_TEST_RULES),
+following glasses_check_constraints.txt. A Validator compiles the rules into one small check function per field
+plus the cross-field dependency checks, so:
+  - validate()        returns ALL violations of a record in one pass (save button),
+  - validate_field()  checks a single field (cheap enough for every keystroke in the TUI),
+  - validate_many()   streams a batch of records (imports).
+"""
+import math
+import re
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from db.models import Customer, GlassesTest, ContactLensesTest
+
+EPSILON = 1e-6
+
+
+@dataclass(frozen=True, slots=True)
+class Violation:
+    field: str
+    message: str
+
+    def __str__(self):
+        return f"{self.field}: {self.message}"
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    """
+    kind: "number", "integer", "text", "digits" (ssn, phone numbers), "choice", "acuity" (6/9, 9, FC...)
+          or "date" (dd/mm/yyyy or a date object).
+    allow: special values accepted as-is before any other check (e.g. "Plano" for a sphere, 0 for "no cylinder").
+    """
+    field: str
+    kind: str = "number"
+    required: bool = False
+    min: Optional[float] = None
+    max: Optional[float] = None
+    step: Optional[float] = None
+    max_length: Optional[int] = None
+    length: Optional[int] = None
+    choices: FrozenSet[str] = frozenset()
+    allow: FrozenSet = frozenset()
+
+
+@dataclass(frozen=True)
+class DependencyRule:
+    """
+    A cross-field rule: `check(record)` returns an error message or None. Reported on `field`.
+    `sql` is the same rule as a SQL expression over the table's columns, evaluating to a violation code or NULL
+    (used by the data-quality scanner, services/data_quality.py).
+    """
+    field: str
+    depends_on: Tuple[str, ...]
+    check: Callable[[dict], Optional[str]]
+    sql: Optional[str] = None
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Field checks
+# -----------------------------------------------------------------------------------------------------------------
+
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float)):
+        return value
+    return float(str(value).strip())
+
+
+def _is_step(value, step) -> bool:
+    quotient = value / step
+    return abs(quotient - round(quotient)) < EPSILON
+
+
+def _empty(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+_ACUITY_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)\s*$")
+
+
+def _compile_range(rule: FieldRule, integer: bool):
+    label = "an integer" if integer else "a number"
+    low, high, step = rule.min, rule.max, rule.step
+
+    def check(value):
+        try:
+            number = _to_number(value)
+        except ValueError:
+            return f"must be {label}"
+        if not isinstance(number, int) and not math.isfinite(number):  # inf, nan, 1e400
+            return f"must be {label}"
+        if integer and number != int(number):
+            return "must be a whole number"
+        if low is not None and number < low - EPSILON:
+            return f"must be at least {low:g}" if high is None else f"must be between {low:g} and {high:g}"
+        if high is not None and number > high + EPSILON:
+            return f"must be at most {high:g}" if low is None else f"must be between {low:g} and {high:g}"
+        if step is not None and not _is_step(number, step):
+            return f"must be in steps of {step:g}"
+        return None
+
+    return check
+
+
+def _compile_text(rule: FieldRule):
+    max_length = rule.max_length
+
+    def check(value):
+        if not isinstance(value, str):
+            return "must be text"
+        if max_length is not None and len(value) > max_length:
+            return f"exceeds maximum length of {max_length} characters"
+        return None
+
+    return check
+
+
+def _compile_digits(rule: FieldRule):
+    length = rule.length
+
+    def check(value):
+        text = str(value).strip()
+        if not text.isdigit():
+            return "must contain digits only"
+        if length is not None and len(text) != length:
+            return f"must be {length} digits long"
+        return None
+
+    return check
+
+
+def _compile_choice(rule: FieldRule):
+    choices = frozenset(c.upper() for c in rule.choices)
+    listed = ", ".join(sorted(rule.choices))
+
+    def check(value):
+        if not isinstance(value, str) or value.strip().upper() not in choices:
+            return f"must be one of {listed}"
+        return None
+
+    return check
+
+
+def _compile_acuity(rule: FieldRule):
+    # "6/9", "6/7.5" or just the denominator ("9"); denominators are 3..200
+    low = 3 if rule.min is None else rule.min
+    high = 200 if rule.max is None else rule.max
+
+    def check(value):
+        text = str(value).strip()
+        match = _ACUITY_RE.match(text)
+        try:
+            denominator = float(match.group(2)) if match else _to_number(text)
+        except ValueError:
+            return "must be a visual acuity such as 6/9"
+        if not (low <= denominator <= high):
+            return f"denominator must be between {low:g} and {high:g}"
+        return None
+
+    return check
+
+
+def _compile_date(rule: FieldRule):
+    def check(value):
+        if isinstance(value, (datetime, date)):
+            return None
+        try:
+            datetime.strptime(str(value).strip(), "%d/%m/%Y")
+        except ValueError:
+            return "must be a date in format DD/MM/YYYY"
+        return None
+
+    return check
+
+
+_COMPILERS = {
+    "number": lambda rule: _compile_range(rule, integer=False),
+    "integer": lambda rule: _compile_range(rule, integer=True),
+    "text": _compile_text,
+    "digits": _compile_digits,
+    "choice": _compile_choice,
+    "acuity": _compile_acuity,
+    "date": _compile_date,
+}
+
+
+def compile_field_rule(rule: FieldRule) -> Callable[[object], Optional[str]]:
+    """Compiles one FieldRule into `check(value) -> error message or None`."""
+    try:
+        check_value = _COMPILERS[rule.kind](rule)
+    except KeyError:
+        raise ValueError(f"Unknown rule kind {rule.kind!r} for field {rule.field!r}") from None
+
+    required = rule.required
+    allowed = frozenset(a.upper() if isinstance(a, str) else a for a in rule.allow)
+
+    def check(value):
+        if _empty(value):
+            return "is required" if required else None
+        if allowed and (value.strip().upper() if isinstance(value, str) else value) in allowed:
+            return None
+        return check_value(value)
+
+    return check
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Validator
+# -----------------------------------------------------------------------------------------------------------------
+
+class Validator:
+    def __init__(self, model, field_rules: Iterable[FieldRule], dependency_rules: Iterable[DependencyRule] = ()):
+        known = {f.name for f in fields(model)}
+        self.model = model
+        self._checks: Dict[str, Callable] = {}
+        self._dependencies: List[DependencyRule] = list(dependency_rules)
+        self._dependencies_by_field: Dict[str, List[DependencyRule]] = {}
+
+        for rule in field_rules:
+            if rule.field not in known:
+                raise ValueError(f"{model.__name__} has no field {rule.field!r}")
+            self._checks[rule.field] = compile_field_rule(rule)
+
+        for dependency in self._dependencies:
+            for name in (dependency.field, *dependency.depends_on):
+                if name not in known:
+                    raise ValueError(f"{model.__name__} has no field {name!r}")
+                self._dependencies_by_field.setdefault(name, []).append(dependency)
+
+        self._field_items = tuple(self._checks.items())
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(self._checks)
+
+    def validate(self, record: dict) -> List[Violation]:
+        """All violations of the record, in rule order. An empty list means the record is valid."""
+        violations = []
+        get = record.get
+        for name, check in self._field_items:
+            error = check(get(name))
+            if error:
+                violations.append(Violation(name, error))
+        for dependency in self._dependencies:
+            error = dependency.check(record)
+            if error:
+                violations.append(Violation(dependency.field, error))
+        return violations
+
+    def validate_field(self, field: str, value, record: Optional[dict] = None) -> List[Violation]:
+        """
+        Checks a single field. With `record` (the rest of the form), the dependency rules involving the field
+        are evaluated too, using `value` for it.
+        """
+        violations = []
+        check = self._checks.get(field)
+        if check is not None:
+            error = check(value)
+            if error:
+                violations.append(Violation(field, error))
+        if record is not None:
+            for dependency in self._dependencies_by_field.get(field, ()):
+                error = dependency.check({**record, field: value})
+                if error:
+                    violations.append(Violation(dependency.field, error))
+        return violations
+
+    def validate_many(self, records: Iterable[dict]) -> Iterator[Tuple[int, List[Violation]]]:
+        """Streams (index, violations) for every invalid record of a batch."""
+        validate = self.validate
+        for index, record in enumerate(records):
+            violations = validate(record)
+            if violations:
+                yield index, violations
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Dependency rules
+# -----------------------------------------------------------------------------------------------------------------
+
+def _number_or_none(value):
+    if _empty(value):
+        return None
+    try:
+        return _to_number(value)
+    except ValueError:
+        return None
+
+
+def _sql_empty(column: str) -> str:
+    return f"({column} IS NULL OR trim({column}) = '')"
+
+
+def cylinder_axis_rule(cyl_field: str, axis_field: str) -> DependencyRule:
+    """IF cyl != 0 THEN axis is required (0-180). IF cyl is 0/empty THEN axis must be empty."""
+    def check(record):
+        cylinder = _number_or_none(record.get(cyl_field))
+        axis = record.get(axis_field)
+        if not cylinder:
+            return None if _empty(axis) else f"must be empty when {cyl_field} is 0 or empty"
+        if _empty(axis):
+            return f"is required when {cyl_field} is not 0"
+        return None
+
+    sql = f"""CASE
+        WHEN coalesce(CAST({cyl_field} AS REAL), 0) = 0 AND NOT {_sql_empty(axis_field)} THEN 'axis_without_cylinder'
+        WHEN coalesce(CAST({cyl_field} AS REAL), 0) != 0 AND {_sql_empty(axis_field)} THEN 'cylinder_without_axis'
+    END"""
+    return DependencyRule(axis_field, (cyl_field,), check, sql)
+
+
+def prism_base_rule(prism_field: str, base_field: str) -> DependencyRule:
+    """IF prism > 0 THEN base is required. IF prism is empty/0 THEN base must be empty."""
+    def check(record):
+        prism = _number_or_none(record.get(prism_field))
+        base = record.get(base_field)
+        if not prism:
+            return None if _empty(base) else f"must be empty when {prism_field} is empty"
+        if _empty(base):
+            return f"is required when {prism_field} is set"
+        return None
+
+    sql = f"""CASE
+        WHEN coalesce(CAST({prism_field} AS REAL), 0) = 0 AND NOT {_sql_empty(base_field)} THEN 'base_without_prism'
+        WHEN coalesce(CAST({prism_field} AS REAL), 0) != 0 AND {_sql_empty(base_field)} THEN 'prism_without_base'
+    END"""
+    return DependencyRule(base_field, (prism_field,), check, sql)
+
+
+def pd_sum_rule() -> DependencyRule:
+    """sum_pd is r_pd + l_pd when both are given (it may also be given alone)."""
+    def check(record):
+        r_pd, l_pd, sum_pd = (_number_or_none(record.get(f)) for f in ("r_pd", "l_pd", "sum_pd"))
+        if r_pd is None or l_pd is None or sum_pd is None:
+            return None
+        if abs(r_pd + l_pd - sum_pd) > 0.01:
+            return "must equal r_pd + l_pd"
+        return None
+
+    sql = "CASE WHEN abs(r_pd + l_pd - sum_pd) > 0.01 THEN 'pd_sum_mismatch' END"  # NULL when any of them is NULL
+    return DependencyRule("sum_pd", ("r_pd", "l_pd"), check, sql)
+
+
+# -----------------------------------------------------------------------------------------------------------------
+#                                               Rule tables
+# -----------------------------------------------------------------------------------------------------------------
+
+def _per_eye(*rules: FieldRule) -> List[FieldRule]:
+    """Declares a rule once for both eyes: FieldRule("sphere") -> r_sphere, l_sphere."""
+    expanded = []
+    for side in ("r", "l"):
+        for rule in rules:
+            expanded.append(FieldRule(**{**rule.__dict__, "field": f"{side}_{rule.field}"}))
+    return expanded
+
+
+GLASSES_TEST_RULES = [
+    FieldRule("exam_date", kind="date", required=True),
+    FieldRule("examiner", kind="text", max_length=50),
+    *_per_eye(
+        FieldRule("fv", kind="acuity", allow=frozenset({"FC"})),
+        FieldRule("sphere", step=0.25, allow=frozenset({"PLANO", "P"})),
+        FieldRule("cylinder", step=0.25),
+        FieldRule("axis", kind="integer", min=0, max=180),
+        FieldRule("prism", min=0, step=0.5),
+        FieldRule("base", kind="choice", choices=frozenset({"BU", "BD", "BI", "BO"})),
+        FieldRule("va", kind="acuity"),
+        FieldRule("add_read", min=0, step=0.25),
+        FieldRule("add_int", min=0, step=0.25),
+        FieldRule("add_bif", min=0, step=0.25),
+        FieldRule("add_mul", min=0, step=0.25),
+        FieldRule("high"),
+        FieldRule("pd", min=0),
+        FieldRule("iop", min=0),
+    ),
+    FieldRule("both_va", kind="acuity"),
+    FieldRule("sum_pd", min=0),
+    FieldRule("near_pd", min=0),
+    FieldRule("dominant_eye", kind="text", max_length=10),
+    FieldRule("glasses_role", kind="text", max_length=50),
+    FieldRule("lenses_material", kind="text", max_length=100),
+    FieldRule("lenses_diameter_1", min=0),
+    FieldRule("lenses_diameter_2", min=0),
+    FieldRule("lenses_diameter_decentration_horizontal"),
+    FieldRule("lenses_diameter_decentration_vertical"),
+    FieldRule("segment_diameter", min=0),
+    FieldRule("lenses_manufacturer", kind="text", max_length=100),
+    FieldRule("lenses_color", kind="text", max_length=50),
+    FieldRule("lenses_coated", kind="text", max_length=50),
+    FieldRule("catalog_num", kind="text", max_length=50),
+    FieldRule("frame_manufacturer", kind="text", max_length=100),
+    FieldRule("frame_supplier", kind="text", max_length=100),
+    FieldRule("frame_model", kind="text", max_length=100),
+    FieldRule("frame_size", kind="text", max_length=20),
+    FieldRule("frame_bar_length", kind="text", max_length=20),
+    FieldRule("frame_color", kind="text", max_length=50),
+    FieldRule("diagnosis", kind="text", max_length=200),
+    FieldRule("notes", kind="text", max_length=500),
+]
+
+GLASSES_TEST_DEPENDENCIES = [
+    cylinder_axis_rule("r_cylinder", "r_axis"),
+    cylinder_axis_rule("l_cylinder", "l_axis"),
+    prism_base_rule("r_prism", "r_base"),
+    prism_base_rule("l_prism", "l_base"),
+    pd_sum_rule(),
+]
+
+KERATOMETRY_RADIUS = dict(min=6.0, max=9.5)  # mm
+
+CONTACT_LENSES_TEST_RULES = [
+    FieldRule("exam_date", kind="date", required=True),
+    FieldRule("examiner", kind="text", max_length=50),
+    *_per_eye(
+        FieldRule("rH", **KERATOMETRY_RADIUS),
+        FieldRule("rV", **KERATOMETRY_RADIUS),
+        FieldRule("aver", **KERATOMETRY_RADIUS),
+        FieldRule("k_cyl"),
+        FieldRule("axH", kind="integer", min=0, max=180),
+        FieldRule("rT", **KERATOMETRY_RADIUS),
+        FieldRule("rN", **KERATOMETRY_RADIUS),
+        FieldRule("rI", **KERATOMETRY_RADIUS),
+        FieldRule("rS", **KERATOMETRY_RADIUS),
+        FieldRule("lens_type", kind="text", max_length=10),
+        FieldRule("manufacturer", kind="text", max_length=100),
+        FieldRule("brand", kind="text", max_length=100),
+        FieldRule("diameter", min=13.0, max=15.0, step=0.1),
+        FieldRule("base_curve_numerator", min=7.5, max=9.5, step=0.05),
+        FieldRule("base_curve_denominator", min=7.5, max=9.5, step=0.05),
+        FieldRule("lens_sph", min=-20.0, max=10.0, step=0.25),
+        FieldRule("lens_cyl", min=-5.75, max=-0.75, step=0.25, allow=frozenset({0})),
+        FieldRule("lens_axis", kind="integer", min=0, max=180, step=5),
+        FieldRule("material", kind="text", max_length=100),
+        FieldRule("tint", kind="text", max_length=30),
+        FieldRule("lens_va_numerator", kind="integer", min=1),
+        FieldRule("lens_va_denominator", kind="integer", min=3, max=200),
+    ),
+    FieldRule("notes", kind="text", max_length=500),
+]
+
+CONTACT_LENSES_TEST_DEPENDENCIES = [
+    cylinder_axis_rule("r_lens_cyl", "r_lens_axis"),
+    cylinder_axis_rule("l_lens_cyl", "l_lens_axis"),
+]
+
+CUSTOMER_RULES = [
+    FieldRule("ssn", kind="digits", required=True, length=9),
+    FieldRule("fname", kind="text", required=True, max_length=50),
+    FieldRule("lname", kind="text", required=True, max_length=50),
+    FieldRule("birth_date", kind="text", max_length=50),
+    FieldRule("sex", kind="text", max_length=20),
+    FieldRule("tel_home", kind="text", max_length=15),
+    FieldRule("tel_mobile", kind="digits", length=10),
+    FieldRule("address", kind="text", max_length=100),
+    FieldRule("town", kind="text", max_length=50),
+    FieldRule("postal_code", kind="text", max_length=20),
+    FieldRule("status", kind="text", max_length=50),
+    FieldRule("org", kind="text", max_length=50),
+    FieldRule("occupation", kind="text", max_length=50),
+    FieldRule("hobbies", kind="text", max_length=50),
+    FieldRule("referer", kind="text", max_length=50),
+    FieldRule("glasses_num", kind="integer", min=0),
+    FieldRule("lenses_num", kind="integer", min=0),
+    FieldRule("mailing", kind="integer"),
+    FieldRule("notes", kind="text", max_length=500),
+]
+
+# Compiled once, at import time
+CUSTOMER_VALIDATOR = Validator(Customer, CUSTOMER_RULES)
+GLASSES_TEST_VALIDATOR = Validator(GlassesTest, GLASSES_TEST_RULES, GLASSES_TEST_DEPENDENCIES)
+CONTACT_LENSES_TEST_VALIDATOR = Validator(ContactLensesTest, CONTACT_LENSES_TEST_RULES, CONTACT_LENSES_TEST_DEPENDENCIES)
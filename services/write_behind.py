@@ -0,0 +1,238 @@
+"""
+Write-behind saves for rapid data entry.
+
+The UI hands saves to a WriteBehindQueue and gets control back immediately; a writer thread (owning its own
+connection and CustomerService) commits them in batches - at most `interval` seconds after the first pending save,
+as soon as `max_batch` saves are pending, or on flush().
+
+Coalescing: saves of the same record (same table and id) replace each other while pending, so an examiner saving a
+glasses test after every field costs one UPDATE per batch, not one per field. A delete replaces the record's pending
+update; a save queued after a pending delete is not merged into it (it runs after the delete, and fails like it would
+have). Adds are never coalesced.
+
+Ordering and durability:
+- Saves are applied in queue order; a coalesced save moves to the place of its newest version, so it never runs
+  before work queued ahead of that version. Each batch is ONE transaction - after a crash the database holds exactly
+  the batches committed before it.
+- Each save runs in its own savepoint: a save that raises, or that the service refuses (returns None/False: failed
+  validation, a missing customer), is rolled back alone and reported to `on_error`; the rest of its batch still
+  commits.
+- flush() returns once everything queued before the call is committed. close() flushes and stops the writer; it is
+  registered with atexit, so saves are flushed when the app exits normally.
+
+The form data is validated when the save is queued (the same rule tables as CustomerService), so a rejected save is
+reported to the UI right away; checks that need the database (e.g. that the customer exists) run in the writer.
+Reads made through another connection see a save once its batch is committed - flush() first when that matters.
+"""
+import atexit
+import copy
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from db.connection import close_connection
+from db.statements import CUSTOMER_STATEMENTS
+from services.async_customer_service import open_customer_service
+from services.customer_service import CustomerService
+from services.validation import (
+    CONTACT_LENSES_TEST_VALIDATOR, CUSTOMER_VALIDATOR, GLASSES_TEST_VALIDATOR, Violation,
+)
+
+WRITE_BEHIND_INTERVAL = 0.2  # seconds a save may wait for others to join its batch
+WRITE_BEHIND_MAX_BATCH = 500
+
+
+@dataclass
+class PendingSave:
+    method: str  # the CustomerService method that applies it
+    args: tuple
+    seq: int  # when it was (last) queued
+
+
+class WriteBehindQueue:
+
+    def __init__(self, service_factory: Callable[[], CustomerService] = open_customer_service,
+                 interval: float = WRITE_BEHIND_INTERVAL, max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 on_error: Callable[[PendingSave, Exception], None] = None, flush_on_exit: bool = True):
+        if interval < 0 or max_batch <= 0:
+            raise ValueError("interval must be >= 0 and max_batch a positive integer")
+        self.interval = interval
+        self.max_batch = max_batch
+        self.on_error = on_error
+        self.errors: List[tuple] = []  # (PendingSave, exception), for saves that failed in the writer
+
+        self.queued = 0  # saves accepted
+        self.coalesced = 0  # saves that replaced a pending save of the same record
+        self.batches = 0  # transactions committed
+        self.applied = 0  # saves applied to the database
+
+        self._pending = OrderedDict()  # key -> PendingSave, in first-queued order
+        self._committed_seq = 0
+        self._flush_requested = False
+        self._closing = False
+        self._failure: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, args=(service_factory,), name="write-behind", daemon=True)
+        self._thread.start()
+        self._flush_on_exit = flush_on_exit
+        if flush_on_exit:
+            atexit.register(self.close)
+
+    # -----------------------------------------
+    # Saves (return the validation problems; an empty list = queued)
+    # -----------------------------------------
+
+    def add_customer(self, customer_data: dict) -> List[Violation]:
+        return self._queue("add_customer", (customer_data,), None, CUSTOMER_VALIDATOR.validate(customer_data))
+
+    def update_customer(self, customer) -> List[Violation]:
+        violations = CUSTOMER_VALIDATOR.validate(CUSTOMER_STATEMENTS.as_dict(customer))
+        return self._queue("update_customer", (customer,), ("customers", customer.id), violations)
+
+    def delete_customer(self, customer_id: int) -> List[Violation]:
+        return self._queue("delete_customer", (customer_id,), ("customers", customer_id))
+
+    def add_glasses_test(self, customer_id: int, test_data: dict) -> List[Violation]:
+        violations = GLASSES_TEST_VALIDATOR.validate(test_data)
+        return self._queue("add_glasses_test", (customer_id, test_data), None, violations)
+
+    def update_glasses_test(self, customer_id: int, test_data: dict) -> List[Violation]:
+        violations = GLASSES_TEST_VALIDATOR.validate(test_data)
+        return self._queue("update_glasses_test", (customer_id, test_data), ("glasses_tests", test_data["id"]),
+                           violations)
+
+    def delete_glasses_test(self, test_id: int) -> List[Violation]:
+        return self._queue("delete_glasses_test", (test_id,), ("glasses_tests", test_id))
+
+    def add_contact_lenses_test(self, customer_id: int, test_data: dict) -> List[Violation]:
+        violations = CONTACT_LENSES_TEST_VALIDATOR.validate(test_data)
+        return self._queue("add_contact_lenses_test", (customer_id, test_data), None, violations)
+
+    def update_contact_lenses_test(self, customer_id: int, test_data: dict) -> List[Violation]:
+        violations = CONTACT_LENSES_TEST_VALIDATOR.validate(test_data)
+        return self._queue("update_contact_lenses_test", (customer_id, test_data),
+                           ("contact_lenses_tests", test_data["id"]), violations)
+
+    def delete_contact_lenses_test(self, test_id: int) -> List[Violation]:
+        return self._queue("delete_contact_lenses_test", (test_id,), ("contact_lenses_tests", test_id))
+
+    # -----------------------------------------
+    # Control
+    # -----------------------------------------
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until every save queued so far is committed; False if `timeout` ran out first."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("flush() called from the write-behind thread")
+        with self._cond:
+            target = self.queued
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(
+                lambda: self._committed_seq >= target or not self._thread.is_alive(), timeout=timeout
+            )
+            self._raise_failure()
+            return done
+
+    def close(self):
+        """Flushes, then stops the writer thread and closes its connection. Safe to call more than once."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._flush_on_exit:
+            atexit.unregister(self.close)
+            self._flush_on_exit = False
+        self._raise_failure()
+
+    # -----------------------------------------
+    # Internals
+    # -----------------------------------------
+
+    def _queue(self, method: str, args: tuple, key, violations=()) -> List[Violation]:
+        if violations:
+            return list(violations)
+        args = copy.deepcopy(args)  # the form may keep editing its dict after the save
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("The write-behind queue is closed")
+            self._raise_failure()
+            self.queued += 1
+            key = key if key is not None else ("add", self.queued)
+            if key in self._pending:
+                if self._pending[key].method.startswith("delete_") and not method.startswith("delete_"):
+                    key = (*key, self.queued)  # not merged into the delete: queued behind it
+                else:
+                    self.coalesced += 1
+                    del self._pending[key]  # re-inserted below: the save moves to its newest place
+            self._pending[key] = PendingSave(method, args, self.queued)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify_all()  # starts the batch timer / writes a full batch now
+        return []
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            raise RuntimeError("The write-behind writer stopped") from self._failure
+
+    def _run(self, service_factory):
+        try:
+            service = service_factory()
+        except BaseException as e:
+            with self._cond:
+                self._failure = e
+                self._cond.notify_all()
+            return
+
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._pending or self._closing)
+                    # the first save of a batch waits up to `interval` for more (unless flushed/closing/full)
+                    self._cond.wait_for(
+                        lambda: self._closing or self._flush_requested or len(self._pending) >= self.max_batch,
+                        timeout=self.interval,
+                    )
+                    batch, self._pending = self._pending, OrderedDict()
+                    batch_seq = self.queued
+                    self._flush_requested = False
+                    closing = self._closing
+
+                if batch:
+                    self._write(service, list(batch.values()))
+
+                with self._cond:
+                    self._committed_seq = batch_seq
+                    if not self._pending:
+                        self._flush_requested = False
+                    self._cond.notify_all()
+                    if closing and not self._pending:
+                        return
+        except BaseException as e:
+            with self._cond:
+                self._failure = e
+                self._cond.notify_all()
+        finally:
+            close_connection(service.cus_repo.conn)
+
+    def _write(self, service: CustomerService, saves: List[PendingSave]):
+        failed = []
+        with service.transaction():
+            for save in saves:
+                try:
+                    with service.transaction():  # savepoint: a failing save rolls back alone
+                        if not getattr(service, save.method)(*save.args):
+                            raise ValueError(f"{save.method} was not applied (invalid data or no such record)")
+                except Exception as e:
+                    failed.append((save, e))
+        self.batches += 1
+        self.applied += len(saves) - len(failed)
+        for save, error in failed:
+            self.errors.append((save, error))
+            if self.on_error is not None:
+                self.on_error(save, error)
@@ -1,80 +1,42 @@
 import pytest
-import sqlite3
 from datetime import datetime
 
-from db.models import ContactLensesTest
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.models import ContactLensesTest, Customer
 from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
 
 
 # -------------------------------------------------------------------
-# SCHEMA FIXTURE
+# MIGRATED SCHEMA FIXTURE
 # -------------------------------------------------------------------
 @pytest.fixture
-def conn():
-    """Provides an in-memory SQLite connection with full schema."""
-    connection = sqlite3.connect(":memory:")
-    connection.row_factory = sqlite3.Row
-
-    connection.executescript("""
-        CREATE TABLE customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT
-        );
-
-        INSERT INTO customers (name) VALUES ('John Doe');
-
-        CREATE TABLE contact_lenses_tests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER NOT NULL,
-            exam_date TEXT NOT NULL,
-            examiner TEXT,
-
-            r_rH REAL, r_rV REAL, r_aver REAL, r_k_cyl REAL, r_axH INTEGER,
-            r_rT REAL, r_rN REAL, r_rI REAL, r_rS REAL,
-
-            l_rH REAL, l_rV REAL, l_aver REAL, l_k_cyl REAL, l_axH INTEGER,
-            l_rT REAL, l_rN REAL, l_rI REAL, l_rS REAL,
-
-            r_lens_type TEXT, r_manufacturer TEXT, r_brand TEXT,
-            r_diameter REAL, r_base_curve_numerator REAL, r_base_curve_denominator REAL,
-            r_lens_sph REAL, r_lens_cyl REAL, r_lens_axis INTEGER,
-            r_material TEXT, r_tint TEXT,
-            r_lens_va_numerator INTEGER, r_lens_va_denominator INTEGER,
-
-            l_lens_type TEXT, l_manufacturer TEXT, l_brand TEXT,
-            l_diameter REAL, l_base_curve_numerator REAL, l_base_curve_denominator REAL,
-            l_lens_sph REAL, l_lens_cyl REAL, l_lens_axis INTEGER,
-            l_material TEXT, l_tint TEXT,
-            l_lens_va_numerator INTEGER, l_lens_va_denominator INTEGER,
-
-            notes TEXT,
-
-            CHECK(
-                (r_lens_cyl IS NULL AND r_lens_axis IS NULL) OR
-                (r_lens_cyl = 0 AND r_lens_axis IS NULL) OR
-                (r_lens_cyl <> 0 AND r_lens_axis BETWEEN 0 AND 180)
-            ),
-            CHECK(
-                (l_lens_cyl IS NULL AND l_lens_axis IS NULL) OR
-                (l_lens_cyl = 0 AND l_lens_axis IS NULL) OR
-                (l_lens_cyl <> 0 AND l_lens_axis BETWEEN 0 AND 180)
-            ),
-
-            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
-        );
-    """)
+def db_conn():
+    """Provides an in-memory connection migrated to the latest schema version."""
+    connection = create_connection("memory")
+    migrate(connection)
 
     yield connection
-    connection.close()
+    close_connection(connection)
 
 
 # -------------------------------------------------------------------
 # REPOSITORY FIXTURE
 # -------------------------------------------------------------------
 @pytest.fixture
-def repo(conn):
-    """Provides a repository with a fresh database."""
-    return ContactLensesTestRepo(conn)
+def repo(db_conn, make_customer):
+    """Provides a repository with a fresh database holding one customer (id 1)."""
+    CustomerRepo(db_conn).add_customer(make_customer())
+    return ContactLensesTestRepo(db_conn)
+
+
+@pytest.fixture
+def glasses_repo(db_conn, make_customer):
+    """Provides a GlassesRepo on a fresh database holding one customer (id 1) and no exams."""
+    CustomerRepo(db_conn).add_customer(make_customer())
+    return GlassesRepo(db_conn)
 
 
 # -------------------------------------------------------------------
@@ -116,3 +78,24 @@ def make_test():
         return ContactLensesTest(**base)
 
     return _factory
+
+
+@pytest.fixture
+def make_customer():
+    """Returns a factory function for creating Customer objects."""
+
+    def _factory(**overrides):
+        base = dict(
+            id=None, ssn=123456789, fname="John", lname="Doe",
+            birth_date="01/02/1990", sex="M",
+            tel_home=None, tel_mobile="0501234567",
+            address="1 Main St", town="Haifa", postal_code="3100000",
+            status=None, org=None, occupation=None, hobbies=None, referer=None,
+            glasses_num=0, lenses_num=0, mailing=0,
+            notes=None
+        )
+
+        base.update(overrides)
+        return Customer(**base)
+
+    return _factory
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.backup import BackupManager, online_backup, quick_check, restore
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "clinic.db")
+    conn = create_connection("writer", path=path)
+    migrate(conn)
+    conn.executemany("INSERT INTO customers (ssn, fname, lname, notes) VALUES (?, ?, ?, ?)",
+                     [(100000000 + i, "First", "Last", "x" * 400) for i in range(500)])
+    conn.commit()
+    close_connection(conn)
+    return path
+
+
+def count_customers(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT count(*) FROM customers").fetchone()[0]
+    finally:
+        conn.close()
+
+
+# ------------------------------------------------------
+# TEST: online_backup()
+# ------------------------------------------------------
+def test_backup_in_steps_is_verified_and_self_contained(db_path, tmp_path):
+    progress = []
+    dest = str(tmp_path / "copy.db")
+
+    result = online_backup(db_path, dest, pages=10, sleep=0, progress=lambda done, total: progress.append(done))
+
+    assert result.steps == len(progress) == -(-result.pages // 10)
+    assert progress[-1] == result.pages
+    assert quick_check(dest) == []
+    assert count_customers(dest) == 500
+    assert sqlite3.connect(dest).execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert not os.path.exists(dest + ".tmp")
+
+
+def test_writes_during_backup_neither_block_nor_restart_it(db_path, tmp_path):
+    writer = create_connection("writer", path=db_path)
+
+    def save_while_copying(done, total):
+        writer.execute("INSERT INTO customers (ssn, fname, lname) VALUES (?, 'New', 'Customer')", (200000000 + done,))
+        writer.commit()
+
+    result = online_backup(db_path, str(tmp_path / "copy.db"), pages=10, sleep=0, progress=save_while_copying)
+    close_connection(writer)
+
+    assert result.steps == -(-result.pages // 10)  # never restarted
+    assert count_customers(result.path) == 500  # the snapshot taken when the backup started
+    assert count_customers(db_path) == 500 + result.steps
+
+
+def test_quick_check_reports_damage(db_path, tmp_path):
+    dest = str(tmp_path / "copy.db")
+    online_backup(db_path, dest)
+    with open(dest, "r+b") as f:
+        f.seek(4096 * 3)
+        f.write(b"\xff" * 4096)
+
+    assert quick_check(dest) != []
+    with pytest.raises(ValueError, match="quick_check"):
+        restore(dest, db_path)
+
+
+# ------------------------------------------------------
+# TEST: generations
+# ------------------------------------------------------
+def test_hourly_and_daily_generations_rotate(db_path, tmp_path):
+    manager = BackupManager(db_path, str(tmp_path / "backups"), keep_hourly=3, keep_daily=2)
+    start = datetime(2026, 3, 1, 9, 15)
+
+    created = manager.run_due(start, sleep=0)
+    assert [os.path.basename(p) for p in created] == ["clinic-hourly-20260301-09.db", "clinic-daily-20260301.db"]
+    assert manager.run_due(start + timedelta(minutes=30), sleep=0) == []  # nothing due yet this hour
+
+    for hours in range(1, 50):
+        manager.run_due(start + timedelta(hours=hours), sleep=0)
+
+    assert [os.path.basename(p) for p in manager.list_backups("hourly")] == [
+        "clinic-hourly-20260303-08.db", "clinic-hourly-20260303-09.db", "clinic-hourly-20260303-10.db",
+    ]
+    assert [os.path.basename(p) for p in manager.list_backups("daily")] == [
+        "clinic-daily-20260302.db", "clinic-daily-20260303.db",
+    ]
+
+
+# ------------------------------------------------------
+# TEST: restore
+# ------------------------------------------------------
+def test_restore_keeps_the_current_database(db_path, tmp_path):
+    manager = BackupManager(db_path, str(tmp_path / "backups"))
+    backup = manager.run_due(sleep=0)[0]
+    conn = create_connection("writer", path=db_path)
+    conn.execute("DELETE FROM customers WHERE id > 100")
+    conn.commit()
+    close_connection(conn)
+
+    manager.restore(backup)
+
+    assert count_customers(db_path) == 500
+    pre_restore = manager.list_backups("pre-restore")
+    assert len(pre_restore) == 1 and count_customers(pre_restore[0]) == 100
+    conn = create_connection("writer", path=db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    close_connection(conn)
@@ -0,0 +1,212 @@
+import re
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from db.catalog import Catalog, catalog_key, clean_catalog_value
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.transaction import transaction
+
+
+def add(repo, **fields):
+    return repo.add_test(GlassesTest(id=None, customer_id=1, exam_date=datetime(2025, 2, 15), **fields))
+
+
+def stored(conn, column, test_id):
+    return conn.execute(f"SELECT {column} FROM glasses_tests_cold WHERE id = ?", (test_id,)).fetchone()[0]
+
+
+# ------------------------------------------------------
+# TEST: normalization
+# ------------------------------------------------------
+def test_spelling_variants_share_a_key():
+    assert clean_catalog_value("  Ray-Ban \t Italy ") == "Ray-Ban Italy"
+    assert clean_catalog_value("   ") is None
+    assert len({catalog_key(clean_catalog_value(v)) for v in ("Ray-Ban", "RAY BAN ", "ray_ban", "RayBan")}) == 1
+    assert catalog_key("Zeiss") != catalog_key("Zeis")
+
+
+def test_catalog_values_are_stored_as_ids(db_conn, glasses_repo):
+    first = add(glasses_repo, frame_manufacturer="Ray-Ban", lenses_manufacturer="Essilor", frame_supplier="Ray-Ban")
+    second = add(glasses_repo, frame_manufacturer="  RAY BAN", lenses_manufacturer="ray-ban")
+
+    ray_ban = stored(db_conn, "frame_manufacturer", first.id)
+    assert isinstance(ray_ban, int)
+    assert stored(db_conn, "frame_manufacturer", second.id) == ray_ban
+    assert stored(db_conn, "lenses_manufacturer", second.id) == ray_ban  # one catalog for frame and lens makers
+    assert stored(db_conn, "frame_supplier", first.id) != ray_ban  # suppliers are a catalog of their own
+    # the first spelling written is the one shown
+    assert glasses_repo.get_test(second.id).frame_manufacturer == "Ray-Ban"
+
+
+# ------------------------------------------------------
+# TEST: the intern cache
+# ------------------------------------------------------
+def test_decoded_names_are_one_object(glasses_repo):
+    add(glasses_repo, frame_color="Matte black")
+    add(glasses_repo, frame_color="matte  black")
+
+    first, second = glasses_repo.list_tests_for_customer(1)
+    assert first.frame_color == "Matte black"
+    assert first.frame_color is second.frame_color
+
+
+def test_name_added_by_another_connection_is_decoded(tmp_path, make_customer):
+    path = str(tmp_path / "shared.db")
+    writer, reader = create_connection("writer", path=path), create_connection("reader", path=path)
+    migrate(writer)
+    CustomerRepo(writer).add_customer(make_customer())
+    reading = GlassesRepo(reader)
+    add(GlassesRepo(writer), frame_manufacturer="Oakley")
+    assert reading.get_test(1).frame_manufacturer == "Oakley"
+
+    add(GlassesRepo(writer), frame_manufacturer="Lindberg")
+
+    assert reading.get_test(2).frame_manufacturer == "Lindberg"
+    close_connection(reader)
+    close_connection(writer)
+
+
+def test_rolled_back_name_is_forgotten(db_conn, glasses_repo):
+    add(glasses_repo, frame_manufacturer="Ray-Ban")
+    with pytest.raises(RuntimeError):
+        with transaction(db_conn):
+            add(glasses_repo, frame_manufacturer="Prada")
+            raise RuntimeError("cancelled")
+
+    # SQLite hands the rolled-back id to the next new name
+    test = add(glasses_repo, frame_supplier="Luxottica")
+
+    assert stored(db_conn, "frame_supplier", test.id) == 2
+    assert glasses_repo.get_test(test.id).frame_supplier == "Luxottica"
+    assert glasses_repo.catalog.find("manufacturer", "Prada") is None
+    assert stored(db_conn, "frame_manufacturer", add(glasses_repo, frame_manufacturer="prada").id) is not None
+    assert [t.frame_manufacturer for t in glasses_repo.list_tests_with("frame_manufacturer", "PRADA")] == ["prada"]
+
+
+def test_find_does_not_add_names(db_conn):
+    catalog = Catalog(db_conn)
+
+    assert catalog.find("color", "Havana") is None
+    assert catalog.encode("color", None) is None
+    assert db_conn.execute("SELECT count(*) FROM catalog_values").fetchone()[0] == 0
+
+
+# ------------------------------------------------------
+# TEST: queries by catalog value
+# ------------------------------------------------------
+def test_exams_by_manufacturer_use_the_index(db_conn, glasses_repo):
+    for name in ("Ray-Ban", "Oakley", "ray ban", None):
+        add(glasses_repo, frame_manufacturer=name)
+
+    assert [t.id for t in glasses_repo.list_tests_with("frame_manufacturer", "RAY-BAN")] == [1, 3]
+    assert glasses_repo.list_tests_with("frame_manufacturer", "Prada") == []
+    assert glasses_repo.count_tests_by("frame_manufacturer") == {"Ray-Ban": 2, "Oakley": 1}
+    plan = db_conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM glasses_tests_cold WHERE frame_manufacturer = ?", (1,)
+    ).fetchall()
+    assert "idx_glasses_tests_cold_frame_manufacturer" in " ".join(row["detail"] for row in plan)
+
+
+def test_contact_lenses_by_brand(db_conn, glasses_repo, make_test):
+    lenses = ContactLensesTestRepo(db_conn)
+    for brand in ("Biofinity", "BIOFINITY ", "Air Optix"):
+        lenses.add_test(make_test(r_brand=brand, r_material="Comfilcon A"))
+    add(glasses_repo, lenses_material="comfilcon-a")
+
+    assert isinstance(db_conn.execute("SELECT r_brand FROM contact_lenses_tests").fetchone()[0], int)
+    assert [t.r_brand for t in lenses.list_tests_with("r_brand", "biofinity")] == ["Biofinity", "Biofinity"]
+    assert lenses.count_tests_by("r_brand") == {"Biofinity": 2, "Air Optix": 1}
+    assert glasses_repo.get_test(1).lenses_material == "Comfilcon A"  # one catalog of materials for both exams
+    plan = db_conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM contact_lenses_tests WHERE r_brand = ?", (1,)
+    ).fetchall()
+    assert "idx_contact_lenses_tests_r_brand" in " ".join(row["detail"] for row in plan)
+
+
+def test_only_catalog_columns_can_be_queried(glasses_repo):
+    with pytest.raises(ValueError):
+        glasses_repo.list_tests_with("notes", "x")
+    with pytest.raises(ValueError):
+        glasses_repo.count_tests_by("frame_model")
+
+
+# ------------------------------------------------------
+# TEST: migration of an existing database
+# ------------------------------------------------------
+def test_migration_interns_existing_names():
+    conn = create_connection("memory")
+    migrate(conn, target=10)
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'Old', 'Row')")
+    conn.executemany("INSERT INTO glasses_tests (id, customer_id, exam_date) VALUES (?, 1, '2020-01-01T00:00:00')",
+                     [(1,), (2,), (3,), (4,)])
+    conn.executemany("INSERT INTO glasses_tests_cold (id, frame_manufacturer, frame_color, notes) VALUES (?, ?, ?, ?)", [
+        (1, "RAY BAN", "black", "kept"),
+        (2, "Ray-Ban", None, None),
+        (3, "ray-ban ", "Black", None),
+        (4, "Ray-Ban", " ", None),
+    ])
+    conn.commit()
+
+    assert migrate(conn, target=11) == [11]
+
+    rows = conn.execute("SELECT id, frame_manufacturer, frame_color, notes FROM glasses_tests_full ORDER BY id")
+    assert [tuple(row) for row in rows] == [
+        (1, "Ray-Ban", "Black", "kept"), (2, "Ray-Ban", None, None), (3, "Ray-Ban", "Black", None), (4, "Ray-Ban", None, None),
+    ]
+    assert [tuple(row) for row in conn.execute("SELECT kind, value FROM catalog_values ORDER BY kind")] == [
+        ("color", "Black"), ("manufacturer", "Ray-Ban"),  # a tie keeps the first spelling in sort order
+    ]
+    assert conn.execute("SELECT count(*) FROM sqlite_master WHERE name = 'glasses_tests_cold_update'").fetchone()[0] == 1
+    close_connection(conn)
+
+
+def test_migration_keeps_its_own_normalization(monkeypatch):
+    # a later change to db.catalog must not change the keys an old migration writes
+    monkeypatch.setattr("db.catalog._NOT_KEY", re.compile(r"\s+"))  # punctuation would count
+    conn = create_connection("memory")
+    migrate(conn, target=10)
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'Old', 'Row')")
+    conn.execute("INSERT INTO glasses_tests (id, customer_id, exam_date) VALUES (1, 1, '2020-01-01T00:00:00')")
+    conn.execute("INSERT INTO glasses_tests_cold (id, frame_manufacturer) VALUES (1, ' Ray-Ban ')")
+    conn.commit()
+
+    migrate(conn, target=11)
+
+    assert [tuple(row) for row in conn.execute("SELECT key, value FROM catalog_values")] == [("rayban", "Ray-Ban")]
+    close_connection(conn)
+
+
+def test_migration_interns_existing_contact_lens_names():
+    conn = create_connection("memory")
+    migrate(conn, target=11)
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'Old', 'Row')")
+    conn.execute("INSERT INTO catalog_values (kind, key, value) VALUES ('material', 'cr39', 'CR-39')")
+    conn.executemany("INSERT INTO contact_lenses_tests (id, customer_id, exam_date, r_brand, l_brand, r_material) "
+                     "VALUES (?, 1, '2020-01-01T00:00:00', ?, ?, ?)", [
+        (1, "Biofinity", "air optix", "Comfilcon A"),
+        (2, "BIOFINITY", "Air Optix", "cr 39"),
+        (3, "Biofinity ", None, None),
+    ])
+    conn.commit()
+
+    assert migrate(conn) == [12]
+
+    rows = conn.execute("SELECT id, r_brand, l_brand, r_material FROM contact_lenses_tests_full ORDER BY id")
+    assert [tuple(row) for row in rows] == [
+        (1, "Biofinity", "Air Optix", "Comfilcon A"), (2, "Biofinity", "Air Optix", "CR-39"), (3, "Biofinity", None, None),
+    ]
+    assert conn.execute("SELECT count(*) FROM catalog_values WHERE key = 'cr39'").fetchone()[0] == 1
+    dependents = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE tbl_name = 'contact_lenses_tests' AND type IN ('index', 'trigger')")}
+    assert {"idx_contact_lenses_tests_customer_date", "contact_lenses_tests_log_update",
+            "contact_lenses_tests_dq_insert"} <= dependents
+    with pytest.raises(sqlite3.IntegrityError):  # the toric CHECKs survive the rebuild
+        conn.execute("UPDATE contact_lenses_tests SET r_lens_cyl = -1, r_lens_axis = 200 WHERE id = 1")
+    close_connection(conn)
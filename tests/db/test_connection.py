@@ -0,0 +1,95 @@
+import sqlite3
+import pytest
+
+from db.connection import create_connection, close_connection, ConnectionProfile
+
+
+# ------------------------------------------------------
+# Helper: read a single PRAGMA value
+# ------------------------------------------------------
+def pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+# ------------------------------------------------------
+# TEST: writer profile
+# ------------------------------------------------------
+def test_writer_profile_pragmas(tmp_path):
+    conn = create_connection("writer", path=str(tmp_path / "test.db"))
+
+    assert pragma(conn, "journal_mode") == "wal"
+    assert pragma(conn, "synchronous") == 1  # NORMAL
+    assert pragma(conn, "foreign_keys") == 1
+    assert pragma(conn, "temp_store") == 2  # MEMORY
+    assert pragma(conn, "busy_timeout") == 5000
+    assert pragma(conn, "cache_size") == -16 * 1024
+    assert isinstance(conn.execute("SELECT 1 AS one").fetchone(), sqlite3.Row)
+
+    close_connection(conn)
+
+
+# ------------------------------------------------------
+# TEST: reader profile cannot write, and doesn't block the writer
+# ------------------------------------------------------
+def test_reader_profile_is_read_only(tmp_path):
+    path = str(tmp_path / "test.db")
+    writer = create_connection("writer", path=path)
+    writer.execute("CREATE TABLE t (a INTEGER)")
+    writer.commit()
+
+    reader = create_connection("reader", path=path)
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("INSERT INTO t VALUES (1)")
+    reader.rollback()
+
+    # An open read transaction doesn't stop the writer in WAL mode
+    reader.execute("BEGIN")
+    reader.execute("SELECT * FROM t").fetchall()
+    writer.execute("INSERT INTO t VALUES (1)")
+    writer.commit()
+    reader.rollback()
+
+    assert reader.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+    close_connection(reader)
+    close_connection(writer)
+
+
+# ------------------------------------------------------
+# TEST: memory profile + custom profiles
+# ------------------------------------------------------
+def test_memory_profile():
+    conn = create_connection("memory")
+
+    assert pragma(conn, "journal_mode") == "memory"
+    assert pragma(conn, "foreign_keys") == 1
+
+    close_connection(conn)
+
+
+def test_custom_profile(tmp_path):
+    profile = ConnectionProfile(name="bulk", synchronous="OFF", busy_timeout_ms=100)
+    conn = create_connection(profile, path=str(tmp_path / "test.db"))
+
+    assert pragma(conn, "synchronous") == 0
+    assert pragma(conn, "busy_timeout") == 100
+
+    close_connection(conn)
+
+
+@pytest.mark.parametrize("profile, optimized", [("writer", True), ("reader", False), ("memory", False)])
+def test_close_uses_the_profile_the_connection_was_opened_with(tmp_path, profile, optimized):
+    path = str(tmp_path / "test.db")
+    close_connection(create_connection("writer", path=path))  # creates the file the reader opens
+    conn = create_connection(profile, path=path)
+    sent = []
+    conn.set_trace_callback(sent.append)
+
+    close_connection(conn)
+
+    assert ("PRAGMA optimize" in sent) is optimized
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        create_connection("no-such-role")
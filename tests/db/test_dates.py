@@ -0,0 +1,116 @@
+from datetime import date, datetime
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.utils import birth_date_to_epoch_day, date_to_epoch_day, decode_exam_date, epoch_day_to_date
+from services.customer_service import CustomerService, years_before
+
+
+# ------------------------------------------------------
+# TEST: conversions
+# ------------------------------------------------------
+def test_birth_date_formats():
+    expected = birth_date_to_epoch_day("1990-02-01")
+
+    assert epoch_day_to_date(expected) == date(1990, 2, 1)
+    assert birth_date_to_epoch_day("01/02/1990") == expected
+    assert birth_date_to_epoch_day("1/2/1990") == expected
+    assert birth_date_to_epoch_day("01.02.1990") == expected
+    assert birth_date_to_epoch_day(" 01-02-1990 ") == expected
+    assert birth_date_to_epoch_day("born in the 90s") is None
+    assert birth_date_to_epoch_day(None) is None
+
+
+def test_decode_exam_date():
+    assert decode_exam_date("2025-05-09T14:30:00") == datetime(2025, 5, 9, 14, 30)
+    assert decode_exam_date("BAD_DATE_FORMAT") == "BAD_DATE_FORMAT"
+    assert decode_exam_date(None) is None
+
+
+def test_years_before_leap_day():
+    assert years_before(date(2024, 2, 29), 1) == date(2023, 2, 28)
+
+
+# ------------------------------------------------------
+# TEST: lenses exams are stored and decoded like glasses exams
+# ------------------------------------------------------
+def test_lenses_exam_date_round_trip(db_conn, make_customer, make_test):
+    CustomerRepo(db_conn).add_customer(make_customer())
+    repo = ContactLensesTestRepo(db_conn)
+
+    test_id = repo.add_test(make_test(exam_date=datetime(2025, 2, 15, 9, 30)))
+    saved = repo.get_test(test_id)
+    assert saved.exam_date == datetime(2025, 2, 15, 9, 30)
+
+    saved.exam_date = datetime(2025, 3, 1, 10, 0, 0, 123456)  # update path used to store 'YYYY-MM-DD HH:MM:SS.ffffff'
+    repo.update_test(saved)
+    stored = db_conn.execute("SELECT exam_date FROM contact_lenses_tests").fetchone()[0]
+
+    assert stored == "2025-03-01T10:00:00"
+    assert repo.get_test(test_id).exam_date == datetime(2025, 3, 1, 10, 0)
+
+
+# ------------------------------------------------------
+# TEST: migration normalizes existing values
+# ------------------------------------------------------
+def test_migration_normalizes_legacy_dates(make_customer):
+    conn = create_connection("memory")
+    migrate(conn, target=4)
+    conn.execute("INSERT INTO customers (ssn, fname, lname, birth_date) VALUES (111111111, 'A', 'B', '20/11/1992')")
+    conn.execute("INSERT INTO customers (ssn, fname, lname, birth_date) VALUES (222222222, 'C', 'D', 'unknown')")
+    conn.execute("INSERT INTO contact_lenses_tests (customer_id, exam_date) VALUES (1, '2025-03-01 10:00:00.123456')")
+    conn.execute("INSERT INTO glasses_tests (customer_id, exam_date) VALUES (1, '2024-01-05')")
+    conn.commit()
+
+    migrate(conn)
+
+    birth_days = [r[0] for r in conn.execute("SELECT birth_day FROM customers ORDER BY id")]
+    assert birth_days == [birth_date_to_epoch_day("1992-11-20"), None]
+    assert conn.execute("SELECT exam_date FROM contact_lenses_tests").fetchone()[0] == "2025-03-01T10:00:00"
+    assert conn.execute("SELECT exam_date FROM glasses_tests").fetchone()[0] == "2024-01-05T00:00:00"
+
+    close_connection(conn)
+
+
+def test_migration_keeps_its_own_birth_date_parser(monkeypatch):
+    # a format learned later by db.utils must not change what an old migration writes
+    monkeypatch.setattr("db.utils.BIRTH_DATE_FORMATS", ("%Y/%m/%d",))
+    conn = create_connection("memory")
+    migrate(conn, target=4)
+    conn.execute("INSERT INTO customers (ssn, fname, lname, birth_date) VALUES (111111111, 'A', 'B', '20/11/1992')")
+    conn.execute("INSERT INTO customers (ssn, fname, lname, birth_date) VALUES (222222222, 'C', 'D', '1992/11/20')")
+    conn.commit()
+
+    migrate(conn, target=5)
+
+    birth_days = [r[0] for r in conn.execute("SELECT birth_day FROM customers ORDER BY id")]
+    assert birth_days == [date_to_epoch_day(date(1992, 11, 20)), None]
+    close_connection(conn)
+
+
+# ------------------------------------------------------
+# TEST: age queries run on the birth_day index
+# ------------------------------------------------------
+def test_customers_by_age(db_conn, make_customer):
+    repo = CustomerRepo(db_conn)
+    repo.add_customer(make_customer(ssn=111111111, fname="Child", birth_date="15/06/2015"))
+    repo.add_customer(make_customer(ssn=222222222, fname="Adult", birth_date="1985-01-01"))
+    senior = repo.add_customer(make_customer(ssn=333333333, fname="Senior", birth_date="02.03.1950"))
+    repo.add_customer(make_customer(ssn=444444444, fname="Unknown", birth_date=None))
+
+    senior.birth_date = "02/03/1951"
+    repo.update_customer(senior)
+
+    service = CustomerService(repo, None, None)
+    today = date(2025, 6, 15)
+
+    assert [c.fname for c in service.get_customers_by_age(10, 10, today)] == ["Child"]
+    assert [c.fname for c in service.get_customers_by_age(18, 120, today)] == ["Senior", "Adult"]
+    assert [c.fname for c in service.get_customers_by_age(74, 74, today)] == ["Senior"]
+
+    plan = db_conn.execute("""
+        EXPLAIN QUERY PLAN SELECT id FROM customers WHERE birth_day BETWEEN ? AND ? ORDER BY birth_day
+    """, (0, 1)).fetchall()
+    assert "idx_customers_birth_day" in plan[0]["detail"]
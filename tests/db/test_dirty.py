@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+from db.dirty import update_sql
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from services.customer_service import CustomerService
+
+
+@pytest.fixture
+def glasses(glasses_repo):
+    glasses_repo.add_test(GlassesTest(id=None, customer_id=1, exam_date=datetime(2025, 2, 15), r_cylinder=-0.5,
+                                      r_axis=90))
+    return glasses_repo
+
+
+@pytest.fixture
+def updates(db_conn):
+    """The UPDATE statements sent on db_conn (as traced: with the values bound; trigger steps repeat it)."""
+    sent = []
+    db_conn.set_trace_callback(
+        lambda sql: sent.append(sql) if sql.startswith("UPDATE") and sql not in sent else None
+    )
+    yield sent
+    db_conn.set_trace_callback(None)
+
+
+def test_only_changed_columns_are_updated(glasses, updates):
+    test = glasses.get_test(1)
+    assert test.changed_fields() == ()
+
+    test.r_axis = 95
+    test.exam_date = datetime(2025, 2, 16)
+    assert test.changed_fields() == ("exam_date", "r_axis")
+    assert glasses.update_test(test) is True
+
+    assert updates == ["UPDATE glasses_tests SET exam_date = '2025-02-16T00:00:00', r_axis = 95 WHERE id = 1"]
+    stored = glasses.get_test(1)
+    assert (stored.r_axis, stored.exam_date, stored.r_cylinder) == (95, datetime(2025, 2, 16), -0.5)
+    assert test.changed_fields() == ()  # clean again after the save
+
+
+def test_unchanged_save_skips_the_database(db_conn, glasses, updates):
+    test = glasses.get_test(1)
+    test.r_axis = 90  # set back to the loaded value
+    log_size = db_conn.execute("SELECT count(*) FROM change_log").fetchone()[0]
+
+    assert glasses.update_test(test) is True
+
+    assert updates == []
+    assert db_conn.execute("SELECT count(*) FROM change_log").fetchone()[0] == log_size
+
+
+def test_model_built_in_code_updates_every_column(glasses, updates):
+    glasses.update_test(GlassesTest(id=1, customer_id=1, exam_date=datetime(2025, 2, 15), r_axis=10))
+
+    # every column but id, plus the id of each table's UPDATE (migration 10 split the columns over two tables)
+    assert [u.split(" SET ")[0] for u in updates] == ["UPDATE glasses_tests", "UPDATE glasses_tests_cold"]
+    assert sum(u.count(" = ") for u in updates) == len(GlassesTest.__dataclass_fields__) + 1
+    assert glasses.get_test(1).r_cylinder is None
+
+
+def test_statements_are_cached_per_column_set():
+    assert update_sql("glasses_tests", ("r_axis",)) is update_sql("glasses_tests", ("r_axis",))
+    assert update_sql("glasses_tests", ("r_axis",)) != update_sql("contact_lenses_tests", ("r_axis",))
+
+
+def test_service_form_save_sends_only_the_edited_field(db_conn, glasses, updates):
+    service = CustomerService(CustomerRepo(db_conn), glasses, ContactLensesTestRepo(db_conn))
+    form = {name: getattr(glasses.get_test(1), name) for name in GlassesTest.__dataclass_fields__}
+    form["exam_date"] = "15/02/2025"
+
+    assert service.update_glasses_test(1, dict(form)) is True
+    assert updates == []
+
+    form["r_axis"] = 100
+    assert service.update_glasses_test(1, dict(form)) is True
+    assert updates == ["UPDATE glasses_tests SET r_axis = 100 WHERE id = 1"]
@@ -0,0 +1,97 @@
+import sqlite3
+import pytest
+
+from db.bootstrap import initialize_database
+from db.connection import create_connection, close_connection
+from db.migrations import migrate, get_schema_version, latest_version
+from db.schema import CUSTOMERS_SCHEMA_SQL
+
+
+# ------------------------------------------------------
+# Helper: names of the indexes on a table
+# ------------------------------------------------------
+def index_names(conn, table):
+    return {row["name"] for row in conn.execute(f"PRAGMA index_list({table})")}
+
+
+# ------------------------------------------------------
+# TEST: fresh database is migrated to the latest version
+# ------------------------------------------------------
+def test_migrate_fresh_database():
+    conn = create_connection("memory")
+
+    applied = migrate(conn)
+
+    assert applied == list(range(1, latest_version() + 1))
+    assert get_schema_version(conn) == latest_version()
+    assert "idx_customers_ssn" in index_names(conn, "customers")
+    assert "idx_glasses_tests_customer_date" in index_names(conn, "glasses_tests")
+    assert "idx_contact_lenses_tests_customer_date" in index_names(conn, "contact_lenses_tests")
+
+    close_connection(conn)
+
+
+# ------------------------------------------------------
+# TEST: second run is a no-op
+# ------------------------------------------------------
+def test_migrate_is_idempotent(db_conn):
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    assert migrate(db_conn) == []
+    assert statements == ["PRAGMA user_version"]
+
+
+# ------------------------------------------------------
+# TEST: pre-migrations database (tables exist, user_version = 0)
+# ------------------------------------------------------
+def test_migrate_legacy_database():
+    conn = create_connection("memory")
+    conn.execute(CUSTOMERS_SCHEMA_SQL)
+    conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (123456789, 'Old', 'Row')")
+    conn.commit()
+
+    migrate(conn)
+
+    assert get_schema_version(conn) == latest_version()
+    assert conn.execute("SELECT fname FROM customers").fetchone()["fname"] == "Old"
+
+    close_connection(conn)
+
+
+# ------------------------------------------------------
+# TEST: SSN index is unique
+# ------------------------------------------------------
+def test_ssn_is_unique(db_conn):
+    db_conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (123456789, 'A', 'B')")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db_conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (123456789, 'C', 'D')")
+
+
+# ------------------------------------------------------
+# TEST: history queries use the composite index
+# ------------------------------------------------------
+def test_history_query_uses_index(db_conn):
+    plan = db_conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT * FROM glasses_tests WHERE customer_id = ? ORDER BY exam_date DESC
+    """, (1,)).fetchall()
+    details = " ".join(row["detail"] for row in plan)
+
+    assert "idx_glasses_tests_customer_date" in details
+    assert "TEMP B-TREE" not in details
+
+
+# ------------------------------------------------------
+# TEST: bootstrap on a file database
+# ------------------------------------------------------
+def test_initialize_database(tmp_path):
+    path = str(tmp_path / "database.db")
+
+    initialize_database(path)
+    initialize_database(path)
+
+    conn = create_connection("reader", path=path)
+    assert get_schema_version(conn) == latest_version()
+    close_connection(conn)
@@ -0,0 +1,62 @@
+from dataclasses import asdict, fields
+from datetime import datetime
+
+import pytest
+
+from db.models import ContactLensesTest, Customer, GlassesTest
+from db.statements import (
+    CONTACT_LENSES_TEST_STATEMENTS, CUSTOMER_STATEMENTS, GLASSES_TEST_STATEMENTS, REGISTRY, check_schema,
+    schema_problems,
+)
+
+
+# ------------------------------------------------------
+# TEST: statements derived from the models
+# ------------------------------------------------------
+@pytest.mark.parametrize("statements, model", [
+    (CUSTOMER_STATEMENTS, Customer),
+    (GLASSES_TEST_STATEMENTS, GlassesTest),
+    (CONTACT_LENSES_TEST_STATEMENTS, ContactLensesTest),
+])
+def test_columns_follow_the_model(statements, model):
+    assert statements.columns == tuple(f.name for f in fields(model))
+    assert "id" not in statements.insert_columns
+    assert statements.insert_sql.count("?") == len(statements.insert_columns)
+    assert statements.update_sql.count("?") == len(statements.insert_columns) + 1
+    assert REGISTRY[statements.table] is statements
+
+
+def test_parameters_encode_and_derive(make_customer):
+    customer = make_customer(id=7, birth_date="01/02/1990")
+    params = CUSTOMER_STATEMENTS.update_params(customer)
+    assert len(params) == len(CUSTOMER_STATEMENTS.insert_columns) + 1
+    assert params[-2] == 7336 and params[-1] == 7  # birth_day (days since 1970-01-01), then the id
+
+    test = GlassesTest(id=None, customer_id=1, exam_date=datetime(2025, 2, 15), r_axis=90)
+    params = dict(zip(GLASSES_TEST_STATEMENTS.insert_columns, GLASSES_TEST_STATEMENTS.insert_params(test)))
+    assert params["exam_date"] == "2025-02-15T00:00:00" and params["r_axis"] == 90
+
+
+def test_as_dict_matches_asdict(make_customer):
+    customer = make_customer(id=1)
+    assert CUSTOMER_STATEMENTS.as_dict(customer) == asdict(customer)
+
+
+# ------------------------------------------------------
+# TEST: schema check
+# ------------------------------------------------------
+def test_migrated_schema_matches(db_conn):
+    assert schema_problems(db_conn) == []
+    check_schema(db_conn)
+
+
+def test_drift_is_reported(db_conn):
+    db_conn.execute("ALTER TABLE customers RENAME COLUMN fname TO first_name")
+    db_conn.execute("DROP VIEW glasses_tests_full")
+    problems = schema_problems(db_conn)
+
+    assert "customers: no column fname (model Customer)" in problems
+    assert "glasses_tests_full: table is missing" in problems
+    assert not any(p.startswith("contact_lenses_tests") for p in problems)
+    with pytest.raises(ValueError, match="disagree"):
+        check_schema(db_conn)
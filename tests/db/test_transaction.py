@@ -0,0 +1,77 @@
+from datetime import datetime
+import pytest
+
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.transaction import transaction, in_unit_of_work
+from services.customer_service import CustomerService
+
+
+@pytest.fixture
+def service(db_conn):
+    return CustomerService(CustomerRepo(db_conn), GlassesRepo(db_conn), ContactLensesTestRepo(db_conn))
+
+
+def count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+# ------------------------------------------------------
+# TEST: a multi-entity save commits once
+# ------------------------------------------------------
+def test_transaction_commits_once(service, db_conn, make_customer, make_test):
+    statements = []
+    db_conn.set_trace_callback(statements.append)
+
+    with service.transaction():
+        customer = service.cus_repo.add_customer(make_customer())
+        service.glasses_repo.add_test(GlassesTest(id=None, customer_id=customer.id, exam_date=datetime(2025, 1, 1)))
+        service.lenses_repo.add_test(make_test(customer_id=customer.id))
+        assert in_unit_of_work(db_conn)
+
+    assert not in_unit_of_work(db_conn)
+    assert statements.count("COMMIT") == 1
+    assert count(db_conn, "customers") == 1
+    assert count(db_conn, "glasses_tests") == 1
+    assert count(db_conn, "contact_lenses_tests") == 1
+
+
+# ------------------------------------------------------
+# TEST: an error rolls back everything in the block
+# ------------------------------------------------------
+def test_transaction_rolls_back_on_error(service, db_conn, make_customer):
+    with pytest.raises(RuntimeError):
+        with service.transaction():
+            service.cus_repo.add_customer(make_customer())
+            raise RuntimeError("boom")
+
+    assert count(db_conn, "customers") == 0
+
+
+# ------------------------------------------------------
+# TEST: nested blocks are savepoints
+# ------------------------------------------------------
+def test_nested_savepoint_rolls_back_alone(db_conn, make_customer):
+    repo = CustomerRepo(db_conn)
+
+    with transaction(db_conn):
+        repo.add_customer(make_customer(ssn=111111111))
+        with pytest.raises(ValueError):
+            with transaction(db_conn):
+                repo.add_customer(make_customer(ssn=222222222))
+                raise ValueError("inner failure")
+        repo.add_customer(make_customer(ssn=333333333))
+
+    ssns = [row[0] for row in db_conn.execute("SELECT ssn FROM customers ORDER BY ssn")]
+    assert ssns == [111111111, 333333333]
+
+
+# ------------------------------------------------------
+# TEST: outside a block repos still commit per call
+# ------------------------------------------------------
+def test_autocommit_outside_transaction(db_conn, make_customer):
+    CustomerRepo(db_conn).add_customer(make_customer())
+
+    assert not db_conn.in_transaction
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import pytest
+
+from db.bulk import MIN_RUN
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.transaction import transaction
+
+
+@pytest.fixture
+def customer_repo(db_conn):
+    return CustomerRepo(db_conn)
+
+
+def glasses_test(i, customer_id=1):
+    return GlassesTest(id=None, customer_id=customer_id, exam_date=datetime(2020, 1, 1 + i % 28), r_axis=i % 180)
+
+
+# ------------------------------------------------------
+# TEST: add_customers_bulk()
+# ------------------------------------------------------
+def test_add_customers_bulk_from_generator(customer_repo, make_customer):
+    customers = [make_customer(ssn=100000000 + i, birth_date="01/02/1990") for i in range(7)]
+
+    ids = customer_repo.add_customers_bulk((c for c in customers), chunk_size=3)
+
+    assert ids == [1, 2, 3, 4, 5, 6, 7]
+    assert [c.id for c in customers] == ids
+    stored = customer_repo.get_customer_by_ssn(100000004)
+    assert stored.id == 5
+    assert customer_repo.search_customers("John")  # FTS triggers still fire
+
+
+def test_bulk_ids_follow_existing_rows(customer_repo, make_customer):
+    customer_repo.add_customer(make_customer(ssn=100000000))
+    customer_repo.delete_customer(1)  # AUTOINCREMENT never reuses 1
+
+    ids = customer_repo.add_customers_bulk([make_customer(ssn=100000001), make_customer(ssn=100000002)])
+
+    assert ids == [2, 3]
+
+
+def test_failed_chunk_rolls_back_only_that_chunk(customer_repo, make_customer):
+    customers = [make_customer(ssn=100000000 + i) for i in range(4)] + [make_customer(ssn=100000000)]  # duplicate ssn
+
+    with pytest.raises(Exception):
+        customer_repo.add_customers_bulk(customers, chunk_size=3)
+
+    assert [c.id for c in customer_repo.iter_customers()] == [1, 2, 3]
+
+
+def test_bulk_inside_unit_of_work_is_atomic(db_conn, customer_repo, make_customer):
+    with pytest.raises(RuntimeError):
+        with transaction(db_conn):
+            customer_repo.add_customers_bulk([make_customer(ssn=100000000 + i) for i in range(5)], chunk_size=2)
+            raise RuntimeError("abort")
+
+    assert list(customer_repo.iter_customers()) == []
+
+
+def test_bulk_rejects_bad_chunk_size(customer_repo):
+    with pytest.raises(ValueError):
+        customer_repo.add_customers_bulk([], chunk_size=0)
+
+
+# ------------------------------------------------------
+# TEST: add_tests_bulk()
+# ------------------------------------------------------
+def test_add_glasses_tests_bulk(db_conn, customer_repo, make_customer):
+    customer_repo.add_customer(make_customer())
+    repo = GlassesRepo(db_conn)
+
+    ids = repo.add_tests_bulk((glasses_test(i) for i in range(10)), chunk_size=4)
+
+    assert ids == list(range(1, 11))
+    assert repo.get_test(10).r_axis == 9
+    assert repo.get_test(10).exam_date == datetime(2020, 1, 10)
+
+
+def test_add_contact_lenses_tests_bulk(db_conn, customer_repo, make_customer, make_test):
+    customer_repo.add_customer(make_customer())
+    repo = ContactLensesTestRepo(db_conn)
+
+    ids = repo.add_tests_bulk(make_test(l_lens_axis=10 * i) for i in range(5))
+
+    assert ids == [1, 2, 3, 4, 5]
+    assert repo.get_test(3).l_lens_axis == 20
+    assert repo.get_test(3).exam_date == datetime(2025, 2, 15)
+    assert repo.add_test(make_test()) == 6
+
+
+def test_bulk_inserted_tests_get_ids_and_start_clean(db_conn, customer_repo, make_customer, make_test):
+    customer_repo.add_customer(make_customer())
+    repo = ContactLensesTestRepo(db_conn)
+    tests = [make_test(l_lens_axis=10 * i) for i in range(3)]
+
+    repo.add_tests_bulk(tests)
+    tests[1].l_lens_axis = 90
+
+    assert [test.id for test in tests] == [1, 2, 3]
+    assert [test.changed_fields() for test in tests] == [(), ("l_lens_axis",), ()]
+    assert repo.update_test(tests[1]) is True
+    assert repo.get_test(2).l_lens_axis == 90
+
+
+def test_bulk_rows_with_different_null_columns(db_conn, customer_repo, make_customer):
+    customer_repo.add_customer(make_customer())
+    repo = GlassesRepo(db_conn)
+    tests = [
+        GlassesTest(id=None, customer_id=1, exam_date=datetime(2020, 1, 1), examiner=None if i % 3 else "Sanaa",
+                    notes="n" if i % 2 else None)
+        for i in range(7)
+    ]
+
+    ids = repo.add_tests_bulk(tests)
+
+    assert ids == list(range(1, 8))
+    assert [(repo.get_test(i).examiner, repo.get_test(i).notes) for i in (1, 2, 4)] == [
+        ("Sanaa", None), (None, "n"), ("Sanaa", "n")
+    ]
+
+
+def test_bulk_long_runs_between_mixed_rows_keep_input_order(db_conn, customer_repo, make_customer):
+    customer_repo.add_customer(make_customer())
+    repo = GlassesRepo(db_conn)
+    notes = ["n" if i % 2 else None for i in range(5)] + ["run"] * MIN_RUN + [None, "n", None]
+    tests = [GlassesTest(id=None, customer_id=1, exam_date=datetime(2020, 1, 1), notes=note) for note in notes]
+
+    ids = repo.add_tests_bulk(tests)
+
+    assert ids == list(range(1, len(notes) + 1))
+    assert [test.notes for test in repo.iter_glasses_tests(customer_id=1)] == notes
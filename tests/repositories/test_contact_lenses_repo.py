@@ -25,8 +25,8 @@ def test_list_tests_for_customer(repo, make_test):
     items = repo.list_tests_for_customer(1)
 
     assert len(items) == 2
-    assert items[0].exam_date == t2.exam_date.isoformat()
-    assert items[1].exam_date == t1.exam_date.isoformat()
+    assert items[0].exam_date == t2.exam_date
+    assert items[1].exam_date == t1.exam_date
 
 
 def test_list_tests_for_customer_validation(repo):
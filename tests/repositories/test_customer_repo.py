@@ -1,6 +1,7 @@
-import sqlite3
 import pytest
 
+from db.connection import create_connection
+from db.migrations import migrate
 from db.repositories.customer_repo import CustomerRepo
 
 
@@ -9,20 +10,8 @@ from db.repositories.customer_repo import CustomerRepo
 # -----------------------------------
 def create_test_connection():
     """Creates a fresh in-memory SQLite DB with schema for each test."""
-    conn = sqlite3.connect(":memory:")
-    conn.row_factory = sqlite3.Row
-
-    conn.executescript("""
-        CREATE TABLE customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ssn TEXT NOT NULL,
-            fname TEXT NOT NULL,
-            lname TEXT NOT NULL,
-            phone TEXT,
-            town TEXT,
-            notes TEXT
-        );
-    """)
+    conn = create_connection("memory")
+    migrate(conn)
 
     return conn
 
@@ -37,15 +26,8 @@ def repo():
 # TESTS
 # -----------------------------------
 
-def test_add_customer(repo):
-    c = repo.add_customer(
-        ssn="123",
-        fname="John",
-        lname="Doe",
-        phone="050123",
-        town="Haifa",
-        notes="Test note"
-    )
+def test_add_customer(repo, make_customer):
+    c = repo.add_customer(make_customer(tel_mobile="050123", town="Haifa", notes="Test note"))
 
     assert c.id == 1
     assert c.fname == "John"
@@ -60,20 +42,20 @@ def test_get_customer_not_found(repo):
     assert repo.get_customer(999) is None
 
 
-def test_get_customer_by_ssn(repo):
-    repo.add_customer("111", "Alice", "Smith")
-    repo.add_customer("222", "Bob", "Blue")
+def test_get_customer_by_ssn(repo, make_customer):
+    repo.add_customer(make_customer(ssn=111111111, fname="Alice", lname="Smith"))
+    repo.add_customer(make_customer(ssn=222222222, fname="Bob", lname="Blue"))
 
-    c = repo.get_customer_by_ssn("222")
+    c = repo.get_customer_by_ssn(222222222)
 
     assert c is not None
     assert c.fname == "Bob"
     assert c.lname == "Blue"
 
 
-def test_list_customers(repo):
-    repo.add_customer("111", "Alice", "Smith")
-    repo.add_customer("222", "Bob", "Blue")
+def test_list_customers(repo, make_customer):
+    repo.add_customer(make_customer(ssn=111111111, fname="Alice", lname="Smith"))
+    repo.add_customer(make_customer(ssn=222222222, fname="Bob", lname="Blue"))
 
     all_customers = repo.list_customers()
 
@@ -82,28 +64,28 @@ def test_list_customers(repo):
     assert all_customers[1].fname == "Bob"
 
 
-def test_search_by_name(repo):
-    repo.add_customer("111", "David", "Ben Abo")
-    repo.add_customer("222", "Davi", "Stone")
-    repo.add_customer("333", "Naseem", "Srour")
+def test_search_by_name(repo, make_customer):
+    repo.add_customer(make_customer(ssn=111111111, fname="David", lname="Ben Abo"))
+    repo.add_customer(make_customer(ssn=222222222, fname="Davi", lname="Stone"))
+    repo.add_customer(make_customer(ssn=333333333, fname="Naseem", lname="Srour"))
 
     results = repo.search_by_name("Dav")
 
     assert len(results) == 2
-    assert {c.ssn for c in results} == {"111", "222"}
+    assert {c.ssn for c in results} == {111111111, 222222222}
 
 
-def test_search_by_full_name(repo):
-    repo.add_customer("111", "David Ben", "Zeid")
-    repo.add_customer("222", "David", "Ben Zeid")
+def test_search_by_full_name(repo, make_customer):
+    repo.add_customer(make_customer(ssn=111111111, fname="David Ben", lname="Zeid"))
+    repo.add_customer(make_customer(ssn=222222222, fname="David", lname="Ben Zeid"))
 
     results = repo.search_by_name("Ben Zeid")
 
     assert len(results) == 2
 
 
-def test_update_customer(repo):
-    c = repo.add_customer("111", "Old", "Name")
+def test_update_customer(repo, make_customer):
+    c = repo.add_customer(make_customer(fname="Old", lname="Name"))
     c.fname = "New"
     c.lname = "Name"
 
@@ -114,8 +96,8 @@ def test_update_customer(repo):
     assert updated.fname == "New"
 
 
-def test_delete_customer(repo):
-    c = repo.add_customer("111", "John", "Doe")
+def test_delete_customer(repo, make_customer):
+    c = repo.add_customer(make_customer())
 
     ok = repo.delete_customer(c.id)
     assert ok is True
@@ -0,0 +1,86 @@
+import pytest
+
+from db.repositories.customer_repo import CustomerRepo, fts_prefix_query
+
+
+@pytest.fixture
+def repo(db_conn, make_customer):
+    repo = CustomerRepo(db_conn)
+    repo.add_customer(make_customer(ssn=111111111, fname="David", lname="Ben Abo", town="Haifa"))
+    repo.add_customer(make_customer(ssn=222222222, fname="Davi", lname="Stone", town="Nazareth"))
+    repo.add_customer(make_customer(ssn=333333333, fname="Naseem", lname="Srour", tel_mobile="0529876543"))
+    repo.add_customer(make_customer(ssn=444444444, fname="סאמר", lname="סרור", town="חיפה"))
+    repo.add_customer(make_customer(ssn=555555555, fname="José", lname="Müller"))
+    return repo
+
+
+# ------------------------------------------------------
+# TEST: prefix search across the indexed fields
+# ------------------------------------------------------
+def test_search_customers_prefix(repo):
+    results = repo.search_customers("Dav")
+
+    assert {c.ssn for c in results} == {111111111, 222222222}
+
+
+def test_search_customers_multiple_words(repo):
+    results = repo.search_customers("dav haifa")
+
+    assert [c.ssn for c in results] == [111111111]
+
+
+def test_search_customers_by_ssn_and_phone(repo):
+    assert [c.fname for c in repo.search_customers("3333")] == ["Naseem"]
+    assert [c.fname for c in repo.search_customers("0529876543")] == ["Naseem"]
+
+
+def test_search_customers_hebrew_and_diacritics(repo):
+    assert [c.ssn for c in repo.search_customers("סא")] == [444444444]
+    assert [c.ssn for c in repo.search_customers("סרור חיפה")] == [444444444]
+    assert [c.ssn for c in repo.search_customers("jose muller")] == [555555555]
+
+
+def test_search_customers_ranks_name_matches_first(repo, make_customer):
+    repo.add_customer(make_customer(ssn=666666666, fname="Moshe", lname="Cohen", town="Stonehenge"))
+
+    results = repo.search_customers("stone")
+
+    assert [c.ssn for c in results] == [222222222, 666666666]
+
+
+def test_search_customers_limit_and_empty(repo):
+    assert len(repo.search_customers("d", limit=1)) == 1
+    assert repo.search_customers("   ") == []
+
+
+def test_search_customers_quotes_user_input(repo):
+    assert repo.search_customers('Dav" OR "x') == []
+    assert repo.search_customers("NEAR(") == []
+
+
+# ------------------------------------------------------
+# TEST: FTS index follows updates and deletes
+# ------------------------------------------------------
+def test_search_follows_update_and_delete(repo):
+    david = repo.search_customers("david")[0]
+    david.fname = "Yosef"
+    repo.update_customer(david)
+
+    assert repo.search_customers("david") == []
+    assert [c.id for c in repo.search_customers("yosef")] == [david.id]
+
+    repo.delete_customer(david.id)
+    assert repo.search_customers("yosef") == []
+
+
+# ------------------------------------------------------
+# TEST: search_by_name only looks at names
+# ------------------------------------------------------
+def test_search_by_name_uses_names_only(repo):
+    assert {c.ssn for c in repo.search_by_name("Dav")} == {111111111, 222222222}
+    assert repo.search_by_name("haifa") == []
+
+
+def test_fts_prefix_query():
+    assert fts_prefix_query("ben zeid") == '"ben"* AND "zeid"*'
+    assert fts_prefix_query('a"b', columns=("fname",)) == '{fname} : ("a""b"*)'
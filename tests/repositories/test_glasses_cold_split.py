@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import pytest
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.models import GlassesTest
+from db.repositories.glasses_repo import GlassesRepo
+from db.statements import GLASSES_TEST_COLD_COLUMNS
+
+
+@pytest.fixture
+def glasses(glasses_repo):
+    glasses_repo.add_test(GlassesTest(id=None, customer_id=1, exam_date=datetime(2025, 2, 15), r_cylinder=-0.5,
+                                      r_axis=90, frame_model="RB3025", notes="first pair"))
+    return glasses_repo
+
+
+def columns_of(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def log_entries(conn):
+    return [tuple(row) for row in conn.execute("SELECT table_name, row_id, op FROM change_log WHERE table_name != 'customers'")]
+
+
+# ------------------------------------------------------
+# TEST: storage
+# ------------------------------------------------------
+def test_cold_columns_live_in_the_side_table(db_conn, glasses):
+    assert not columns_of(db_conn, "glasses_tests") & set(GLASSES_TEST_COLD_COLUMNS)
+    assert columns_of(db_conn, "glasses_tests_cold") == {"id", *GLASSES_TEST_COLD_COLUMNS}
+    rows = db_conn.execute("SELECT id, frame_model, notes FROM glasses_tests_cold").fetchall()
+    assert [tuple(row) for row in rows] == [(1, "RB3025", "first pair")]
+
+    test = glasses.get_test(1)
+    assert (test.r_axis, test.frame_model, test.notes) == (90, "RB3025", "first pair")
+
+
+def test_hot_reads_skip_the_cold_table(db_conn):
+    plan = db_conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT id, exam_date, r_sphere, r_axis FROM glasses_tests_full WHERE customer_id = ? ORDER BY exam_date DESC
+    """, (1,)).fetchall()
+
+    assert "glasses_tests_cold" not in " ".join(row["detail"] for row in plan)
+
+
+def test_bulk_insert_writes_a_cold_row_per_test(db_conn, glasses):
+    ids = glasses.add_tests_bulk(GlassesTest(id=None, customer_id=1, exam_date=datetime(2024, 1, i + 1),
+                                             notes="bulk" if i % 2 else None) for i in range(4))
+
+    rows = db_conn.execute(f"SELECT id, notes FROM glasses_tests_cold WHERE id IN ({', '.join('?' for _ in ids)})",
+                           ids).fetchall()
+    assert [tuple(row) for row in rows] == [(ids[0], None), (ids[1], "bulk"), (ids[2], None), (ids[3], "bulk")]
+
+
+def test_delete_removes_the_cold_row(db_conn, glasses):
+    glasses.delete_test(1)
+
+    assert db_conn.execute("SELECT count(*) FROM glasses_tests_cold").fetchone()[0] == 0
+
+
+# ------------------------------------------------------
+# TEST: edits
+# ------------------------------------------------------
+def test_cold_edit_is_logged_and_rechecked(db_conn, glasses):
+    db_conn.execute("DELETE FROM change_log")
+    db_conn.execute("DELETE FROM dq_dirty")
+    test = glasses.get_test(1)
+    test.notes = "second pair"
+
+    glasses.update_test(test)
+
+    assert glasses.get_test(1).notes == "second pair"
+    assert log_entries(db_conn) == [("glasses_tests", 1, "U")]
+    assert tuple(db_conn.execute("SELECT table_name, row_id FROM dq_dirty").fetchone()) == ("glasses_tests", 1)
+
+
+def test_hot_and_cold_edit_is_logged_once(db_conn, glasses):
+    db_conn.execute("DELETE FROM change_log")
+    test = glasses.get_test(1)
+    test.r_axis = 95
+    test.frame_model = "RB4165"
+
+    glasses.update_test(test)
+
+    assert log_entries(db_conn) == [("glasses_tests", 1, "U")]
+    stored = glasses.get_test(1)
+    assert (stored.r_axis, stored.frame_model) == (95, "RB4165")
+
+
+def test_exam_without_cold_row_gets_one_on_save(db_conn, glasses):
+    # inserted by plain SQL: no cold row (it reads as NULLs)
+    test_id = db_conn.execute("INSERT INTO glasses_tests (customer_id, exam_date) VALUES (1, '2020-01-01T00:00:00')").lastrowid
+    db_conn.execute("DELETE FROM change_log")
+    test = glasses.get_test(test_id)
+    assert test.notes is None
+
+    test.notes = "added later"
+    glasses.update_test(test)
+
+    assert glasses.get_test(test_id).notes == "added later"
+    assert log_entries(db_conn) == [("glasses_tests", test_id, "U")]
+
+
+# ------------------------------------------------------
+# TEST: migration of an existing database
+# ------------------------------------------------------
+def test_migration_moves_existing_rows():
+    conn = create_connection("memory")
+    migrate(conn, target=9)
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'Old', 'Row')")
+    conn.executemany("INSERT INTO glasses_tests (customer_id, exam_date, r_axis, frame_color, notes) VALUES (?, ?, ?, ?, ?)", [
+        (1, "2020-01-01T00:00:00", 10, "black", "kept"),
+        (1, "2021-01-01T00:00:00", 20, None, None),
+        (1, "2022-01-01T00:00:00", 30, None, "deleted"),
+    ])
+    conn.execute("DELETE FROM glasses_tests WHERE id = 3")
+    conn.commit()
+    log_size = conn.execute("SELECT count(*) FROM change_log").fetchone()[0]
+
+    assert migrate(conn, target=11) == [10, 11]
+
+    rows = conn.execute("SELECT id, r_axis, frame_color, notes FROM glasses_tests_full ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [(1, 10, "black", "kept"), (2, 20, None, None)]
+    assert conn.execute("SELECT count(*) FROM change_log").fetchone()[0] == log_size
+    # indexes and triggers survive the rebuild, and the ids of deleted exams are still not reused
+    assert conn.execute("SELECT count(*) FROM sqlite_master WHERE tbl_name = 'glasses_tests' AND type = 'trigger'").fetchone()[0] == 6
+    assert GlassesRepo(conn).add_test(GlassesTest(id=None, customer_id=1, exam_date=datetime(2023, 1, 1))).id == 4
+
+    close_connection(conn)
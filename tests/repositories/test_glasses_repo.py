@@ -1,7 +1,8 @@
-import sqlite3
 import pytest
 from datetime import datetime
 
+from db.connection import create_connection
+from db.migrations import migrate
 from db.models import GlassesTest
 from db.utils import datetime_to_text, text_to_datetime
 
@@ -12,64 +13,11 @@ from db.repositories.glasses_repo import GlassesRepo
 # Helper: create a fresh in-memory DB with schema
 # ------------------------------------------------------
 def setup_in_memory_db():
-    conn = sqlite3.connect(":memory:")
-    conn.row_factory = sqlite3.Row
-
-    conn.execute("""
-CREATE TABLE IF NOT EXISTS glasses_tests (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    customer_id INTEGER NOT NULL,
-    exam_date TEXT NOT NULL,
-    examiner TEXT,
-    r_fv_numerator INTEGER,
-    r_fv_denominator INTEGER,
-    r_sphere REAL,
-    r_cylinder REAL,
-    r_axis INTEGER,
-    r_prism REAL,
-    r_base TEXT,
-    r_va TEXT,
-    r_add_read REAL,
-    r_add_int REAL,
-    r_add_bif REAL,
-    r_add_mul REAL,
-    r_high REAL,
-    l_fv_numerator INTEGER,
-    l_fv_denominator INTEGER,
-    l_sphere REAL,
-    l_cylinder REAL,
-    l_axis INTEGER,
-    l_prism REAL,
-    l_base TEXT,
-    l_va TEXT,
-    l_add_read REAL,
-    l_add_int REAL,
-    l_add_bif REAL,
-    l_add_mul REAL,
-    l_high REAL,
-    pupil_distance REAL,
-    dominant_eye TEXT,
-    iop TEXT,
-    glasses_role TEXT,
-    lenses_material TEXT,
-    lenses_diameter REAL,
-    segment_diameter REAL,
-    lenses_manufacturer TEXT,
-    lenses_color TEXT,
-    catalog_num TEXT,
-    frame_manufacturer TEXT,
-    frame_supplier TEXT,
-    frame_model TEXT,
-    frame_size TEXT,
-    frame_bar_length TEXT,
-    frame_color TEXT,
-    diagnosis TEXT,
-    notes TEXT,
-
-    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
-    )
-    """)
+    conn = create_connection("memory")
+    migrate(conn)
 
+    # glasses_tests.customer_id is a foreign key: the sample tests belong to customer 1
+    conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 123456789, 'John', 'Doe')")
     conn.commit()
     return conn
 
@@ -87,8 +35,7 @@ def sample_test(customer_id=1):
         examiner="Dr. Smith",
 
         # --- Right Eye (OD) ---
-        r_fv_numerator=6,
-        r_fv_denominator=9,
+        r_fv="6/9",
         r_sphere=-2.25,
         r_cylinder=-1.00,
         r_axis=170,
@@ -102,8 +49,7 @@ def sample_test(customer_id=1):
         r_high=None,  # Unused or unknown field
 
         # --- Left Eye (OS) ---
-        l_fv_numerator=6,
-        l_fv_denominator=12,
+        l_fv="6/12",
         l_sphere=-1.75,
         l_cylinder=-0.50,
         l_axis=10,
@@ -117,12 +63,15 @@ def sample_test(customer_id=1):
         l_high=None,
 
         # --- Symptoms / Notes ---
-        pupil_distance=63.5,  # PD (usually 54–74mm)
+        r_pd=31.5,
+        l_pd=32.0,
+        sum_pd=63.5,  # PD (usually 54–74mm)
         dominant_eye="R",
-        iop="R: 15, L: 16 mmHg",  # Intraocular pressure
+        r_iop=15,  # Intraocular pressure, mmHg
+        l_iop=16,
         glasses_role="Distance",
         lenses_material="Polycarbonate",
-        lenses_diameter=70.0,  # mm
+        lenses_diameter_1=70.0,  # mm
         segment_diameter=28.0,  # mm
         lenses_manufacturer="Essilor",
         lenses_color="Clear",
@@ -158,7 +107,7 @@ def test_add_test():
     assert row is not None
     assert row["customer_id"] == 1
     assert row["examiner"] == "Dr. Smith"
-    assert row["r_sphere"] == -2.25
+    assert row["r_sphere"] == "-2.25"  # TEXT column: it also holds "Plano"
 
 
 # ------------------------------------------------------
@@ -173,7 +122,7 @@ def test_get_test():
 
     assert retrieved is not None
     assert retrieved.id == inserted.id
-    assert retrieved.exam_date == inserted.exam_date.isoformat()
+    assert retrieved.exam_date == inserted.exam_date
 
 
 # ------------------------------------------------------
@@ -278,7 +227,7 @@ def test_update_test():
     row = conn.execute("SELECT * FROM glasses_tests WHERE id=?", (test.id,)).fetchone()
 
     assert row["examiner"] == "Dr. Updated"
-    assert row["r_sphere"] == -2.00
+    assert row["r_sphere"] == "-2.0"
 
 
 # ------------------------------------------------------
@@ -0,0 +1,86 @@
+from datetime import datetime
+import pytest
+
+from db.mappers import CONTACT_LENSES_TEST_SUMMARY_SELECT, GLASSES_TEST_SUMMARY_SELECT
+from db.models import ContactLensesTest, GlassesTest, GlassesTestSummary
+
+
+@pytest.fixture
+def glasses(glasses_repo):
+    for year, axis in ((2023, 10), (2025, 30), (2024, 20)):
+        glasses_repo.add_test(GlassesTest(id=None, customer_id=1, exam_date=datetime(year, 1, 1), examiner=str(year),
+                                          r_cylinder=-0.5, r_axis=axis, glasses_role="Distance", notes=f"notes {year}"))
+    return glasses_repo
+
+
+def full_reads(db_conn):
+    """Counts the full-row reads (get_test) sent on db_conn."""
+    reads = []
+    db_conn.set_trace_callback(lambda sql: reads.append(sql) if "FROM glasses_tests_stored WHERE id" in sql else None)
+    return reads
+
+
+# ------------------------------------------------------
+# TEST: summaries
+# ------------------------------------------------------
+def test_summaries_are_newest_first(glasses):
+    summaries = glasses.list_test_summaries(1)
+
+    assert all(isinstance(s, GlassesTestSummary) for s in summaries)
+    assert [(s.exam_date.year, s.r_axis, s.glasses_role) for s in summaries] == [
+        (2025, 30, "Distance"), (2024, 20, "Distance"), (2023, 10, "Distance"),
+    ]
+    assert glasses.list_test_summaries(2) == []
+
+
+@pytest.mark.parametrize("table, columns", [
+    ("glasses_tests", GLASSES_TEST_SUMMARY_SELECT),
+    ("contact_lenses_tests", CONTACT_LENSES_TEST_SUMMARY_SELECT),
+])
+def test_summary_query_reads_only_the_index(db_conn, table, columns):
+    plan = db_conn.execute(f"""
+        EXPLAIN QUERY PLAN
+        SELECT {columns} FROM {table} WHERE customer_id = ? ORDER BY exam_date DESC
+    """, (1,)).fetchall()
+    details = " ".join(row["detail"] for row in plan)
+
+    assert f"COVERING INDEX idx_{table}_customer_date" in details
+    assert "TEMP B-TREE" not in details
+
+
+# ------------------------------------------------------
+# TEST: lazy details
+# ------------------------------------------------------
+def test_details_load_on_first_access_only(db_conn, glasses):
+    summaries = glasses.list_test_summaries(1)
+    reads = full_reads(db_conn)
+
+    assert summaries[0].examiner == "2025"  # a summary column: no read
+    assert reads == []
+
+    assert summaries[0].notes == "notes 2025"  # a detail column: loads the full test once
+    assert summaries[0].frame_model is None
+    assert len(reads) == 1
+    assert not hasattr(summaries[1], "_details")  # the other summaries stay unloaded
+
+    with pytest.raises(AttributeError):
+        summaries[0].no_such_field
+
+
+def test_opened_details_can_be_edited(glasses):
+    test = glasses.list_test_summaries(1)[0].details()
+    test.notes = "edited"
+    glasses.update_test(test)
+
+    assert glasses.get_test(test.id).notes == "edited"
+
+
+def test_contact_lenses_summaries(repo, make_test):
+    repo.add_test(make_test(exam_date=datetime(2024, 6, 1)))
+    repo.add_test(make_test(exam_date=datetime(2025, 6, 1), r_brand="Dailies"))
+
+    summaries = repo.list_test_summaries(1)
+
+    assert [s.exam_date for s in summaries] == [datetime(2025, 6, 1), datetime(2024, 6, 1)]
+    assert (summaries[0].l_lens_axis, summaries[0].r_brand) == (120, "Dailies")
+    assert isinstance(summaries[0].details(), ContactLensesTest)
@@ -0,0 +1,76 @@
+from datetime import datetime
+import tracemalloc
+import pytest
+
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+
+
+@pytest.fixture
+def customer_repo(db_conn, make_customer):
+    repo = CustomerRepo(db_conn)
+    for i in range(5):
+        repo.add_customer(make_customer(ssn=100000000 + i, town="Haifa" if i % 2 else "Akko"))
+    return repo
+
+
+# ------------------------------------------------------
+# TEST: iter_customers()
+# ------------------------------------------------------
+def test_iter_customers(customer_repo):
+    customers = customer_repo.iter_customers(batch_size=2)
+
+    assert not isinstance(customers, list)
+    assert [c.id for c in customers] == [1, 2, 3, 4, 5]
+
+
+def test_iter_customers_filters(customer_repo):
+    assert [c.id for c in customer_repo.iter_customers(town="Haifa")] == [2, 4]
+    assert [c.id for c in customer_repo.iter_customers(after_id=3)] == [4, 5]
+
+    with pytest.raises(ValueError):
+        list(customer_repo.iter_customers(batch_size=0))
+
+
+def test_iter_customers_memory_is_flat(db_conn):
+    db_conn.executemany(
+        "INSERT INTO customers (ssn, fname, lname, notes) VALUES (?, ?, ?, ?)",
+        ((100000000 + i, "First", "Last", "x" * 200) for i in range(20000))
+    )
+    repo = CustomerRepo(db_conn)
+
+    tracemalloc.start()
+    count = sum(1 for _ in repo.iter_customers(batch_size=100))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count == 20000
+    assert peak < 1_000_000  # a full list of 20k customers takes many MB
+
+
+# ------------------------------------------------------
+# TEST: exam iterators
+# ------------------------------------------------------
+def test_iter_glasses_tests(db_conn, customer_repo):
+    repo = GlassesRepo(db_conn)
+    for customer_id, year in [(1, 2023), (2, 2024), (1, 2025)]:
+        repo.add_test(GlassesTest(id=None, customer_id=customer_id, exam_date=datetime(year, 3, 1)))
+
+    assert [t.id for t in repo.iter_glasses_tests(batch_size=1)] == [1, 2, 3]
+    assert [t.id for t in repo.iter_glasses_tests(customer_id=1)] == [1, 3]
+    assert [t.id for t in repo.iter_glasses_tests(since=datetime(2024, 1, 1))] == [2, 3]
+    assert [t.id for t in repo.iter_glasses_tests(until=datetime(2024, 3, 1))] == [1, 2]
+    assert all(isinstance(t.exam_date, datetime) for t in repo.iter_glasses_tests())
+
+
+def test_iter_contact_lenses_tests_pipeline(db_conn, customer_repo, make_test):
+    repo = ContactLensesTestRepo(db_conn)
+    for customer_id in (1, 2, 2):
+        repo.add_test(make_test(customer_id=customer_id))
+
+    # Iterators chain like any generator pipeline
+    brands = (t.l_brand for t in repo.iter_contact_lenses_tests(customer_id=2))
+
+    assert list(brands) == ["Air Optix", "Air Optix"]
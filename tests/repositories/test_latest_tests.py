@@ -0,0 +1,100 @@
+from datetime import datetime
+import pytest
+
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+
+
+@pytest.fixture
+def customers(db_conn, make_customer):
+    repo = CustomerRepo(db_conn)
+    return [repo.add_customer(make_customer(ssn=100000000 + i)).id for i in range(3)]
+
+
+def add_glasses(repo, customer_id, *dates):
+    for d in dates:
+        repo.add_test(GlassesTest(id=None, customer_id=customer_id, exam_date=d, examiner=str(d.year)))
+
+
+# ------------------------------------------------------
+# TEST: get_latest_test() reads one row
+# ------------------------------------------------------
+def test_glasses_get_latest_test(db_conn, customers):
+    repo = GlassesRepo(db_conn)
+    add_glasses(repo, customers[0], datetime(2023, 1, 1), datetime(2025, 1, 1), datetime(2024, 1, 1))
+
+    latest = repo.get_latest_test(customers[0])
+
+    assert latest.exam_date == datetime(2025, 1, 1)
+    assert repo.get_latest_test(customers[1]) is None
+
+
+def test_latest_query_plan_uses_index(db_conn):
+    plan = db_conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT * FROM glasses_tests WHERE customer_id = ? ORDER BY exam_date DESC, id DESC LIMIT 1
+    """, (1,)).fetchall()
+    details = " ".join(row["detail"] for row in plan)
+
+    assert "idx_glasses_tests_customer_date" in details
+    assert "TEMP B-TREE FOR ORDER BY" not in details  # only exams sharing the newest date are sorted, by id
+
+
+def test_lenses_get_latest_test(db_conn, customers, make_test):
+    repo = ContactLensesTestRepo(db_conn)
+    repo.add_test(make_test(customer_id=customers[0], exam_date=datetime(2024, 6, 1)))
+    repo.add_test(make_test(customer_id=customers[0], exam_date=datetime(2025, 6, 1)))
+
+    assert repo.get_latest_test(customers[0]).exam_date == datetime(2025, 6, 1)
+    assert repo.get_latest_test(customers[2]) is None
+
+
+def test_latest_test_on_a_shared_date_is_the_last_saved(db_conn, customers, make_test):
+    glasses = GlassesRepo(db_conn)
+    add_glasses(glasses, customers[0], datetime(2025, 1, 1), datetime(2025, 1, 1), datetime(2024, 1, 1))
+    lenses = ContactLensesTestRepo(db_conn)
+    for examiner in ("first", "second"):
+        lenses.add_test(make_test(customer_id=customers[0], exam_date=datetime(2025, 6, 1), examiner=examiner))
+
+    assert glasses.get_latest_test(customers[0]).id == 2
+    assert glasses.latest_tests_for_customers(customers)[customers[0]].id == 2
+    assert lenses.get_latest_test(customers[0]).examiner == "second"
+    assert lenses.latest_tests_for_customers(customers)[customers[0]].examiner == "second"
+
+
+def test_get_latest_test_validation(db_conn):
+    with pytest.raises(TypeError):
+        GlassesRepo(db_conn).get_latest_test("1")
+    with pytest.raises(ValueError):
+        ContactLensesTestRepo(db_conn).get_latest_test(0)
+
+
+# ------------------------------------------------------
+# TEST: batched latest exam for many customers
+# ------------------------------------------------------
+def test_glasses_latest_tests_for_customers(db_conn, customers):
+    repo = GlassesRepo(db_conn)
+    add_glasses(repo, customers[0], datetime(2023, 1, 1), datetime(2025, 1, 1))
+    add_glasses(repo, customers[1], datetime(2022, 5, 5))
+
+    latest = repo.latest_tests_for_customers(customers)
+
+    assert set(latest) == {customers[0], customers[1]}
+    assert latest[customers[0]].exam_date == datetime(2025, 1, 1)
+    assert latest[customers[1]].exam_date == datetime(2022, 5, 5)
+
+
+def test_lenses_latest_tests_for_many_customers(db_conn, make_customer, make_test):
+    customer_repo = CustomerRepo(db_conn)
+    repo = ContactLensesTestRepo(db_conn)
+    ids = [customer_repo.add_customer(make_customer(ssn=200000000 + i)).id for i in range(1200)]
+    for customer_id in ids:
+        repo.add_test(make_test(customer_id=customer_id, exam_date=datetime(2024, 1, 1)))
+        repo.add_test(make_test(customer_id=customer_id, exam_date=datetime(2025, 1, 1), examiner="newest"))
+
+    latest = repo.latest_tests_for_customers(ids + ids[:10])  # spans several chunks, duplicates ignored
+
+    assert len(latest) == 1200
+    assert all(t.examiner == "newest" for t in latest.values())
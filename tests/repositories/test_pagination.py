@@ -0,0 +1,96 @@
+from datetime import datetime
+import pytest
+
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+
+
+def collect_pages(fetch, **kwargs):
+    """Follows next_token until the last page; returns the list of pages."""
+    pages = [fetch(**kwargs)]
+    while pages[-1].next_token:
+        pages.append(fetch(after=pages[-1].next_token, **kwargs))
+    return pages
+
+
+@pytest.fixture
+def customer_repo(db_conn, make_customer):
+    repo = CustomerRepo(db_conn)
+    for i, lname in enumerate(["Levi", "Cohen", "Srour", "Cohen", "Abu", "Zeid", "Levi"]):
+        repo.add_customer(make_customer(ssn=100000000 + i, lname=lname))
+    return repo
+
+
+# ------------------------------------------------------
+# TEST: customers by id
+# ------------------------------------------------------
+def test_list_customers_page_by_id(customer_repo):
+    pages = collect_pages(customer_repo.list_customers_page, limit=3)
+
+    assert [len(p.items) for p in pages] == [3, 3, 1]
+    assert [c.id for p in pages for c in p.items] == list(range(1, 8))
+    assert pages[-1].next_token is None and not pages[-1].has_more
+
+
+def test_list_customers_page_exact_fit(customer_repo):
+    pages = collect_pages(customer_repo.list_customers_page, limit=7)
+
+    assert len(pages) == 1
+    assert len(pages[0].items) == 7
+
+
+# ------------------------------------------------------
+# TEST: customers by last name (ties broken by id)
+# ------------------------------------------------------
+def test_list_customers_page_by_lname(customer_repo):
+    pages = collect_pages(customer_repo.list_customers_page, limit=2, order_by="lname")
+    customers = [c for p in pages for c in p.items]
+
+    assert [c.lname for c in customers] == ["Abu", "Cohen", "Cohen", "Levi", "Levi", "Srour", "Zeid"]
+    assert [c.id for c in customers if c.lname == "Levi"] == [1, 7]
+
+
+def test_list_customers_page_invalid_arguments(customer_repo):
+    with pytest.raises(ValueError):
+        customer_repo.list_customers_page(order_by="notes")
+    with pytest.raises(ValueError):
+        customer_repo.list_customers_page(limit=0)
+    with pytest.raises(ValueError):
+        customer_repo.list_customers_page(after="garbage!")
+
+    token = customer_repo.list_customers_page(limit=1).next_token
+    with pytest.raises(ValueError):
+        customer_repo.list_customers_page(after=token, order_by="lname")
+
+
+# ------------------------------------------------------
+# TEST: exam histories
+# ------------------------------------------------------
+def test_glasses_history_pages(db_conn, customer_repo):
+    repo = GlassesRepo(db_conn)
+    dates = [datetime(2025, 1, 1), datetime(2024, 1, 1), datetime(2025, 1, 1), datetime(2023, 1, 1), datetime(2025, 6, 1)]
+    for d in dates:
+        repo.add_test(GlassesTest(id=None, customer_id=1, exam_date=d))
+    repo.add_test(GlassesTest(id=None, customer_id=2, exam_date=datetime(2025, 1, 1)))
+
+    pages = collect_pages(repo.list_tests_page, customer_id=1, limit=2)
+    tests = [t for p in pages for t in p.items]
+
+    assert [t.exam_date for t in tests] == sorted(dates, reverse=True)
+    assert [t.id for t in tests] == [5, 1, 3, 2, 4]
+
+
+def test_lenses_history_pages(db_conn, customer_repo, make_test):
+    repo = ContactLensesTestRepo(db_conn)
+    for year in (2021, 2022, 2023):
+        repo.add_test(make_test(customer_id=3, exam_date=datetime(year, 1, 1)))
+
+    pages = collect_pages(repo.list_tests_page, customer_id=3, limit=2)
+
+    assert [len(p.items) for p in pages] == [2, 1]
+    assert pages[1].items[0].exam_date == datetime(2021, 1, 1)
+
+    with pytest.raises(ValueError):
+        repo.list_tests_page(customer_id=4, after=pages[0].next_token)
@@ -0,0 +1,183 @@
+import asyncio
+import inspect
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db.connection import create_connection
+from db.migrations import migrate
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from services.async_customer_service import AsyncCustomerService, MIRRORED_METHODS, PURE_METHODS, WRITE_METHODS
+from services.customer_service import CustomerService
+
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+
+
+def memory_service():
+    conn = create_connection("memory")
+    migrate(conn)
+    return CustomerService(CustomerRepo(conn), GlassesRepo(conn), ContactLensesTestRepo(conn))
+
+
+def run(scenario):
+    """Runs scenario(service) on a fresh event loop with an in-memory database."""
+    async def main():
+        service = AsyncCustomerService(memory_service)
+        try:
+            return await scenario(service)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def slow_read(service):
+    return service.cus_repo.conn.execute(SLOW_QUERY).fetchone()
+
+
+# ------------------------------------------------------
+# TEST: mirroring
+# ------------------------------------------------------
+def test_every_public_method_is_mirrored_as_a_coroutine():
+    public = {name for name in dir(CustomerService) if not name.startswith("_") and name != "transaction"}
+    assert set(MIRRORED_METHODS) == public - PURE_METHODS
+    assert all(inspect.iscoroutinefunction(getattr(AsyncCustomerService, name)) for name in MIRRORED_METHODS)
+    assert not any(inspect.iscoroutinefunction(getattr(AsyncCustomerService, name)) for name in PURE_METHODS)
+    assert {"add_customer", "update_glasses_test", "delete_contact_lenses_test"} <= WRITE_METHODS
+    assert "search_customers" not in WRITE_METHODS
+
+
+def test_calls_run_on_the_database_thread(make_customer):
+    async def scenario(service):
+        customer = make_customer()
+        data = {name: getattr(customer, name) for name in customer.__slots__}
+        added = await service.add_customer(data)
+        found = await service.get_customer_by_ssn("123456789")
+        thread = await service.run(lambda s: threading.get_ident())
+        return added, found, thread
+
+    added, found, thread = run(scenario)
+    assert found.id == added.id == 1
+    assert thread != threading.get_ident()
+
+
+def test_field_checks_do_not_wait_for_the_database():
+    async def scenario(service):
+        task = asyncio.ensure_future(service.run(slow_read, interruptible=True))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        violations = service.check_glasses_field("r_axis", 200)  # while the database thread is busy
+        elapsed = time.perf_counter() - started
+        valid = service.report_violations([])
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return violations, valid, elapsed
+
+    violations, valid, elapsed = run(scenario)
+    assert [v.field for v in violations] == ["r_axis"]
+    assert valid is True
+    assert elapsed < 0.05
+
+
+# ------------------------------------------------------
+# TEST: cancellation
+# ------------------------------------------------------
+def test_cancelling_a_running_read_interrupts_it():
+    async def scenario(service):
+        task = asyncio.ensure_future(service.run(slow_read, interruptible=True))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the next call only starts once the interrupted query has stopped
+        assert await service.customer_exists(1) is False
+        return time.perf_counter() - started, service.interrupts
+
+    elapsed, interrupts = run(scenario)
+    assert elapsed < 1 and interrupts == 1
+
+
+def test_queued_call_is_dropped_when_cancelled():
+    ran = []
+
+    async def scenario(service):
+        first = asyncio.ensure_future(service.run(lambda s: time.sleep(0.1)))
+        queued = asyncio.ensure_future(service.run(lambda s: ran.append(1)))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        await first
+        return service.interrupts
+
+    assert run(scenario) == 0
+    assert ran == []
+
+
+def test_writes_are_not_interrupted():
+    async def scenario(service):
+        started = threading.Event()
+
+        def slow_write(s):
+            started.set()
+            s.cus_repo.conn.execute(SLOW_QUERY.replace("FROM n)", "FROM n WHERE i < 300000)"))
+            s.cus_repo.conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (123456789, 'A', 'B')")
+            s.cus_repo.conn.commit()
+
+        task = asyncio.ensure_future(service.run(slow_write))
+        while not started.is_set():  # cancel it once it runs, not while it is still queued
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await service.customer_exists(1), service.interrupts
+
+    assert run(scenario) == (True, 0)
+
+
+def test_latest_cancels_the_previous_call():
+    async def scenario(service):
+        stale = asyncio.ensure_future(service.latest("search", service.run(slow_read, interruptible=True)))
+        await asyncio.sleep(0.05)
+        fresh = await service.latest("search", service.search_customers("nobody"))
+        with pytest.raises(asyncio.CancelledError):
+            await stale
+        return fresh, service.interrupts
+
+    assert run(scenario) == ([], 1)
+
+
+# ------------------------------------------------------
+# TEST: the event loop stays responsive
+# ------------------------------------------------------
+def test_event_loop_is_not_blocked_by_a_slow_query():
+    async def scenario(service):
+        task = asyncio.ensure_future(service.run(slow_read, interruptible=True))
+        worst = 0
+        for _ in range(20):
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst = max(worst, time.perf_counter() - started - 0.005)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return worst
+
+    assert run(scenario) < 0.016  # one frame at 60 fps
+
+
+def test_failed_open_is_reported_on_every_call():
+    def broken():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    async def scenario():
+        service = AsyncCustomerService(broken)
+        for _ in range(2):
+            with pytest.raises(sqlite3.OperationalError):
+                await service.customer_exists(1)
+        await service.close()
+
+    asyncio.run(scenario())
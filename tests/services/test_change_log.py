@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import pytest
+
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.models import GlassesTest
+from services.change_log import ChangeLog, DELETE, UPSERT
+
+
+@pytest.fixture
+def customer_repo(db_conn):
+    return CustomerRepo(db_conn)
+
+
+@pytest.fixture
+def change_log(db_conn):
+    return ChangeLog(db_conn)
+
+
+def summary(change_set):
+    return [(c.table, c.row_id, c.op) for c in change_set.changes]
+
+
+# ------------------------------------------------------
+# TEST: capture
+# ------------------------------------------------------
+def test_triggers_log_every_write(db_conn, customer_repo, make_customer):
+    customer = customer_repo.add_customer(make_customer())
+    customer.fname = "Jane"
+    customer_repo.update_customer(customer)
+    customer_repo.delete_customer(customer.id)
+
+    assert [tuple(r) for r in db_conn.execute("SELECT seq, table_name, row_id, op FROM change_log")] == [
+        (1, "customers", 1, "I"), (2, "customers", 1, "U"), (3, "customers", 1, "D"),
+    ]
+
+
+def test_cascaded_exam_deletes_are_logged(db_conn, customer_repo, make_customer):
+    customer_repo.add_customer(make_customer())
+    GlassesRepo(db_conn).add_tests_bulk(GlassesTest(id=None, customer_id=1, exam_date=datetime(2020, 1, 1)) for _ in range(2))
+    seq = ChangeLog(db_conn).latest_seq()
+
+    customer_repo.delete_customer(1)
+
+    assert sorted(summary(ChangeLog(db_conn).changes_since(seq))) == [
+        ("customers", 1, DELETE), ("glasses_tests", 1, DELETE), ("glasses_tests", 2, DELETE),
+    ]
+
+
+# ------------------------------------------------------
+# TEST: changes_since()
+# ------------------------------------------------------
+def test_repeated_updates_collapse_to_current_values(customer_repo, change_log, make_customer):
+    customer = customer_repo.add_customer(make_customer())
+    for name in ("A", "B", "C"):
+        customer.fname = name
+        customer_repo.update_customer(customer)
+
+    changes = change_log.changes_since(0)
+
+    assert summary(changes) == [("customers", 1, UPSERT)]
+    assert changes.changes[0].row["fname"] == "C"
+    assert changes.last_seq == change_log.latest_seq() == 4
+    assert not changes.has_more
+    assert change_log.changes_since(changes.last_seq).changes == []
+
+
+def test_deletes_are_tombstoned_unless_created_after_cursor(customer_repo, change_log, make_customer):
+    customer_repo.add_customer(make_customer(ssn=100000001))
+    cursor = change_log.latest_seq()
+    customer_repo.add_customer(make_customer(ssn=100000002))
+    customer_repo.delete_customer(1)
+    customer_repo.delete_customer(2)
+
+    changes = change_log.changes_since(cursor)
+
+    assert summary(changes) == [("customers", 1, DELETE)]
+    assert changes.changes[0].row is None
+    assert changes.last_seq == change_log.latest_seq()
+
+
+def test_row_deleted_after_the_page_is_tombstoned(customer_repo, change_log, make_customer):
+    customer = customer_repo.add_customer(make_customer(ssn=100000001))
+    cursor = change_log.latest_seq()
+    customer.fname = "Jane"
+    customer_repo.update_customer(customer)
+    customer_repo.add_customer(make_customer(ssn=100000002))
+    customer_repo.delete_customer(1)
+
+    page = change_log.changes_since(cursor, limit=1)  # only the update: the delete is on a later page
+
+    assert summary(page) == [("customers", 1, DELETE)]
+    assert page.changes[0].row is None
+    assert page.has_more
+    # the client never had a row created after its cursor: nothing to send
+    assert change_log.changes_since(0, limit=1).changes == []
+
+
+def test_paging_with_limit(customer_repo, change_log, make_customer):
+    for i in range(5):
+        customer_repo.add_customer(make_customer(ssn=100000000 + i))
+    first = customer_repo.get_customer_by_ssn(100000000)
+    first.lname = "Updated"
+    customer_repo.update_customer(first)
+
+    pages, cursor = [], 0
+    while True:
+        page = change_log.changes_since(cursor, limit=2)  # 2 log entries per page
+        pages.append([c.row_id for c in page.changes])
+        cursor = page.last_seq
+        if not page.has_more:
+            break
+
+    assert pages == [[1, 2], [3, 4], [5, 1]]  # the update comes after the 5 inserts
+
+
+def test_bad_limit(change_log):
+    with pytest.raises(ValueError):
+        change_log.changes_since(0, limit=0)
+
+
+# ------------------------------------------------------
+# TEST: compact()
+# ------------------------------------------------------
+def test_compact_keeps_one_entry_per_row(customer_repo, change_log, make_customer):
+    for i in range(3):
+        customer_repo.add_customer(make_customer(ssn=100000000 + i))
+    customer = customer_repo.get_customer_by_ssn(100000000)
+    customer.fname = "Jane"
+    customer_repo.update_customer(customer)
+    customer_repo.delete_customer(2)
+    before = [summary(change_log.changes_since(seq)) for seq in range(change_log.latest_seq() + 1)]
+
+    assert change_log.compact() == 2
+
+    # every cursor sees the same upserts; at worst it also gets a tombstone for a row it never had
+    after = [summary(change_log.changes_since(seq)) for seq in range(change_log.latest_seq() + 1)]
+    for seq, (old, new) in enumerate(zip(before, after)):
+        assert set(old) <= set(new), seq
+        assert set(new) - set(old) <= {("customers", 2, DELETE)}, seq
+    assert after[4:] == before[4:]
@@ -0,0 +1,104 @@
+import pytest
+
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from services.customer_cache import CustomerCache
+from services.customer_service import CustomerService
+
+
+@pytest.fixture
+def service(db_conn):
+    return CustomerService(CustomerRepo(db_conn), GlassesRepo(db_conn), ContactLensesTestRepo(db_conn), cache_size=2)
+
+
+@pytest.fixture
+def queries(db_conn):
+    """Records the SELECTs sent to the database (FTS5 bookkeeping excluded)."""
+    statements = []
+    db_conn.set_trace_callback(lambda sql: statements.append(sql) if "SELECT" in sql and "_fts" not in sql else None)
+    return statements
+
+
+# ------------------------------------------------------
+# TEST: CustomerCache on its own
+# ------------------------------------------------------
+def test_cache_lru_eviction(make_customer):
+    cache = CustomerCache(maxsize=2)
+    for i in (1, 2, 3):
+        cache.put(make_customer(id=i, ssn=100000000 + i))
+
+    assert cache.get(1) is None
+    assert cache.get_by_ssn(100000001) is None
+    assert cache.get(2).id == 2
+    assert cache.get_by_ssn("100000003").id == 3
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_returns_copies(make_customer):
+    cache = CustomerCache()
+    cache.put(make_customer(id=1))
+
+    cache.get(1).fname = "Edited but not saved"
+
+    assert cache.get(1).fname == "John"
+
+
+# ------------------------------------------------------
+# TEST: read-through + invalidation in the service
+# ------------------------------------------------------
+def test_get_customer_is_read_through(service, make_customer, queries):
+    customer = service.cus_repo.add_customer(make_customer())
+
+    service.get_customer(customer.id)
+    service.get_customer(customer.id)
+    service.get_customer_by_ssn("123456789")
+
+    assert len(queries) == 1
+    assert service.customer_cache_stats()["hits"] == 2
+
+
+def test_update_and_delete_invalidate(service, make_customer):
+    customer = service.cus_repo.add_customer(make_customer())
+    service.get_customer(customer.id)
+
+    customer.fname = "Jane"
+    customer.ssn = 987654321
+    service.update_customer(customer)
+
+    assert service.get_customer(customer.id).fname == "Jane"
+    assert service.get_customer_by_ssn("123456789") is None
+
+    service.delete_customer(customer.id)
+    assert service.get_customer(customer.id) is None
+
+
+def test_rolled_back_reads_are_not_cached(service, make_customer):
+    customer = service.cus_repo.add_customer(make_customer())
+
+    with pytest.raises(RuntimeError):
+        with service.transaction():
+            customer.fname = "Uncommitted"
+            service.update_customer(customer)
+            assert service.get_customer(customer.id).fname == "Uncommitted"
+            raise RuntimeError("rollback")
+
+    assert service.get_customer(customer.id).fname == "John"
+
+
+# ------------------------------------------------------
+# TEST: existence checks don't read the row
+# ------------------------------------------------------
+def test_customer_exists_uses_exists_query(service, make_customer, queries):
+    customer = service.cus_repo.add_customer(make_customer())
+
+    assert service.validate_customer_exists(customer.id)
+    assert not service.validate_customer_exists(999)
+
+    assert all("EXISTS" in sql for sql in queries)
+
+    service.get_customer(customer.id)
+    queries.clear()
+    assert service.customer_exists(customer.id)
+    assert queries == []
@@ -0,0 +1,139 @@
+import pytest
+
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from services.customer_service import CustomerService
+from services.data_quality import DataQualityScanner, field_rule_sql
+from services.validation import GLASSES_TEST_VALIDATOR, FieldRule
+
+
+@pytest.fixture
+def scanner(db_conn):
+    db_conn.execute("INSERT INTO customers (id, ssn, fname, lname) VALUES (1, 111111111, 'A', 'A'), (2, 222222222, 'B', 'B')")
+    db_conn.commit()
+    return DataQualityScanner(db_conn)
+
+
+def add_glasses(conn, customer_id=1, **columns):
+    columns = {"customer_id": customer_id, "exam_date": "2025-02-15T00:00:00", **columns}
+    names = ", ".join(columns)
+    marks = ", ".join("?" for _ in columns)
+    cursor = conn.execute(f"INSERT INTO glasses_tests ({names}) VALUES ({marks})", tuple(columns.values()))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def rules_of(scanner, customer_id):
+    return {(v["field"], v["rule"]) for v in scanner.violations_for_customer(customer_id)}
+
+
+# ------------------------------------------------------
+# TEST: rule -> SQL translation
+# ------------------------------------------------------
+@pytest.mark.parametrize("value, code", [
+    (-2.25, None), ("plano", None), (None, None), ("", None),
+    (-2.3, "step"), ("abc", "not_numeric"), ("-2.25", "stored_as_text"), (40, "out_of_range"),
+])
+def test_field_rule_sql(db_conn, value, code):
+    rule = FieldRule("v", max=30, step=0.25, allow=frozenset({"PLANO"}))
+    assert db_conn.execute(f"SELECT {field_rule_sql(rule)} FROM (SELECT ? AS v)", (value,)).fetchone()[0] == code
+
+
+def test_numbers_in_a_text_column_are_not_reported(db_conn):
+    rule = FieldRule("v", max=30, step=0.25, allow=frozenset({"PLANO"}))
+    sql = f"SELECT {field_rule_sql(rule, text_column=True)} FROM (SELECT ? AS v)"
+    assert db_conn.execute(sql, ("-2.25",)).fetchone()[0] is None
+    assert db_conn.execute(sql, ("-2.3",)).fetchone()[0] == "step"
+
+
+# ------------------------------------------------------
+# TEST: scanning
+# ------------------------------------------------------
+def test_full_scan_finds_legacy_violations(scanner, db_conn):
+    add_glasses(db_conn, 1, r_cylinder=None, r_axis=90, l_prism=None, l_base="BU", l_sphere=-1.3)
+    add_glasses(db_conn, 2, r_sphere="-2.25", r_cylinder=-1.0, r_axis=170)
+
+    result = scanner.scan()
+
+    assert result["glasses_tests"]["full"] is True
+    assert rules_of(scanner, 1) == {
+        ("r_axis", "axis_without_cylinder"), ("l_base", "base_without_prism"), ("l_sphere", "step"),
+    }
+    assert rules_of(scanner, 2) == set()  # r_sphere is a TEXT column: "-2.25" is how it stores a number
+
+
+def test_exam_saved_by_the_app_has_no_violations(scanner, db_conn):
+    service = CustomerService(CustomerRepo(db_conn), GlassesRepo(db_conn), ContactLensesTestRepo(db_conn))
+    data = dict.fromkeys(GLASSES_TEST_VALIDATOR.fields)
+    data.update(id=None, customer_id=1, exam_date="15/02/2025", examiner="Dr. Smith", r_sphere=-2.25, l_sphere="Plano",
+                r_cylinder=-1.0, r_axis=170)
+    assert service.add_glasses_test(1, data)
+
+    assert scanner.scan()["glasses_tests"]["violations"] == 0
+
+
+def test_rules_past_one_bitmask_are_scanned(scanner, db_conn, monkeypatch):
+    monkeypatch.setattr("services.data_quality.MASK_BITS", 3)  # every table's rules span many mask columns
+    add_glasses(db_conn, 1, r_cylinder=None, r_axis=90, l_prism=None, l_base="BU", l_sphere=-1.3, r_pd=31, l_pd=31, sum_pd=70)
+
+    assert scanner.scan()["glasses_tests"]["violations"] == 4
+    assert rules_of(scanner, 1) == {
+        ("r_axis", "axis_without_cylinder"), ("l_base", "base_without_prism"), ("l_sphere", "step"),
+        ("sum_pd", "pd_sum_mismatch"),
+    }
+
+
+def test_reports_grouped_by_rule_and_customer(scanner, db_conn):
+    add_glasses(db_conn, 1, r_cylinder=None, r_axis=90)
+    add_glasses(db_conn, 1, r_cylinder=None, r_axis=80)
+    add_glasses(db_conn, 2, r_cylinder=None, r_axis=70)
+    scanner.scan()
+
+    by_rule = scanner.summary_by_rule()
+    assert by_rule[0]["rule"] == "axis_without_cylinder"
+    assert (by_rule[0]["violations"], by_rule[0]["customers"]) == (3, 2)
+
+    by_customer = scanner.summary_by_customer()
+    assert [(c["customer_id"], c["violations"]) for c in by_customer] == [(1, 2), (2, 1)]
+    assert "axis given without cylinder" in scanner.format_report()
+
+
+def test_incremental_scan_rechecks_only_changed_rows(scanner, db_conn):
+    fixed = add_glasses(db_conn, 1, r_cylinder=None, r_axis=90)
+    add_glasses(db_conn, 2, r_cylinder=None, r_axis=70)
+    scanner.scan()
+
+    db_conn.execute("UPDATE glasses_tests SET r_axis = NULL WHERE id = ?", (fixed,))
+    add_glasses(db_conn, 2, r_prism=1.0)
+    db_conn.commit()
+    result = scanner.scan()["glasses_tests"]
+
+    assert (result["full"], result["rows_checked"]) == (False, 2)
+    assert rules_of(scanner, 1) == set()
+    assert rules_of(scanner, 2) == {("r_axis", "axis_without_cylinder"), ("r_base", "prism_without_base")}
+
+
+def test_deleted_rows_drop_their_violations(scanner, db_conn):
+    test_id = add_glasses(db_conn, 1, r_cylinder=None, r_axis=90)
+    scanner.scan()
+
+    db_conn.execute("DELETE FROM glasses_tests WHERE id = ?", (test_id,))
+    db_conn.commit()
+    scanner.scan()
+
+    assert scanner.violations_for_customer(1) == []
+
+
+def test_valid_rows_have_no_violations(scanner, db_conn):
+    add_glasses(db_conn, 1, r_sphere="Plano", l_sphere=-1.75, l_cylinder=-0.5, l_axis=10, r_va="6/7.5", r_fv="FC")
+    db_conn.execute(
+        "INSERT INTO contact_lenses_tests (customer_id, exam_date, r_diameter, l_lens_cyl, l_lens_axis, r_rH) "
+        "VALUES (1, '2025-02-15T00:00:00', 14.1, -0.75, 120, 7.8)"
+    )
+    db_conn.commit()
+
+    assert scanner.scan() == {
+        "glasses_tests": {"full": True, "rows_checked": 1, "violations": 0},
+        "contact_lenses_tests": {"full": True, "rows_checked": 1, "violations": 0},
+    }
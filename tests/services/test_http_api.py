@@ -0,0 +1,159 @@
+import asyncio
+import gzip
+import http.client
+import json
+import threading
+from datetime import datetime
+
+import pytest
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.models import GlassesTest
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from db.transaction import transaction
+from services.http_api import ApiHandler, ApiServer
+
+
+@pytest.fixture
+def writer(tmp_path, make_customer):
+    """The front-desk connection, on a database file the API opens read-only."""
+    conn = create_connection("writer", path=str(tmp_path / "api.db"))
+    migrate(conn)
+    customers = CustomerRepo(conn)
+    for i in range(3):
+        customers.add_customer(make_customer(ssn=100000000 + i, fname=f"First{i}", notes="x" * 300))
+    GlassesRepo(conn).add_tests_bulk(
+        GlassesTest(id=None, customer_id=1, exam_date=datetime(2020, 1, 1 + i), r_axis=10 * i) for i in range(3)
+    )
+    yield conn
+    close_connection(conn)
+
+
+def fetch(port, path, method="GET", **headers):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request(method, path, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        if response.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return response.status, dict(response.getheaders()), json.loads(body) if body else None
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def port(writer):
+    """Serves the writer's database from an event loop in a background thread; yields the port."""
+    db_path = writer.execute("PRAGMA database_list").fetchone()[2]
+    server = ApiServer(db_path, port=0)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(timeout=5)
+
+    yield server.port
+
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+# ------------------------------------------------------
+# TEST: endpoints
+# ------------------------------------------------------
+def test_customer_and_history(port):
+    status, headers, customer = fetch(port, "/customers/1", **{"Accept-Encoding": "gzip"})
+    assert status == 200
+    assert customer["fname"] == "First0"
+    assert headers["Content-Encoding"] == "gzip"
+
+    status, _, page = fetch(port, "/customers/1/glasses?limit=2")
+    assert status == 200
+    assert [t["r_axis"] for t in page["items"]] == [20, 10]  # newest first
+    status, _, rest = fetch(port, f"/customers/1/glasses?limit=2&after={page['next']}")
+    assert [t["exam_date"] for t in rest["items"]] == ["2020-01-01T00:00:00"] and rest["next"] is None
+
+    assert fetch(port, "/customers/2/contact-lenses")[2] == {"items": [], "next": None}
+
+
+def test_customer_pages(port):
+    _, _, first = fetch(port, "/customers?limit=2")
+    _, _, second = fetch(port, f"/customers?limit=2&after={first['next']}")
+    assert [c["id"] for c in first["items"] + second["items"]] == [1, 2, 3]
+    assert second["next"] is None
+
+
+@pytest.mark.parametrize("method, path, status", [
+    ("GET", "/customers/99", 404),
+    ("GET", "/customers/99/glasses", 404),
+    ("GET", "/frames", 404),
+    ("GET", "/customers?limit=0", 400),
+    ("GET", "/customers?limit=abc", 400),
+    ("GET", "/customers?after=garbage", 400),
+    ("DELETE", "/customers/1", 405),
+])
+def test_errors(port, method, path, status):
+    assert fetch(port, path, method=method)[0] == status
+
+
+# ------------------------------------------------------
+# TEST: ETags
+# ------------------------------------------------------
+def test_etag_revalidation(writer, port):
+    status, headers, _ = fetch(port, "/customers/1")
+    etag = headers["ETag"]
+    assert fetch(port, "/customers/1", **{"If-None-Match": etag})[0] == 304
+    assert fetch(port, "/customers/2", **{"If-None-Match": etag})[0] == 200
+
+    gzip_etag = fetch(port, "/customers/1", **{"Accept-Encoding": "gzip"})[1]["ETag"]
+    assert gzip_etag != etag  # one strong ETag per content encoding
+
+    # a write by the front desk changes the row's version: the API serves the new values
+    writer.execute("UPDATE customers SET fname = 'Changed' WHERE id = 1")
+    writer.commit()
+    status, headers, customer = fetch(port, "/customers/1", **{"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag and customer["fname"] == "Changed"
+
+    # a page's ETag follows its rows, not unrelated ones
+    page_etag = fetch(port, "/customers/1/glasses")[1]["ETag"]
+    writer.execute("UPDATE customers SET fname = 'Again' WHERE id = 2")
+    writer.commit()
+    assert fetch(port, "/customers/1/glasses", **{"If-None-Match": page_etag})[0] == 304
+    writer.execute("DELETE FROM glasses_tests WHERE id = 2")
+    writer.commit()
+    assert fetch(port, "/customers/1/glasses", **{"If-None-Match": page_etag})[0] == 200
+
+
+def test_etag_and_body_come_from_one_snapshot(writer):
+    db_path = writer.execute("PRAGMA database_list").fetchone()[2]
+    handler = ApiHandler(create_connection("reader", path=db_path))
+    read_customer = handler.service.get_customer
+
+    def get_customer_then_write(customer_id):
+        customer = read_customer(customer_id)
+        writer.execute("UPDATE customers SET fname = 'Changed' WHERE id = 1")  # lands before the versions are read
+        writer.commit()
+        return customer
+
+    handler.service.get_customer = get_customer_then_write
+    first = handler.handle("GET", "/customers/1", {})
+    handler.service.get_customer = read_customer
+
+    assert json.loads(first.body)["fname"] == "First0"
+    second = handler.handle("GET", "/customers/1", {"if-none-match": first.headers["ETag"]})
+    assert second.status == 200 and json.loads(second.body)["fname"] == "Changed"
+    close_connection(handler.conn)
+
+
+# ------------------------------------------------------
+# TEST: read-only connection
+# ------------------------------------------------------
+def test_reads_do_not_wait_for_the_writer(writer, port):
+    with transaction(writer):  # the front desk holds the write lock mid-save
+        writer.execute("UPDATE customers SET fname = 'Uncommitted' WHERE id = 1")
+        status, _, customer = fetch(port, "/customers/1")
+    assert status == 200 and customer["fname"] == "First0"
@@ -0,0 +1,139 @@
+import csv
+
+import pytest
+
+import services.importer as importer
+from db.connection import create_connection, close_connection
+from services.importer import run_import
+
+CUSTOMER_COLUMNS = ["SSN", "FName", "LName", "Birth_Date", "Tel_Mobile", "Town", "Glasses_Num"]
+GLASSES_COLUMNS = ["ssn", "exam_date", "r_sphere", "r_cylinder", "r_axis", "l_prism", "l_base", "notes"]
+
+
+def write_csv(path, columns, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return str(path)
+
+
+def read_rejects(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def query(db_path, sql, params=()):
+    conn = create_connection("writer", path=db_path)
+    try:
+        return [tuple(row) for row in conn.execute(sql, params)]
+    finally:
+        close_connection(conn)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "import.db")
+
+
+@pytest.fixture
+def customers_csv(tmp_path):
+    return write_csv(tmp_path / "customers.csv", CUSTOMER_COLUMNS, [
+        ["123456789", "John", "Doe", "01/02/1990", "0501234567", "Haifa", "2"],
+        ["12345", "Bad", "Ssn", "", "", "", ""],
+        ["223456789", "Dana", "Levi", "", "", "Akko", ""],
+        ["123456789", "John", "Again", "", "", "", ""],
+    ])
+
+
+# ------------------------------------------------------
+# TEST: customers
+# ------------------------------------------------------
+def test_import_customers(db_path, customers_csv, tmp_path):
+    result = run_import("customers", customers_csv, db_path=db_path, workers=0)
+
+    assert (result.imported, result.rejected, result.last_row) == (2, 2, 4)
+    assert query(db_path, "SELECT ssn, fname, glasses_num, birth_day IS NOT NULL FROM customers ORDER BY id") == [
+        (123456789, "John", 2, 1), (223456789, "Dana", None, 0),
+    ]
+
+    rejects = read_rejects(tmp_path / "customers.rejects.csv")
+    assert [(r["row"], r["LName"]) for r in rejects] == [("2", "Ssn"), ("4", "Again")]
+    assert "ssn: must be 9 digits long" in rejects[0]["reason"]
+    assert "already exists" in rejects[1]["reason"]
+
+
+# ------------------------------------------------------
+# TEST: exams, parsed in a process pool
+# ------------------------------------------------------
+def test_import_glasses_resolves_customers_by_ssn(db_path, customers_csv, tmp_path):
+    run_import("customers", customers_csv, db_path=db_path, workers=0)
+    glasses_csv = write_csv(tmp_path / "glasses.csv", GLASSES_COLUMNS, [
+        ["223456789", "15/02/2020", "-2.25", "-1.00", "90", "", "", "first"],
+        ["123456789", "16/02/2020", "plano", "", "", "1.5", "BU", "second"],
+        ["999999999", "17/02/2020", "", "", "", "", "", "unknown customer"],
+        ["123456789", "2020-02-18", "-2.30", "", "45", "", "", "invalid"],
+    ] * 3)
+
+    result = run_import("glasses", glasses_csv, db_path=db_path, workers=2, block_size=2)
+
+    assert (result.imported, result.rejected) == (6, 6)
+    rows = query(db_path, "SELECT customer_id, exam_date, r_sphere, r_axis, notes FROM glasses_tests_full ORDER BY id")
+    assert rows[:2] == [
+        (2, "2020-02-15T00:00:00", "-2.25", 90, "first"),
+        (1, "2020-02-16T00:00:00", "plano", None, "second"),
+    ]
+    reasons = [r["reason"] for r in read_rejects(tmp_path / "glasses.rejects.csv")]
+    assert "ssn: no customer with ssn 999999999" in reasons[0]
+    assert "exam_date" in reasons[1] and "r_sphere" in reasons[1] and "r_axis" in reasons[1]
+
+
+def test_overflowing_cell_rejects_only_its_row(db_path, customers_csv, tmp_path):
+    run_import("customers", customers_csv, db_path=db_path, workers=0)
+    glasses_csv = write_csv(tmp_path / "glasses.csv", GLASSES_COLUMNS, [
+        ["223456789", "15/02/2020", "-2.25", "-1.00", "1e400", "", "", "overflow"],
+        ["223456789", "16/02/2020", "inf", "", "", "", "", "infinite"],
+        ["123456789", "17/02/2020", "-1.00", "", "", "", "", "kept"],
+    ])
+
+    result = run_import("glasses", glasses_csv, db_path=db_path, workers=0)
+
+    assert (result.imported, result.rejected) == (1, 2)
+    assert query(db_path, "SELECT notes FROM glasses_tests_full") == [("kept",)]
+    reasons = [r["reason"] for r in read_rejects(tmp_path / "glasses.rejects.csv")]
+    assert "r_axis" in reasons[0] and "r_sphere" in reasons[1]
+
+
+# ------------------------------------------------------
+# TEST: checkpoint / resume
+# ------------------------------------------------------
+def test_interrupted_import_resumes_from_checkpoint(db_path, tmp_path, monkeypatch):
+    rows = [[str(100000000 + i), f"First{i}", f"Last{i}", "", "", "", ""] for i in range(10)]
+    path = write_csv(tmp_path / "many.csv", CUSTOMER_COLUMNS, rows)
+
+    parse_block = importer.parse_block
+    calls = []
+
+    def interrupt_on_third_block(*args):
+        calls.append(1)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return parse_block(*args)
+
+    monkeypatch.setattr(importer, "parse_block", interrupt_on_third_block)
+    first = run_import("customers", path, db_path=db_path, workers=0, block_size=3)
+    monkeypatch.setattr(importer, "parse_block", parse_block)
+
+    assert first.interrupted
+    assert (first.imported, first.last_row) == (6, 6)
+
+    second = run_import("customers", path, db_path=db_path, workers=0, block_size=3)
+
+    assert (second.resumed_from, second.imported, second.rejected) == (6, 4, 0)
+    assert query(db_path, "SELECT count(*), count(DISTINCT ssn) FROM customers") == [(10, 10)]
+    assert query(db_path, "SELECT last_row, imported FROM import_checkpoints") == [(10, 10)]
+
+
+def test_unknown_kind_is_rejected(db_path, customers_csv):
+    with pytest.raises(ValueError):
+        run_import("frames", customers_csv, db_path=db_path)
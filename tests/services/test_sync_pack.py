@@ -0,0 +1,166 @@
+import gzip
+
+import pytest
+
+from db.catalog import Catalog
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.statements import REGISTRY
+from services.sync_pack import (
+    SYNC_TABLES, PackReader, apply_pack, choose_encoding, decode_column, encode_column, write_delta, write_snapshot,
+)
+
+
+@pytest.fixture
+def mirror():
+    connection = create_connection("memory")
+    migrate(connection)
+    yield connection
+    close_connection(connection)
+
+
+def populate(conn, customers=30, exams_per_customer=3):
+    towns = ["Haifa", "Akko", "Nazareth", None]
+    conn.executemany(
+        "INSERT INTO customers (ssn, fname, lname, town, glasses_num, notes, birth_day) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(100000000 + i, f"First{i}", "Haddad" if i % 2 else "Levi", towns[i % 4], i % 3 or None,
+          "שלום" if i % 5 == 0 else None, 7000 + i) for i in range(customers)],
+    )
+    conn.executemany(
+        "INSERT INTO glasses_tests (customer_id, exam_date, r_sphere, r_cylinder, r_axis) VALUES (?, ?, ?, ?, ?)",
+        [(c + 1, f"2020-01-{1 + e:02d}T10:00:00", "plano" if e == 1 else -2.25 + c / 4, -1.0 if e else None,
+          90 if e else None)
+         for c in range(customers) for e in range(exams_per_customer)],
+    )
+    catalog = Catalog(conn)
+    ray_ban = catalog.encode("manufacturer", "Ray-Ban")
+    conn.executemany(
+        "INSERT INTO glasses_tests_cold (id, frame_manufacturer, notes) VALUES (?, ?, ?)",
+        [(c * exams_per_customer + e + 1, ray_ban, f"note {c}-{e}") for c in range(customers) for e in range(exams_per_customer)],
+    )
+    conn.execute(
+        "INSERT INTO contact_lenses_tests (customer_id, exam_date, r_brand, l_brand, r_lens_sph) "
+        "VALUES (1, '2021-03-04T00:00:00', ?, ?, -1.5)",
+        (catalog.encode("brand", "Biofinity"), catalog.encode("brand", "Air Optix")),
+    )
+    conn.commit()
+
+
+def table_rows(conn):
+    return {table: [tuple(r) for r in conn.execute(f"SELECT * FROM {REGISTRY[table].source} ORDER BY id")]
+            for table in SYNC_TABLES}
+
+
+# ------------------------------------------------------
+# TEST: column encodings
+# ------------------------------------------------------
+@pytest.mark.parametrize("values, encoding", [
+    ([None, None], "null"),
+    ([1, 2, None, 3, -5], "int"),
+    ([-(1 << 63), 0, (1 << 63) - 1], "json"),  # the deltas would overflow int64
+    ([1, 1 << 64], "json"),
+    ([1.5, None, -0.25], "real"),
+    (["a", "b", None, "c"], "text"),
+    (["Haifa", "Akko", "Haifa", "Haifa", None], "dict"),
+    (["plano", -2.25, None, 3], "json"),
+])
+def test_column_round_trip(values, encoding):
+    assert choose_encoding(values, None) == encoding
+    data = encode_column(encoding, values, {})
+    assert decode_column(encoding, data, len(values), []) == values
+
+
+def test_dictionary_grows_across_blocks():
+    writer_dictionary, reader_dictionary = {}, []
+    first = encode_column("dict", ["Haifa", "Akko", "Haifa"], writer_dictionary)
+    second = encode_column("dict", ["Akko", "Nazareth"], writer_dictionary)
+
+    assert decode_column("dict", first, 3, reader_dictionary) == ["Haifa", "Akko", "Haifa"]
+    assert decode_column("dict", second, 2, reader_dictionary) == ["Akko", "Nazareth"]
+    assert choose_encoding(["unique"], writer_dictionary) == "dict"  # once a dictionary column, always one
+
+
+# ------------------------------------------------------
+# TEST: snapshot / delta round trips
+# ------------------------------------------------------
+def test_snapshot_round_trip(db_conn, mirror, tmp_path):
+    populate(db_conn)
+    path = str(tmp_path / "snapshot.pack")
+
+    result = write_snapshot(db_conn, path, block_size=7)
+
+    assert result["to_seq"] == 121 and result["rows"] == 121
+    header = apply_pack(mirror, path)
+    assert header["kind"] == "snapshot" and header["to_seq"] == 121
+    assert table_rows(mirror) == table_rows(db_conn)
+
+
+def test_delta_round_trip(db_conn, mirror, tmp_path):
+    populate(db_conn)
+    snapshot = write_snapshot(db_conn, str(tmp_path / "snapshot.pack"))
+    apply_pack(mirror, str(tmp_path / "snapshot.pack"))
+
+    db_conn.execute("UPDATE customers SET town = 'Akko', notes = 'moved' WHERE id IN (2, 3)")
+    db_conn.execute("DELETE FROM customers WHERE id = 4")  # cascades to its exams
+    db_conn.execute("INSERT INTO customers (ssn, fname, lname) VALUES (999999999, 'New', 'Customer')")
+    db_conn.execute("UPDATE glasses_tests SET r_sphere = 'plano' WHERE id = 1")
+    db_conn.commit()
+
+    delta = write_delta(db_conn, str(tmp_path / "delta.pack"), snapshot["to_seq"], block_size=3)
+
+    assert (delta["rows"], delta["deletes"]) == (4, 4)
+    apply_pack(mirror, str(tmp_path / "delta.pack"))
+    assert table_rows(mirror) == table_rows(db_conn)
+
+
+def test_delta_with_a_row_deleted_in_a_later_block(db_conn, mirror, tmp_path):
+    populate(db_conn)
+    snapshot = write_snapshot(db_conn, str(tmp_path / "snapshot.pack"))
+    apply_pack(mirror, str(tmp_path / "snapshot.pack"))
+
+    db_conn.execute("UPDATE customers SET notes = 'called' WHERE id = 5")
+    db_conn.execute("UPDATE customers SET notes = 'called' WHERE id IN (6, 7)")
+    db_conn.execute("DELETE FROM customers WHERE id = 5")  # after the first block's entries
+    db_conn.commit()
+
+    delta = write_delta(db_conn, str(tmp_path / "delta.pack"), snapshot["to_seq"], block_size=1)
+
+    apply_pack(mirror, str(tmp_path / "delta.pack"))
+    assert table_rows(mirror) == table_rows(db_conn)
+    assert delta["rows"] == 2
+
+
+def test_empty_delta(db_conn, tmp_path):
+    populate(db_conn)
+    seq = write_snapshot(db_conn, str(tmp_path / "snapshot.pack"))["to_seq"]
+
+    delta = write_delta(db_conn, str(tmp_path / "delta.pack"), seq)
+
+    reader = PackReader(str(tmp_path / "delta.pack"))
+    assert list(reader) == [] and reader.summary == {"rows": 0, "deletes": 0}
+    assert (delta["from_seq"], delta["to_seq"]) == (seq, seq)
+
+
+# ------------------------------------------------------
+# TEST: damaged packs
+# ------------------------------------------------------
+def test_truncated_pack_is_rejected(db_conn, tmp_path):
+    populate(db_conn)
+    path = tmp_path / "snapshot.pack"
+    write_snapshot(db_conn, str(path), block_size=10)
+    with gzip.open(path) as f:
+        data = f.read()
+    with gzip.open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+
+    with pytest.raises(ValueError, match="truncated"):
+        list(PackReader(str(path)))
+
+
+def test_not_a_pack(tmp_path):
+    path = tmp_path / "other.pack"
+    with gzip.open(path, "wb") as f:
+        f.write(b"SQLite format 3\x00")
+
+    with pytest.raises(ValueError, match="not a sync pack"):
+        PackReader(str(path))
@@ -0,0 +1,138 @@
+from dataclasses import asdict
+
+import pytest
+
+from db.models import GlassesTest
+from db.repositories.contact_lenses_repo import ContactLensesTestRepo
+from db.repositories.customer_repo import CustomerRepo
+from db.repositories.glasses_repo import GlassesRepo
+from services.customer_service import CustomerService
+from services.validation import (
+    FieldRule, Validator, Violation, compile_field_rule,
+    GLASSES_TEST_VALIDATOR, CONTACT_LENSES_TEST_VALIDATOR,
+)
+
+
+def glasses_data(**overrides):
+    data = {name: None for name in GLASSES_TEST_VALIDATOR.fields}
+    data.update(id=None, customer_id=1)
+    data.update(
+        exam_date="15/02/2025", examiner="Dr. Smith",
+        r_fv="6/9", r_sphere=-2.25, r_cylinder=-1.0, r_axis=170, r_prism=None, r_base=None, r_va="6/6",
+        l_fv="FC", l_sphere="Plano", l_cylinder=None, l_axis=None, l_prism=1.5, l_base="BU", l_va="7.5",
+        r_add_read=1.25, l_add_read=1.25, r_pd=31.5, l_pd=32, sum_pd=63.5,
+    )
+    data.update(overrides)
+    return data
+
+
+def fields_of(violations):
+    return {v.field for v in violations}
+
+
+# ------------------------------------------------------
+# TEST: compiled field rules
+# ------------------------------------------------------
+@pytest.mark.parametrize("value, ok", [
+    (-2.25, True), ("-2.25", True), ("plano", True), (None, True), ("", True),
+    (-2.3, False), ("abc", False), (True, False),
+])
+def test_sphere_rule(value, ok):
+    check = compile_field_rule(FieldRule("r_sphere", step=0.25, allow=frozenset({"PLANO"})))
+    assert (check(value) is None) == ok
+
+
+def test_required_and_range_messages():
+    check = compile_field_rule(FieldRule("x", kind="integer", required=True, min=0, max=180))
+
+    assert check(None) == "is required"
+    assert check(181) == "must be between 0 and 180"
+    assert check(12.5) == "must be a whole number"
+
+
+@pytest.mark.parametrize("field", ["r_sphere", "r_axis"])
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1e400", float("inf")])
+def test_non_finite_numbers_are_violations(field, value):
+    violations = GLASSES_TEST_VALIDATOR.validate_field(field, value)
+
+    assert [v.field for v in violations] == [field]
+    assert violations[0].message.startswith("must be")
+
+
+def test_unknown_field_is_rejected_at_compile_time():
+    with pytest.raises(ValueError):
+        Validator(GlassesTest, [FieldRule("r_sphre")])
+
+
+# ------------------------------------------------------
+# TEST: whole-record validation
+# ------------------------------------------------------
+def test_valid_glasses_record():
+    assert GLASSES_TEST_VALIDATOR.validate(glasses_data()) == []
+
+
+def test_all_violations_reported_in_one_pass():
+    violations = GLASSES_TEST_VALIDATOR.validate(glasses_data(
+        exam_date="2025-02-15", r_sphere=-2.3, r_axis=None, l_base=None, r_fv="6/500", sum_pd=70,
+    ))
+
+    assert fields_of(violations) == {"exam_date", "r_sphere", "r_axis", "l_base", "r_fv", "sum_pd"}
+
+
+def test_cylinder_axis_dependency():
+    assert fields_of(GLASSES_TEST_VALIDATOR.validate(glasses_data(r_cylinder=0, r_axis=90))) == {"r_axis"}
+    assert GLASSES_TEST_VALIDATOR.validate(glasses_data(r_cylinder=0, r_axis=None)) == []
+
+
+def test_contact_lenses_record(make_test):
+    data = asdict(make_test())
+    assert CONTACT_LENSES_TEST_VALIDATOR.validate(data) == []
+
+    data.update(r_diameter=15.5, l_lens_cyl=-0.5, l_lens_axis=123, r_rH=5.0)
+    assert fields_of(CONTACT_LENSES_TEST_VALIDATOR.validate(data)) == {"r_diameter", "l_lens_cyl", "l_lens_axis", "r_rH"}
+
+
+# ------------------------------------------------------
+# TEST: per-field and batch modes
+# ------------------------------------------------------
+def test_validate_field_checks_dependencies_with_the_new_value():
+    form = glasses_data()
+
+    assert GLASSES_TEST_VALIDATOR.validate_field("r_axis", 200) == [Violation("r_axis", "must be between 0 and 180")]
+    assert GLASSES_TEST_VALIDATOR.validate_field("r_cylinder", 0, form) == [
+        Violation("r_axis", "must be empty when r_cylinder is 0 or empty")
+    ]
+    assert GLASSES_TEST_VALIDATOR.validate_field("unknown", 1) == []
+
+
+def test_validate_many_yields_only_invalid_records():
+    records = [glasses_data(), glasses_data(r_axis=999), glasses_data()]
+
+    invalid = list(GLASSES_TEST_VALIDATOR.validate_many(records))
+
+    assert [index for index, _ in invalid] == [1]
+
+
+# ------------------------------------------------------
+# TEST: service integration
+# ------------------------------------------------------
+@pytest.fixture
+def service(db_conn, make_customer):
+    service = CustomerService(CustomerRepo(db_conn), GlassesRepo(db_conn), ContactLensesTestRepo(db_conn))
+    service.cus_repo.add_customer(make_customer())
+    return service
+
+
+def test_service_prints_every_violation_instead_of_raising(service, capsys):
+    result = service.add_glasses_test(1, glasses_data(r_axis=None, l_prism=None))
+
+    assert result is None
+    out = capsys.readouterr().out
+    assert "r_axis: is required" in out
+    assert "l_base: must be empty" in out
+
+
+def test_service_adds_valid_test(service):
+    test = service.add_glasses_test(1, glasses_data())
+
+    assert test.id is not None
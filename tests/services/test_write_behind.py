@@ -0,0 +1,163 @@
+import sqlite3
+import time
+
+import pytest
+
+from db.connection import create_connection, close_connection
+from db.migrations import migrate
+from db.repositories.customer_repo import CustomerRepo
+from services.async_customer_service import open_customer_service
+from services.validation import GLASSES_TEST_VALIDATOR
+from services.write_behind import WriteBehindQueue
+
+
+def glasses_data(**overrides):
+    data = {name: None for name in GLASSES_TEST_VALIDATOR.fields}
+    data.update(id=None, customer_id=1, exam_date="15/02/2025", examiner="Dr. Smith", r_sphere=-2.25)
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture
+def db_path(tmp_path, make_customer):
+    path = str(tmp_path / "clinic.db")
+    conn = create_connection("writer", path=path)
+    migrate(conn)
+    CustomerRepo(conn).add_customer(make_customer())
+    close_connection(conn)
+    return path
+
+
+@pytest.fixture
+def queue(db_path):
+    errors = []
+    queue = WriteBehindQueue(lambda: open_customer_service(db_path), interval=0.05,
+                             on_error=lambda save, e: errors.append((save.method, e)), flush_on_exit=False)
+    queue.reported = errors
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def reader(db_path):
+    conn = create_connection("reader", path=db_path)
+    yield conn
+    close_connection(conn)
+
+
+# ------------------------------------------------------
+# TEST: coalescing
+# ------------------------------------------------------
+def test_repeated_saves_of_a_record_are_written_once(queue, reader):
+    assert queue.add_glasses_test(1, glasses_data()) == []
+    queue.flush()
+    before = reader.execute("SELECT max(seq) FROM change_log").fetchone()[0]
+
+    for axis in range(1, 51):  # the examiner saves after every field
+        queue.update_glasses_test(1, glasses_data(id=1, r_cylinder=-0.5, r_axis=axis))
+    queue.flush()
+
+    assert reader.execute("SELECT r_axis FROM glasses_tests WHERE id = 1").fetchone()[0] == 50
+    assert reader.execute("SELECT count(*) FROM change_log WHERE seq > ?", (before,)).fetchone()[0] == 1
+    assert queue.coalesced >= 49 - queue.batches
+
+
+def test_saves_are_written_without_a_flush(queue, reader):
+    queue.add_glasses_test(1, glasses_data())
+    deadline = time.perf_counter() + 5
+    while reader.execute("SELECT count(*) FROM glasses_tests").fetchone()[0] == 0:
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+    assert queue.batches == 1
+
+
+def test_queued_data_is_a_snapshot(queue, reader):
+    data = glasses_data()
+    queue.add_glasses_test(1, data)
+    data["examiner"] = "Edited after saving"
+    queue.flush()
+    assert reader.execute("SELECT examiner FROM glasses_tests").fetchone()[0] == "Dr. Smith"
+
+
+# ------------------------------------------------------
+# TEST: ordering and failures
+# ------------------------------------------------------
+def test_saves_apply_in_queue_order(queue, reader):
+    queue.add_glasses_test(1, glasses_data(examiner="first"))
+    queue.add_glasses_test(1, glasses_data(examiner="second"))  # adds are never coalesced
+    queue.update_glasses_test(1, glasses_data(id=1, examiner="updated"))
+    queue.delete_glasses_test(2)
+    queue.update_glasses_test(1, glasses_data(id=1, examiner="updated again"))
+    queue.flush()
+
+    assert [tuple(row) for row in reader.execute("SELECT id, examiner FROM glasses_tests")] == [(1, "updated again")]
+
+
+def test_a_failing_save_rolls_back_alone(queue, reader, make_customer):
+    queue.add_glasses_test(1, glasses_data(examiner="kept"))
+    queue.update_customer(make_customer(id=99, ssn=987654321))  # no such customer: raises in the writer
+    queue.add_glasses_test(1, glasses_data(examiner="also kept"))
+    queue.flush()
+
+    assert [row[0] for row in reader.execute("SELECT examiner FROM glasses_tests")] == ["kept", "also kept"]
+    assert [method for method, _ in queue.reported] == ["update_customer"]
+    assert isinstance(queue.reported[0][1], ValueError)
+
+
+def test_refused_save_is_reported(queue, reader):
+    queue.add_glasses_test(1, glasses_data(examiner="kept"))
+    queue.update_glasses_test(99, glasses_data(id=1, customer_id=99, examiner="no such customer"))  # returns None
+    queue.flush()
+
+    assert [row[0] for row in reader.execute("SELECT examiner FROM glasses_tests")] == ["kept"]
+    assert [method for method, _ in queue.reported] == ["update_glasses_test"]
+    assert queue.applied == 1
+
+
+def test_save_after_a_delete_does_not_jump_ahead_of_it(queue, reader, make_customer):
+    queue.add_glasses_test(1, glasses_data(examiner="first"))
+    queue.flush()
+    queue.update_glasses_test(1, glasses_data(id=1, examiner="edited"))
+    queue.delete_customer(1)  # cascades to the test
+    queue.update_glasses_test(1, glasses_data(id=1, examiner="edited after the delete"))
+    queue.update_customer(make_customer(id=1, fname="Restored"))  # after the delete: not merged into it
+    queue.flush()
+
+    assert reader.execute("SELECT count(*) FROM glasses_tests").fetchone()[0] == 0
+    assert reader.execute("SELECT count(*) FROM customers").fetchone()[0] == 0
+    assert [method for method, _ in queue.reported] == ["update_glasses_test", "update_customer"]
+
+
+def test_invalid_save_is_rejected_when_queued(queue):
+    violations = queue.add_glasses_test(1, glasses_data(r_axis=999))
+    assert {v.field for v in violations} == {"r_axis"}
+    assert queue.queued == 0 and queue.pending() == 0
+
+
+# ------------------------------------------------------
+# TEST: latency and shutdown
+# ------------------------------------------------------
+def test_saving_does_not_wait_for_the_database(queue, db_path):
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")  # e.g. a backup or another workstation holds the write lock
+    try:
+        started = time.perf_counter()
+        for examiner in ("a", "b", "c"):
+            queue.add_glasses_test(1, glasses_data(examiner=examiner))
+        elapsed = time.perf_counter() - started
+        assert queue.flush(timeout=0.2) is False
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    assert elapsed < 0.05
+    assert queue.flush(timeout=5) is True
+
+
+def test_close_flushes_and_stops(db_path, reader):
+    queue = WriteBehindQueue(lambda: open_customer_service(db_path), interval=10, flush_on_exit=False)
+    queue.add_glasses_test(1, glasses_data())
+    queue.close()
+
+    assert reader.execute("SELECT count(*) FROM glasses_tests").fetchone()[0] == 1
+    with pytest.raises(RuntimeError):
+        queue.add_glasses_test(1, glasses_data())